@@ -3,12 +3,21 @@ Endpoints de IA - Heredan de IAServicio con decoradores elegantes
 Usa fastapi-class para Class-Based Views
 """
 
-from fastapi import APIRouter, Request, logger
+import logging
+
+from fastapi import APIRouter, Request
 from fastapi import Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from app.core.config import get_settings
+from app.core.database import get_registry
 from app.schemas.chat import ChatRequest, ChatResponse, DeleteRequest
-from app.api.ia_servicio import require_auth_dependency, validate_mensaje_dependency, validate_delete_body_dependency, get_user_info_dependency
+from app.api.ia_servicio import require_auth_dependency, require_super_admin_dependency, validate_mensaje_dependency, validate_delete_body_dependency, get_user_info_dependency
+from app.services.easycore_auth import EasycoreAuth
+from app.services.easycore_user_roles import EasycoreUserRolesService
 from app.services.llamaOrchestor import LlamaOrchestor
+from app.services.response_stream import ResponseStream
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api", tags=["ia"])
 
@@ -29,11 +38,10 @@ async def chat(
     Endpoint principal de chat con el agente IA.
     POST /api/chat
     """
-    settings = get_settings()
     orch = http_req.app.state.orch 
  
     print(f"[DEBUG] user_info id: {user_info.get('id', '')}")
-    response_obj = orch.procesar_mensaje(
+    response_obj = await orch.aprocesar_mensaje(
         mensaje_limpio or request.mensaje,
         session_id=user_info.get("id", ""),
         nombreUsuario=user_info.get("nombre", ""),
@@ -42,6 +50,34 @@ async def chat(
     response_text = str(response_obj)
     return ChatResponse(respuesta=response_text, id=user_info.get("id", ""))
 
+@router.post("/chat/stream")
+async def chat_stream(
+    request: ChatRequest,
+    http_req: Request,
+    user_info: dict = Depends(get_user_info_dependency),
+    require_auth: None = Depends(require_auth_dependency),
+    mensaje_limpio: str = Depends(validate_mensaje_dependency)
+):
+    """
+    Igual que /api/chat pero responde con Server-Sent Events: los tokens del
+    LLM se envían a medida que se generan (ver app.services.response_stream).
+    POST /api/chat/stream
+    """
+    orch = http_req.app.state.orch
+    stream = ResponseStream()
+    work = orch.aprocesar_mensaje(
+        mensaje_limpio or request.mensaje,
+        session_id=user_info.get("id", ""),
+        nombreUsuario=user_info.get("nombre", ""),
+        user_roles=user_info.get("roles", []),
+    )
+    return StreamingResponse(
+        stream.sse(work, response_id=user_info.get("id", "")),
+        media_type="text/event-stream",
+        # Sin buffering en proxies (nginx) para que cada evento salga apenas se genera
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.get("/saludo")
 async def saludo(
     http_req: Request,
@@ -68,9 +104,15 @@ async def saludo(
     user_id = user_info.get('id')
     recordatorios_info = None
 
+    # Las tres fuentes se consultan en paralelo y con cache por usuario
+    orch = http_req.app.state.orch
+    try:
+        greeting_reminders = await orch.greeting_reminders.fetch(user_id, user_roles)
+    except Exception as e:
+        greeting_reminders = {}
+
     try:
-        orch = http_req.app.state.orch
-        reminders_result = orch.get_rrhh_reminders(user_roles)
+        reminders_result = greeting_reminders["rrhh"]
 
         if reminders_result.get("authorized") and reminders_result.get("count", 0) > 0:
             # Construir mensaje de recordatorios RRHH
@@ -108,8 +150,7 @@ async def saludo(
 
     # Verificar recordatorios de clientes para todos los usuarios
     try:
-        orch = http_req.app.state.orch
-        customer_reminders_result = orch.get_customer_reminders(user_id)
+        customer_reminders_result = greeting_reminders["customer"]
 
         if customer_reminders_result.get("authorized") and customer_reminders_result.get("count", 0) > 0:
             # Construir mensaje de recordatorios de clientes
@@ -155,8 +196,7 @@ async def saludo(
 
     # Verificar recordatorios de Operations para usuarios con ese rol
     try:
-        orch = http_req.app.state.orch
-        operations_reminders_result = orch.get_operations_reminders(user_id, user_roles)
+        operations_reminders_result = greeting_reminders["operations"]
 
         if operations_reminders_result.get("authorized") and operations_reminders_result.get("count", 0) > 0:
             # Construir mensaje de recordatorios de Operations/Citas
@@ -231,15 +271,9 @@ async def eliminar_memoria(
     orch = http_req.app.state.orch
     
     # ✅ REALMENTE eliminar la memoria
-    memoria_existia = user_id in orch.memories
+    memoria_existia = orch.memories.delete(user_id)
     
     if memoria_existia:
-        del orch.memories[user_id]  # ← ESTO ES LO IMPORTANTE
-        
-        # Si tienes memory_timestamps del cleanup
-        if hasattr(orch, 'memory_timestamps') and user_id in orch.memory_timestamps:
-            del orch.memory_timestamps[user_id]
-        
         logger.info(f"Memoria eliminada para usuario: {user_id}")
     
     return {
@@ -249,6 +283,45 @@ async def eliminar_memoria(
         "deleted": memoria_existia  # Info útil
     }
 
+@router.get("/metricas")
+async def metricas(
+    http_req: Request,
+    require_admin: None = Depends(require_super_admin_dependency),
+) -> dict:
+    """
+    Métricas internas de rendimiento (solo super_admin: exponen pools, caches y sesiones).
+    GET /api/metricas
+    """
+    orch = http_req.app.state.orch
+    return {
+        "enrutamiento": orch.router.routing_stats(),
+        "cache_respuestas": orch.router.cache_stats(),
+        "indice_bienes": orch.router.search_index_stats(),
+        "catalogo_bienes": orch.router.catalog_stats(),
+        "resumen_bancos": orch.router.bank_stats_summary(),
+        "propiedades": orch.router.property_db_service.cache_stats(),
+        "pools_bd": get_registry().stats(),
+        "saludo": orch.greeting_reminders.stats(),
+        "memorias": orch.memories.stats(),
+        "contexto": orch.router.context_manager.stats(),
+        "auth": {
+            "roles": EasycoreUserRolesService.cache_stats(),
+            "tokens": EasycoreAuth.token_cache_stats(),
+        },
+    }
+
+@router.post("/admin/cache/roles/invalidar")
+async def invalidar_cache_roles(
+    user_id: str = None,
+    require_admin: None = Depends(require_super_admin_dependency),
+) -> dict:
+    """
+    Invalida los roles cacheados (de un usuario o de todos) tras cambiarlos en Easycore.
+    POST /api/admin/cache/roles/invalidar?user_id=123
+    """
+    EasycoreUserRolesService.invalidate(user_id)
+    return {"ok": True, "user_id": user_id or "todos"}
+
 @router.get("/health")
 async def health_check() -> dict:
     """Health check endpoint."""
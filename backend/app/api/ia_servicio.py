@@ -3,6 +3,7 @@ IAServicio - Superclase base para endpoints de IA
 Contiene lógica común de validación y utilidades
 """
 
+import asyncio
 import logging
 from fastapi import HTTPException, Header, Depends, Request
 from app.services.easycore_auth import EasycoreAuth
@@ -24,7 +25,12 @@ async def get_user_info_dependency(authorization: str = Header(None)) -> dict:
     result = EasycoreAuth.decode_token(authorization)
     if result["ok"]:
         token_roles = result["value"].get("roles", [])
-        db_roles = EasycoreUserRolesService.get_roles_for_user(result["value"]["id"])
+        # Con cache caliente se evita el salto a un hilo
+        db_roles = EasycoreUserRolesService.get_cached_roles(result["value"]["id"])
+        if db_roles is None:
+            db_roles = await asyncio.to_thread(
+                EasycoreUserRolesService.get_roles_for_user, result["value"]["id"]
+            )
         merged_roles = sorted({str(r).strip() for r in [*token_roles, *db_roles] if str(r).strip()})
 
         return {
@@ -41,6 +47,13 @@ async def require_auth_dependency(user_info: dict = Depends(get_user_info_depend
     if not user_info.get("authenticated"):
         raise HTTPException(status_code=401, detail="No autenticado")
 
+# Dependencia para endpoints de administración
+async def require_super_admin_dependency(user_info: dict = Depends(get_user_info_dependency)):
+    if not user_info.get("authenticated"):
+        raise HTTPException(status_code=401, detail="No autenticado")
+    if "super_admin" not in {str(r).lower() for r in user_info.get("roles", [])}:
+        raise HTTPException(status_code=403, detail="Requiere rol super_admin")
+
 # Dependencia para limpiar el mensaje
 async def validate_mensaje_dependency(request: Request) -> str:
     body = await request.json()
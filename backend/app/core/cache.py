@@ -0,0 +1,120 @@
+"""
+TTLCache - Cache en memoria con expiración por entrada y desalojo LRU
+
+Thread-safe (los engines corren en hilos con asyncio.to_thread) y con
+contadores de hits / misses / desalojos para exponer en /api/metricas.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Cache LRU acotado con TTL por entrada.
+
+    Uso:
+        cache = TTLCache(maxsize=1000, default_ttl=300)
+        cache.set("clave", valor)            # TTL por defecto
+        cache.set("otra", valor, ttl=30)     # TTL específico
+        valor = cache.get("clave")           # None si no existe o expiró
+    """
+
+    def __init__(self, maxsize: int = 1024, default_ttl: Optional[float] = None):
+        """
+        Args:
+            maxsize: Máximo de entradas; al superarlo se desaloja la menos usada
+            default_ttl: Segundos de vida por defecto (None = sin expiración)
+        """
+        self.maxsize = maxsize
+        self.default_ttl = default_ttl
+        self._data: "OrderedDict[Hashable, Tuple[Any, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                self.misses += 1
+                return default
+
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.pop(key, _MISSING)
+        return default if item is _MISSING else item[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def values(self) -> list:
+        """Copia de los valores vigentes (no cuenta como hit ni cambia el orden LRU)."""
+        now = time.monotonic()
+        with self._lock:
+            return [value for value, expires_at in self._data.values() if expires_at is None or expires_at > now]
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entradas": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "desalojos": self.evictions,
+                "expiradas": self.expirations,
+            }
+
+
+# ============================================================================
+# TESTS
+# ============================================================================
+
+if __name__ == "__main__":
+    cache = TTLCache(maxsize=2, default_ttl=0.05)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1          # "a" pasa a ser la más reciente
+    cache.set("c", 3)                   # desaloja "b" (LRU)
+    assert cache.get("b") is None
+    time.sleep(0.06)
+    assert cache.get("a") is None       # expiró
+    print(f"✓ LRU + TTL: {cache.stats()}")
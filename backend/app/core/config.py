@@ -1,3 +1,6 @@
+from functools import cached_property, lru_cache
+from typing import Callable, List
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import computed_field
 from urllib.parse import quote_plus
@@ -7,7 +10,8 @@ class Settings(BaseSettings):
     model_config = SettingsConfigDict(
         env_file=".env",
         case_sensitive=False,
-        extra="ignore"
+        extra="ignore",
+        frozen=True,
     )
 
 
@@ -39,19 +43,36 @@ class Settings(BaseSettings):
     app_version: str = "1.0.0"
     debug: bool = False
 
+    # Directorio para artefactos persistidos en disco (vectores, índices)
+    cache_dir: str = ".cache"
+
+    # Estado de conversación: memory:// (un worker), sqlite:///ruta o redis://host:puerto/db
+    session_backend_url: str = "memory://"
+
+    # Presupuesto (tokens) del historial que se agrega a las consultas contextuales
+    history_window_tokens: int = 1500
+
+    # Búsquedas de Bienes con índice invertido en memoria (False = siempre SQL con LIKE)
+    bienes_search_index: bool = True
+
+    # Copia en memoria de vw_get_all_properties (búsquedas, detalle y resúmenes sin ir a MySQL)
+    bienes_catalog_snapshot: bool = True
+    # Segundos entre refrescos del catálogo (solo trae lo modificado si la vista tiene updated_at)
+    bienes_catalog_refresh: int = 300
+
 
 
     
 
     @computed_field
-    @property
+    @cached_property
     def DB_URI_EASYCORE(self) -> str:
         user = quote_plus(self.easycore_username)
         pwd = quote_plus(self.easycore_password)
         return f"mysql+pymysql://{user}:{pwd}@{self.easycore_host}:{self.easycore_port}/{self.easycore_db}?"
 
     @computed_field
-    @property
+    @cached_property
     def DB_URI_BIENES(self) -> str:
         if not self.bienes_host or not self.bienes_db or not self.bienes_username:
             raise ValueError(
@@ -63,5 +84,57 @@ class Settings(BaseSettings):
 
 
 
+_reload_hooks: List[Callable[[Settings], None]] = []
+
+
+@lru_cache(maxsize=1)
 def get_settings() -> Settings:
+    """
+    Snapshot inmutable de la configuración, leído una sola vez por proceso.
+
+    Para releer el entorno y el .env usar reload_settings().
+    """
     return Settings()
+
+
+def on_settings_reload(hook: Callable[[Settings], None]) -> None:
+    """Registra una función que recibe el nuevo snapshot tras reload_settings()."""
+    _reload_hooks.append(hook)
+
+
+def reload_settings() -> Settings:
+    """
+    Descarta el snapshot actual, vuelve a leer el entorno y notifica a los hooks.
+
+    Los engines ya creados conservan su URI; cambiar credenciales de BD requiere reiniciar.
+    """
+    get_settings.cache_clear()
+    settings = get_settings()
+    for hook in list(_reload_hooks):
+        hook(settings)
+    return settings
+
+
+# ============================================================================
+# TESTS
+# ============================================================================
+
+if __name__ == "__main__":
+    import time
+
+    n = 2000
+    inicio = time.perf_counter()
+    for _ in range(n):
+        Settings().DB_URI_EASYCORE
+    antes = (time.perf_counter() - inicio) / n * 1e6
+
+    get_settings()
+    inicio = time.perf_counter()
+    for _ in range(n):
+        get_settings().DB_URI_EASYCORE
+    despues = (time.perf_counter() - inicio) / n * 1e6
+
+    print(f"Settings() + URI por llamada: {antes:.1f} µs")
+    print(f"get_settings() memoizado:     {despues:.2f} µs")
+    assert get_settings() is get_settings()
+    assert reload_settings() is get_settings()
@@ -0,0 +1,290 @@
+"""
+Registro central de engines SQLAlchemy - Un pool por base de datos lógica
+
+Antes cada servicio creaba su propio engine (BienesDB, PropertyDatabaseService,
+LlamaSQLQuery, roles de Easycore...) con timeouts y recycle distintos, así que
+el número de conexiones contra el MySQL compartido dependía de cuántos
+servicios estuvieran vivos. Ahora hay un único engine por base lógica con un
+pool acotado y ajustado a su hosting, y métricas de uso del pool.
+
+Desde código async, `afetch_all` corre la consulta en un hilo contra el mismo
+pool: no hay un segundo pool async que duplique las conexiones al MySQL.
+
+Uso:
+    from app.core.database import get_engine, BIENES, EASYCORE
+
+    with get_engine(BIENES).connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+    rows = await afetch_all(get_engine(EASYCORE), "SELECT 1 AS uno")
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+
+# Bases de datos lógicas
+BIENES = "bienes"
+EASYCORE = "easycore"
+
+
+@dataclass(frozen=True)
+class PoolProfile:
+    """Configuración del pool de una base de datos."""
+    settings_key: str           # Atributo de Settings con la URI
+    pool_size: int = 5
+    max_overflow: int = 5
+    pool_timeout: int = 30      # Segundos esperando una conexión libre
+    pool_recycle: int = 1800
+    connect_timeout: int = 30
+    read_timeout: int = 60
+    write_timeout: int = 60
+    charset: Optional[str] = None
+
+
+PROFILES: Dict[str, PoolProfile] = {
+    # SiteGround/shared hosting: conexiones frágiles y límite bajo por usuario
+    BIENES: PoolProfile(
+        settings_key="DB_URI_BIENES",
+        pool_size=5,
+        max_overflow=5,
+        pool_timeout=30,
+        pool_recycle=300,
+        connect_timeout=10,
+        read_timeout=60,
+        write_timeout=60,
+        charset="utf8mb4",
+    ),
+    # Azure MySQL: consultas de texto-a-SQL más largas
+    EASYCORE: PoolProfile(
+        settings_key="DB_URI_EASYCORE",
+        pool_size=10,
+        max_overflow=10,
+        pool_timeout=30,
+        pool_recycle=1800,
+        connect_timeout=30,
+        read_timeout=120,
+        write_timeout=120,
+    ),
+}
+
+
+class _PoolMetrics:
+    """Contadores de checkout del pool (thread-safe)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total_ms = 0.0
+        self.wait_max_ms = 0.0
+
+    def record(self, wait_ms: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_total_ms += wait_ms
+            self.wait_max_ms = max(self.wait_max_ms, wait_ms)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            attempts = self.checkouts + self.timeouts
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "espera_promedio_ms": round(self.wait_total_ms / attempts, 3) if attempts else 0.0,
+                "espera_max_ms": round(self.wait_max_ms, 3),
+            }
+
+
+_METRICS: Dict[str, _PoolMetrics] = {}
+
+
+class _TimedQueuePool(QueuePool):
+    """
+    QueuePool que mide cuánto espera cada checkout por una conexión libre.
+
+    Las métricas se asocian por logging_name, que SQLAlchemy conserva cuando
+    recrea el pool (dispose / invalidación).
+    """
+
+    def _do_get(self):
+        metrics = _METRICS.get(getattr(self, "_orig_logging_name", None) or "")
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except PoolTimeoutError:
+            if metrics:
+                metrics.record((time.perf_counter() - start) * 1000, timed_out=True)
+            raise
+        if metrics:
+            metrics.record((time.perf_counter() - start) * 1000)
+        return conn
+
+
+class EngineRegistry:
+    """Crea y comparte un engine por base de datos lógica."""
+
+    def __init__(self, settings=None):
+        self._settings = settings
+        self._engines: Dict[str, Engine] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def settings(self):
+        if self._settings is None:
+            from app.core.config import get_settings
+            self._settings = get_settings()
+        return self._settings
+
+    def _resolve_uri(self, name: str, profile: PoolProfile) -> str:
+        return getattr(self.settings, profile.settings_key)
+
+    def get_engine(self, name: str, uri: Optional[str] = None) -> Engine:
+        """
+        Retorna el engine compartido de la base `name`.
+
+        Args:
+            name: Base lógica (BIENES, EASYCORE)
+            uri: URI explícita; solo se usa la primera vez (por defecto, la de Settings)
+        """
+        engine = self._engines.get(name)
+        if engine is not None:
+            return engine
+
+        with self._lock:
+            engine = self._engines.get(name)
+            if engine is None:
+                engine = self._engines[name] = self._create(name, uri)
+        return engine
+
+    def _create(self, name: str, uri: Optional[str]) -> Engine:
+        profile = PROFILES[name]
+        url = make_url(uri or self._resolve_uri(name, profile))
+
+        connect_args = {}
+        if url.get_backend_name() == "mysql":
+            connect_args = {
+                "connect_timeout": profile.connect_timeout,
+                "read_timeout": profile.read_timeout,
+                "write_timeout": profile.write_timeout,
+            }
+            if profile.charset:
+                connect_args["charset"] = profile.charset
+
+        _METRICS.setdefault(name, _PoolMetrics())
+        logger.info(
+            f"✓ Pool de BD '{name}' creado (size={profile.pool_size}, overflow={profile.max_overflow}, "
+            f"recycle={profile.pool_recycle}s)"
+        )
+        return create_engine(
+            url,
+            poolclass=_TimedQueuePool,
+            pool_logging_name=name,
+            pool_pre_ping=True,
+            pool_size=profile.pool_size,
+            max_overflow=profile.max_overflow,
+            pool_timeout=profile.pool_timeout,
+            pool_recycle=profile.pool_recycle,
+            connect_args=connect_args,
+        )
+
+    # -------- Métricas / ciclo de vida --------
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Estado de cada pool: tamaño, en uso, overflow y espera de checkout."""
+        result = {}
+        for name, engine in list(self._engines.items()):
+            pool = engine.pool
+            profile = PROFILES[name]
+            result[name] = {
+                "pool_size": profile.pool_size,
+                "max_overflow": profile.max_overflow,
+                "en_uso": pool.checkedout(),
+                "libres": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                **_METRICS[name].snapshot(),
+            }
+        return result
+
+    def dispose_all(self):
+        for engine in list(self._engines.values()):
+            engine.dispose()
+
+
+@lru_cache(maxsize=1)
+def get_registry() -> EngineRegistry:
+    """Registro global del proceso."""
+    from app.core.config import on_settings_reload
+
+    registry = EngineRegistry()
+    # Las URIs de engines creados después de un reload salen del snapshot vigente
+    on_settings_reload(lambda settings: setattr(registry, "_settings", settings))
+    return registry
+
+
+def get_engine(name: str, uri: Optional[str] = None) -> Engine:
+    """Atajo a get_registry().get_engine(name, uri)."""
+    return get_registry().get_engine(name, uri)
+
+
+def fetch_all(engine: Engine, sql: str, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Ejecuta una consulta con el engine síncrono y retorna las filas como dicts."""
+    with engine.connect() as conn:
+        return [dict(row) for row in conn.execute(text(sql), params or {}).mappings().all()]
+
+
+async def afetch_all(engine: Engine, sql: str, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Versión async de fetch_all: corre en un hilo y usa el pool síncrono de la base."""
+    return await asyncio.to_thread(fetch_all, engine, sql, params)
+
+
+# ============================================================================
+# TESTS
+# ============================================================================
+
+if __name__ == "__main__":
+    import os
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+
+    PROFILES["demo"] = PoolProfile(settings_key="", pool_size=5, max_overflow=0, pool_timeout=30)
+    db_path = os.path.join(tempfile.mkdtemp(), "eva_demo.db")
+    registry = EngineRegistry(settings=object())
+    engine = registry.get_engine("demo", f"sqlite:///{db_path}")
+    assert registry.get_engine("demo") is engine
+
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE t (id INTEGER PRIMARY KEY, v TEXT)"))
+        conn.execute(text("INSERT INTO t (v) VALUES (:v)"), [{"v": f"fila {i}"} for i in range(1000)])
+
+    SQL = "SELECT id, v FROM t WHERE id % 7 = :m"
+    N = 200
+
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        list(pool.map(lambda i: fetch_all(engine, SQL, {"m": i % 7}), range(20)))   # calentar pool
+
+    async def _concurrentes():
+        return await asyncio.gather(*(afetch_all(engine, SQL, {"m": i % 7}) for i in range(N)))
+
+    inicio = time.perf_counter()
+    resultados = asyncio.run(_concurrentes())
+    print(f"afetch_all: {N} consultas concurrentes en {(time.perf_counter() - inicio) * 1000:.1f} ms")
+    assert sum(map(len, resultados)) == sum(len(fetch_all(engine, SQL, {"m": i % 7})) for i in range(N))
+
+    print(f"✓ Pools: {registry.stats()}")
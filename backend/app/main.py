@@ -1,6 +1,7 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import get_settings
+from app.core.database import get_registry
 from app.api.endpoints import router as ia_router
 from app.services.llamaOrchestor import LlamaOrchestor
 
@@ -37,6 +38,10 @@ async def startup_event():
 async def shutdown_event():
     """Shutdown event."""
     print(f"Shutting down {settings.app_name}")
+    catalog = getattr(app.state.orch.router, "property_catalog", None)
+    if catalog is not None:
+        catalog.stop()
+    get_registry().dispose_all()
 
 
 if __name__ == "__main__":
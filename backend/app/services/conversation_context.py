@@ -4,22 +4,109 @@ Gestiona el contexto de la última propiedad mencionada y detecta referencias im
 """
 
 import re
+import time
 import logging
 from typing import Optional, Dict, Any, List
 from llama_index.core.llms import ChatMessage
 
+from app.services.session_backend import SessionBackend, get_session_backend
+
 logger = logging.getLogger(__name__)
 
 
+class PropertySnapshot:
+    """
+    Lo mínimo de una propiedad para resolver referencias ("a qué banco pertenece?").
+    El resto de columnas se vuelve a leer de la BD por id / url cuando hace falta.
+    """
+
+    __slots__ = ("id", "url", "nombre", "precio", "banco")
+
+    def __init__(self, id=None, url=None, nombre=None, precio=None, banco=None):
+        self.id = id
+        self.url = url
+        self.nombre = nombre
+        self.precio = precio
+        self.banco = banco
+
+    @classmethod
+    def from_property(cls, data: Dict[str, Any]) -> "PropertySnapshot":
+        """Acepta filas de PropertyDatabaseService / BienesDB (property_url, precio_usd, nombre_banco...)."""
+        return cls(
+            id=data.get("id"),
+            url=data.get("property_url") or data.get("url"),
+            nombre=data.get("nombre"),
+            precio=data.get("precio_usd", data.get("precio")),
+            banco=data.get("nombre_banco") or data.get("banco"),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Con las mismas claves que las filas de la BD, para el código que ya las usa."""
+        data = {
+            "id": self.id,
+            "property_url": self.url,
+            "nombre": self.nombre,
+            "precio_usd": self.precio,
+            "nombre_banco": self.banco,
+        }
+        return {k: v for k, v in data.items() if v is not None}
+
+    def pack(self) -> list:
+        return [self.id, self.url, self.nombre, self.precio, self.banco]
+
+    @classmethod
+    def unpack(cls, packed) -> "PropertySnapshot":
+        return cls(*packed)
+
+    def __repr__(self):
+        return f"PropertySnapshot(id={self.id!r}, nombre={self.nombre!r})"
+
+
 class ConversationContext:
     """
     Mantiene el contexto conversacional por sesión.
     Rastrea la última propiedad mencionada para responder preguntas contextuales.
+
+    El estado vive en un SessionBackend, así que cualquier worker puede
+    responder el seguimiento ("dime más de la #2") de una búsqueda hecha en otro.
+    Solo se guardan PropertySnapshot empaquetados (no filas completas), con un
+    máximo de resultados por búsqueda y un TTL por sesión.
     """
     
-    def __init__(self):
-        # {session_id: {last_property: {...}, last_search_results: [...]}}
-        self.sessions = {}
+    def __init__(
+        self,
+        backend: Optional[SessionBackend] = None,
+        ttl: Optional[float] = 2 * 3600,
+        max_search_results: int = 20,
+    ):
+        """
+        Args:
+            backend: Donde se guarda el contexto (por defecto, el configurado en Settings)
+            ttl: Segundos sin actualizar tras los que el contexto de la sesión se ignora (None = el del backend)
+            max_search_results: Máximo de resultados de búsqueda que se recuerdan por sesión
+        """
+        # Contexto por sesión: {last_property: [...], last_search_results: [[...], ...], updated_at}
+        self._backend = backend
+        self.ttl = ttl
+        self.max_search_results = max_search_results
+
+    @property
+    def backend(self) -> SessionBackend:
+        if self._backend is None:
+            self._backend = get_session_backend()
+        return self._backend
+
+    def _context(self, session_id: str) -> Dict[str, Any]:
+        context = self.backend.get_context(session_id)
+        if self.ttl is not None and time.time() - context.get("updated_at", 0) > self.ttl:
+            return {}
+        return context
+
+    def _update(self, session_id: str, key: str, value: Any):
+        context = self._context(session_id)
+        context[key] = value
+        context["updated_at"] = time.time()
+        self.backend.set_context(session_id, context)
     
     def update_last_property(
         self, 
@@ -33,10 +120,7 @@ class ConversationContext:
             session_id: ID de sesión del usuario
             property_data: Datos de la propiedad (nombre, url, precio, banco, etc.)
         """
-        if session_id not in self.sessions:
-            self.sessions[session_id] = {}
-        
-        self.sessions[session_id]['last_property'] = property_data
+        self._update(session_id, 'last_property', PropertySnapshot.from_property(property_data).pack())
         logger.info(f"✓ Contexto actualizado - Última propiedad: {property_data.get('nombre', 'N/A')}")
     
     def update_search_results(
@@ -51,23 +135,31 @@ class ConversationContext:
             session_id: ID de sesión
             results: Lista de propiedades encontradas
         """
-        if session_id not in self.sessions:
-            self.sessions[session_id] = {}
-        
-        self.sessions[session_id]['last_search_results'] = results
+        snapshots = [PropertySnapshot.from_property(r).pack() for r in results[:self.max_search_results]]
+        self._update(session_id, 'last_search_results', snapshots)
         logger.info(f"✓ Resultados de búsqueda guardados: {len(results)} propiedades")
     
-    def get_last_property(self, session_id: str) -> Optional[Dict[str, Any]]:
+    def get_last_snapshot(self, session_id: str) -> Optional[PropertySnapshot]:
         """Obtiene la última propiedad mencionada."""
-        if session_id not in self.sessions:
-            return None
-        return self.sessions[session_id].get('last_property')
+        packed = self._context(session_id).get('last_property')
+        return PropertySnapshot.unpack(packed) if packed else None
+
+    def get_last_property(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Última propiedad como dict (solo las columnas del snapshot)."""
+        snapshot = self.get_last_snapshot(session_id)
+        return snapshot.to_dict() if snapshot else None
     
-    def get_search_results(self, session_id: str) -> List[Dict[str, Any]]:
+    def get_search_results(self, session_id: str) -> List[PropertySnapshot]:
         """Obtiene los resultados de la última búsqueda."""
-        if session_id not in self.sessions:
-            return []
-        return self.sessions[session_id].get('last_search_results', [])
+        return [PropertySnapshot.unpack(p) for p in self._context(session_id).get('last_search_results', [])]
+
+    def stats(self) -> Dict[str, Any]:
+        """Uso de memoria del contexto (según lo que pueda medir el backend)."""
+        return {
+            "ttl": self.ttl,
+            "max_resultados": self.max_search_results,
+            **self.backend.context_stats(),
+        }
     
     def detect_contextual_question(
         self,
@@ -128,10 +220,14 @@ class ConversationContext:
         return expanded
 
 
-# Instancia global
+# Instancia global (la comparten el router y expand_contextual_question)
 _context_manager = ConversationContext()
 
 
+def get_context_manager() -> ConversationContext:
+    return _context_manager
+
+
 def update_property_context(session_id: str, property_data: Dict[str, Any]):
     """Actualiza el contexto de la última propiedad mostrada."""
     _context_manager.update_last_property(session_id, property_data)
@@ -167,7 +263,10 @@ def get_last_property_data(session_id: str) -> Optional[Dict[str, Any]]:
 # ============================================================================
 
 if __name__ == "__main__":
+    from app.services.session_backend import InMemorySessionBackend
+
     logging.basicConfig(level=logging.INFO)
+    _context_manager = ConversationContext(InMemorySessionBackend())
     
     # Simular contexto de sesión
     session = "test-123"
@@ -205,4 +304,26 @@ if __name__ == "__main__":
         else:
             print(f"○ SIN CAMBIOS: '{question}'")
         
-        print("-" * 80)
\ No newline at end of file
+        print("-" * 80)
+
+    # Snapshot vs fila completa
+    import sys
+    fila = {
+        'nombre': 'Casa en El Carmen', 'provincia': 'San José', 'canton': 'Central', 'distrito': 'El Carmen',
+        'precio_usd': 144914, 'precio_local': 75000000, 'tipo_propiedad': 'Casa', 'bedrooms': 3,
+        'bathrooms': 2, 'area_construccion': 180, 'tamanio_lote': 250, 'nombre_banco': 'Banco Nacional',
+        'tipo_oferta': 'Venta', 'agent_name': 'Ana', 'agent_phone_number': '8888-8888',
+        'property_url': 'https://bienesadjudicadoscr.com/propiedades/casa-carmen-123', 'id': 123,
+        'descripcion': 'Amplia casa ' * 80,
+    }
+    snapshot = PropertySnapshot.from_property(fila)
+    tam_fila = sys.getsizeof(fila) + sum(sys.getsizeof(v) for v in fila.values())
+    tam_snapshot = sys.getsizeof(snapshot) + sum(sys.getsizeof(getattr(snapshot, f)) for f in snapshot.__slots__)
+    print(f"Fila completa: {tam_fila} B, snapshot: {tam_snapshot} B")
+    assert not hasattr(snapshot, "__dict__")
+
+    _context_manager.update_search_results(session, [fila] * 50)
+    assert len(_context_manager.get_search_results(session)) == _context_manager.max_search_results
+    _context_manager.ttl = 0
+    assert _context_manager.get_last_property(session) is None   # expirado
+    print(f"✓ {_context_manager.stats()}")
\ No newline at end of file
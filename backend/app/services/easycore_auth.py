@@ -3,16 +3,25 @@ EasycoreAuth - Input validation for user requests
 Adapted from JavaScript InputUser class
 """
 
+import hashlib
 import logging
 import re
+import time
 import jwt
 from typing import Any
-from app.core.config import get_settings
+from app.core.cache import TTLCache
+from app.core.config import get_settings, on_settings_reload
 from app.services.llamaOrchestor import LlamaOrchestor
 
 
 logger = logging.getLogger(__name__)
 
+# Tokens ya validados (sha256 del token -> resultado) hasta su expiración
+TOKEN_CACHE_MAX_TTL = 3600
+_token_cache = TTLCache(maxsize=10000)
+# Si cambia EASYCHAT_SECRET los tokens validados con el anterior dejan de valer
+on_settings_reload(lambda _settings: _token_cache.clear())
+
 
 class EasycoreAuth:
     """User input validation and cleaning."""
@@ -48,6 +57,11 @@ class EasycoreAuth:
         if not normalized_token:
             return {"ok": False, "error": "Token no proporcionado"}
 
+        token_key = hashlib.sha256(normalized_token.encode("utf-8")).hexdigest()
+        cached = _token_cache.get(token_key)
+        if cached is not None:
+            return cached
+
         settings = get_settings()
         secret = settings.easychat_secret
 
@@ -72,15 +86,29 @@ class EasycoreAuth:
 
             logger.info("Token decodificado: id='%s', nombre='%s'", user_id, nombre)
 
-            return {
+            result = {
                 "ok": True,
                 "value": {"id": user_id, "nombre": nombre, "roles": roles}
             }
+            _token_cache.set(token_key, result, ttl=EasycoreAuth._token_ttl(payload))
+            return result
         except jwt.ExpiredSignatureError:
             return {"ok": False, "error": "Token expirado"}
         except jwt.InvalidTokenError as e:
             return {"ok": False, "error": f"Token inválido: {str(e)}"}
 
+    @staticmethod
+    def _token_ttl(payload: dict) -> float:
+        """Segundos que se puede reutilizar un token validado: hasta su `exp`, con tope."""
+        exp = payload.get("exp")
+        if isinstance(exp, (int, float)):
+            return max(0.0, min(exp - time.time(), TOKEN_CACHE_MAX_TTL))
+        return TOKEN_CACHE_MAX_TTL
+
+    @staticmethod
+    def token_cache_stats() -> dict:
+        return _token_cache.stats()
+
     @staticmethod
     def _normalize_authorization_header(value: Any) -> str:
         """Accept common Authorization formats and return raw JWT token."""
@@ -1,31 +1,22 @@
 from __future__ import annotations
 
 import logging
-from functools import lru_cache
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
 
-from app.core.config import get_settings
+from app.core.cache import TTLCache
+from app.core.database import EASYCORE, get_engine
 
 logger = logging.getLogger(__name__)
 
+# Roles por user_id: cambian poco y se consultan en cada request
+ROLES_CACHE_TTL = 300
+_roles_cache = TTLCache(maxsize=10000, default_ttl=ROLES_CACHE_TTL)
 
-@lru_cache(maxsize=1)
-def _easycore_engine():
-    settings = get_settings()
 
-    return create_engine(
-        settings.DB_URI_EASYCORE,
-        pool_pre_ping=True,
-        pool_recycle=1800,
-        pool_timeout=30,
-        connect_args={
-            "connect_timeout": 30,
-            "read_timeout": 30,
-            "write_timeout": 30,
-        },
-    )
+def _easycore_engine():
+    return get_engine(EASYCORE)
 
 
 class EasycoreUserRolesService:
@@ -36,6 +27,10 @@ class EasycoreUserRolesService:
         if not normalized_id.isdigit():
             return []
 
+        cached = _roles_cache.get(normalized_id)
+        if cached is not None:
+            return list(cached)
+
         sql = text(
             """
             SELECT DISTINCT r.name
@@ -56,7 +51,29 @@ class EasycoreUserRolesService:
                     },
                 ).fetchall()
 
-            return [str(row[0]).strip() for row in rows if row and row[0]]
+            roles = [str(row[0]).strip() for row in rows if row and row[0]]
         except SQLAlchemyError as exc:
+            # Sin cache: el siguiente request vuelve a intentar
             logger.warning("No se pudieron obtener roles de EasyCore para user_id=%s: %s", normalized_id, exc)
             return []
+
+        _roles_cache.set(normalized_id, tuple(roles))
+        return roles
+
+    @staticmethod
+    def get_cached_roles(user_id: str) -> list[str] | None:
+        """Roles en cache sin tocar la BD; None si no hay entrada vigente."""
+        cached = _roles_cache.get(str(user_id or "").strip())
+        return list(cached) if cached is not None else None
+
+    @staticmethod
+    def invalidate(user_id: str | None = None) -> None:
+        """Olvida los roles cacheados de un usuario, o de todos si user_id es None."""
+        if user_id is None:
+            _roles_cache.clear()
+        else:
+            _roles_cache.pop(str(user_id).strip())
+
+    @staticmethod
+    def cache_stats() -> dict:
+        return _roles_cache.stats()
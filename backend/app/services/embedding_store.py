@@ -0,0 +1,121 @@
+"""
+PersistedEmbeddings - Vectores de textos estables (descripciones, esquemas) guardados en disco
+
+Cada vector se guarda bajo sha256(modelo + texto): si el texto no cambia entre
+arranques (o entre catálogos por rol que comparten tablas), no se vuelve a
+llamar a la API de embeddings.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+class PersistedEmbeddings:
+    """
+    Uso:
+        store = PersistedEmbeddings(".cache/table_embeddings.json", Settings.embed_model)
+        vectors = store.get_or_embed(["texto 1", "texto 2"])
+    """
+
+    def __init__(self, persist_path: Optional[str], embed_model):
+        """
+        Args:
+            persist_path: Archivo JSON con los vectores (None = solo memoria)
+            embed_model: Modelo de embeddings de LlamaIndex
+        """
+        self.persist_path = persist_path
+        self.embed_model = embed_model
+        self._lock = threading.Lock()
+        self._vectors: Dict[str, List[float]] = self._load()
+        self.embedded = 0
+        self.reused = 0
+
+    def key(self, text: str) -> str:
+        model_name = getattr(self.embed_model, "model_name", type(self.embed_model).__name__)
+        return hashlib.sha256(f"{model_name}\n{text}".encode("utf-8")).hexdigest()
+
+    def _load(self) -> Dict[str, List[float]]:
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return {}
+        try:
+            with open(self.persist_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ No se pudo leer {self.persist_path}: {e}")
+            return {}
+
+    def _persist(self):
+        if not self.persist_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.persist_path) or ".", exist_ok=True)
+            tmp_path = f"{self.persist_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._vectors, f)
+            os.replace(tmp_path, self.persist_path)
+        except OSError as e:
+            logger.warning(f"⚠️ No se pudieron guardar los vectores en {self.persist_path}: {e}")
+
+    def get_or_embed(self, texts: Sequence[str]) -> List[List[float]]:
+        """Vectores de `texts`, embebiendo (en un solo batch) solo los que no están en disco."""
+        keys = [self.key(t) for t in texts]
+        with self._lock:
+            missing = {k: t for k, t in zip(keys, texts) if k not in self._vectors}
+            if missing:
+                logger.info(f"🧮 Embebiendo {len(missing)} textos nuevos ({len(texts) - len(missing)} desde disco)")
+                vectors = self.embed_model.get_text_embedding_batch(list(missing.values()))
+                for k, vector in zip(missing.keys(), vectors):
+                    self._vectors[k] = list(vector)
+                self._persist()
+            self.embedded += len(missing)
+            self.reused += len(texts) - len(missing)
+            return [self._vectors[k] for k in keys]
+
+    def prune(self, texts: Sequence[str]):
+        """Deja en disco solo los vectores de `texts` (útil cuando el conjunto es cerrado)."""
+        keep = {self.key(t) for t in texts}
+        with self._lock:
+            if set(self._vectors) - keep:
+                self._vectors = {k: v for k, v in self._vectors.items() if k in keep}
+                self._persist()
+
+
+# ============================================================================
+# TESTS
+# ============================================================================
+
+if __name__ == "__main__":
+    import tempfile
+    import time
+
+    from llama_index.core.embeddings import MockEmbedding
+
+    class _SlowEmbedding(MockEmbedding):
+        """Simula la latencia de la API de embeddings (~300 ms por batch)."""
+
+        def _get_text_embeddings(self, texts):
+            time.sleep(0.3)
+            return super()._get_text_embeddings(texts)
+
+    textos = [f"Tabla tabla_{i}: columnas id, nombre, estado, user_id ..." for i in range(40)]
+    path = os.path.join(tempfile.mkdtemp(), "table_embeddings.json")
+
+    inicio = time.perf_counter()
+    PersistedEmbeddings(path, _SlowEmbedding(embed_dim=1536)).get_or_embed(textos)
+    print(f"Arranque en frío (embebe 40 esquemas): {(time.perf_counter() - inicio) * 1000:.0f} ms")
+
+    inicio = time.perf_counter()
+    store = PersistedEmbeddings(path, _SlowEmbedding(embed_dim=1536))
+    store.get_or_embed(textos)
+    print(f"Arranque con vectores en disco: {(time.perf_counter() - inicio) * 1000:.0f} ms")
+
+    inicio = time.perf_counter()
+    store.get_or_embed(textos[:12])
+    print(f"Primer request de un rol (subconjunto): {(time.perf_counter() - inicio) * 1000:.2f} ms")
+    assert store.embedded == 0 and store.reused == 52
@@ -0,0 +1,185 @@
+"""
+GreetingReminders - Recordatorios del saludo inicial (GET /api/saludo) en paralelo y con cache
+
+El saludo consulta tres fuentes independientes (RRHH, clientes, operations).
+Aquí se lanzan a la vez y cada resultado se guarda por usuario con un TTL
+corto. Para no mostrar datos viejos, cada `probe_interval` segundos se lee una
+huella (COUNT + MAX(updated_at)) de las tablas de recordatorios en una sola
+consulta; si cambió, se vacía el cache.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+from app.core.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+# Tablas que alimentan los recordatorios del saludo
+REMINDER_TABLES = (
+    "leave_requests",
+    "credit_study_requests",
+    "employees",
+    "administrative_reminders",
+    "customer_reminders",
+)
+
+_FINGERPRINT_SQL = " UNION ALL ".join(
+    f"SELECT '{table}' AS tabla, COUNT(*) AS total, MAX(updated_at) AS ultimo FROM {table}"
+    for table in REMINDER_TABLES
+)
+
+
+class GreetingReminders:
+    """
+    Uso:
+        greeting = GreetingReminders(orch)
+        reminders = await greeting.fetch(user_id, user_roles)
+        reminders["rrhh"], reminders["customer"], reminders["operations"]
+    """
+
+    def __init__(self, orch, ttl: float = 60, probe_interval: Optional[float] = 10, engine=None):
+        """
+        Args:
+            orch: LlamaOrchestor (expone get_rrhh_reminders / get_customer_reminders / get_operations_reminders)
+            ttl: Segundos que vive cada resultado en cache
+            probe_interval: Cada cuántos segundos se revisa la huella de las tablas (None = solo TTL)
+            engine: Engine de Easycore para la huella (por defecto, el del registro)
+        """
+        self.orch = orch
+        self.cache = TTLCache(maxsize=5000, default_ttl=ttl)
+        self.probe_interval = probe_interval
+        self._engine = engine
+        self._fingerprint = None
+        self._last_probe = 0.0
+        self._probe_lock = threading.Lock()
+        self.invalidations = 0
+        self.probe_errors = 0
+
+    # -------- Invalidación --------
+    def invalidate(self):
+        """Vacía el cache (p. ej. tras modificar recordatorios desde otra ruta)."""
+        self.cache.clear()
+        self.invalidations += 1
+
+    def _read_fingerprint(self) -> tuple:
+        from app.core.database import EASYCORE, fetch_all, get_engine
+
+        engine = self._engine or get_engine(EASYCORE)
+        rows = fetch_all(engine, _FINGERPRINT_SQL)
+        return tuple((row["tabla"], row["total"], str(row["ultimo"])) for row in rows)
+
+    def _check_changes(self):
+        """Lee la huella como máximo una vez por probe_interval y vacía el cache si cambió."""
+        if self.probe_interval is None:
+            return
+
+        with self._probe_lock:
+            now = time.monotonic()
+            if now - self._last_probe < self.probe_interval:
+                return
+            self._last_probe = now
+
+            try:
+                fingerprint = self._read_fingerprint()
+            except Exception as e:
+                # Un fallo puntual (BD caída, timeout) no apaga la revisión: se reintenta en el siguiente intervalo
+                self.probe_errors += 1
+                logger.warning(f"⚠️ No se pudo leer la huella de recordatorios ({str(e)[:100]}); se reintenta en {self.probe_interval}s")
+                return
+
+            if self._fingerprint is not None and fingerprint != self._fingerprint:
+                logger.info("🔄 Cambiaron las tablas de recordatorios, se vacía el cache del saludo")
+                self.invalidate()
+            self._fingerprint = fingerprint
+
+    # -------- Consulta --------
+    async def _aget(self, key: Hashable, fetch: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        try:
+            result = await asyncio.to_thread(fetch)
+        except Exception as e:
+            # Solo esta sección del saludo queda vacía; las otras fuentes se muestran igual
+            logger.warning(f"⚠️ Recordatorios {key[0]} no disponibles: {str(e)[:100]}")
+            return {"authorized": True, "count": 0, "reminders": [], "error": str(e)}
+        # Solo se guardan resultados completos: los no autorizados no tocan BD y los errores se reintentan
+        if result.get("authorized") and "error" not in result:
+            self.cache.set(key, result)
+        return result
+
+    async def fetch(self, user_id, user_roles: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Recordatorios de las tres fuentes, consultadas en paralelo."""
+        await asyncio.to_thread(self._check_changes)
+
+        roles_key = "|".join(sorted(str(r).lower().strip() for r in user_roles or []))
+        rrhh, customer, operations = await asyncio.gather(
+            self._aget(("rrhh", user_id, roles_key), lambda: self.orch.get_rrhh_reminders(user_roles)),
+            self._aget(("customer", user_id), lambda: self.orch.get_customer_reminders(user_id)),
+            self._aget(
+                ("operations", user_id, roles_key),
+                lambda: self.orch.get_operations_reminders(user_id, user_roles),
+            ),
+        )
+        return {"rrhh": rrhh, "customer": customer, "operations": operations}
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.cache.stats(), "invalidaciones": self.invalidations, "errores_huella": self.probe_errors}
+
+
+# ============================================================================
+# TESTS
+# ============================================================================
+
+if __name__ == "__main__":
+    class _FakeOrch:
+        """Cada fuente simula una consulta de 80 ms a Easycore."""
+
+        def _slow(self, n: int) -> Dict[str, Any]:
+            time.sleep(0.08)
+            return {"authorized": True, "count": n, "reminders": []}
+
+        def get_rrhh_reminders(self, user_roles):
+            return self._slow(1)
+
+        def get_customer_reminders(self, user_id=None):
+            return self._slow(2)
+
+        def get_operations_reminders(self, user_id, user_roles):
+            return self._slow(3)
+
+    orch = _FakeOrch()
+    greeting = GreetingReminders(orch, probe_interval=None)
+    roles = ["rrhh", "operations"]
+
+    inicio = time.perf_counter()
+    orch.get_rrhh_reminders(roles), orch.get_customer_reminders(7), orch.get_operations_reminders(7, roles)
+    print(f"Secuencial (antes): {(time.perf_counter() - inicio) * 1000:.0f} ms")
+
+    inicio = time.perf_counter()
+    frio = asyncio.run(greeting.fetch(7, roles))
+    print(f"Paralelo, cache frío: {(time.perf_counter() - inicio) * 1000:.0f} ms")
+
+    inicio = time.perf_counter()
+    caliente = asyncio.run(greeting.fetch(7, roles))
+    print(f"Paralelo, cache caliente: {(time.perf_counter() - inicio) * 1000:.2f} ms")
+
+    assert frio == caliente
+    greeting.invalidate()
+    assert len(greeting.cache) == 0
+
+    # Una fuente que falla no tumba el saludo completo
+    def _falla(user_id=None):
+        raise RuntimeError("Easycore no responde")
+
+    orch.get_customer_reminders = _falla
+    parcial = asyncio.run(greeting.fetch(7, roles))
+    assert parcial["rrhh"]["count"] == 1 and parcial["operations"]["count"] == 3
+    assert "error" in parcial["customer"]
+    print(f"✓ {greeting.stats()}")
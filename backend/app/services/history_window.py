@@ -0,0 +1,177 @@
+"""
+HistoryWindow - Historial de una sesión con presupuesto de tokens
+
+Reemplaza a `Memory.get()` + `[-10:]` en el orquestador: los mensajes se
+cuentan (en tokens) una sola vez al llegar, los que salen de la ventana se
+resumen en una línea y el texto de contexto para el router se arma solo al
+agregar mensajes. Construir la consulta contextual de un turno no depende del
+largo de la conversación.
+"""
+
+import logging
+from collections import deque
+from typing import Any, Callable, Deque, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+_SUMMARY_HEADER = "Resumen de la conversación anterior:"
+_RECENT_HEADER = "Conversación reciente:"
+
+
+class HistoryWindow:
+    """
+    Uso:
+        window = HistoryWindow(max_tokens=1500, tokenizer=get_tokenizer())
+        window.put_messages([ChatMessage(...), ChatMessage(...)])
+        window.messages              # últimos mensajes (objetos originales)
+        window.prompt("y la anterior?")
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 1500,
+        max_messages: int = 10,
+        summary_tokens: int = 300,
+        summary_words: int = 25,
+        tokenizer: Optional[Callable[[str], list]] = None,
+    ):
+        """
+        Args:
+            max_tokens: Presupuesto del texto de contexto (resumen + turnos recientes)
+            max_messages: Máximo de mensajes completos en la ventana
+            summary_tokens: Parte del presupuesto reservada para el resumen de lo anterior
+            summary_words: Palabras que se conservan de cada mensaje al resumirlo
+            tokenizer: Función texto -> tokens (por defecto, len(texto) // 4)
+        """
+        self.max_tokens = max_tokens
+        self.max_messages = max_messages
+        self.summary_tokens = summary_tokens
+        self.summary_words = summary_words
+        self.tokenizer = tokenizer
+        # (mensaje, línea "rol: contenido", tokens de la línea)
+        self._window: Deque[Tuple[Any, str, int]] = deque()
+        self._window_tokens = 0
+        # Resumen: (línea, tokens), de la más vieja a la más reciente
+        self._summary: Deque[Tuple[str, int]] = deque()
+        self._summary_tokens = 0
+        self._rendered = ""
+        self.total_messages = 0
+
+    # -------- Escritura --------
+    def _count(self, text: str) -> int:
+        return len(self.tokenizer(text)) if self.tokenizer else len(text) // 4
+
+    @staticmethod
+    def _line(message: Any) -> str:
+        if isinstance(message, tuple):
+            return f"{message[0]}: {message[1] or ''}"
+        role = getattr(message, "role", "user")
+        return f"{getattr(role, 'value', role)}: {getattr(message, 'content', message) or ''}"
+
+    def put_messages(self, messages: Sequence[Any]):
+        for message in messages:
+            line = self._line(message)
+            tokens = self._count(line)
+            self._window.append((message, line, tokens))
+            self._window_tokens += tokens
+            self.total_messages += 1
+
+        # El último mensaje siempre se queda completo (el detector de referencias necesita sus URLs)
+        window_budget = self.max_tokens - self.summary_tokens
+        while len(self._window) > 1 and (
+            len(self._window) > self.max_messages or self._window_tokens > window_budget
+        ):
+            message, line, tokens = self._window.popleft()
+            self._window_tokens -= tokens
+            self._fold(line)
+
+        self._render()
+
+    async def aput_messages(self, messages: Sequence[Any]):
+        self.put_messages(messages)
+
+    def _fold(self, line: str):
+        """Pasa un mensaje que sale de la ventana al resumen (sus primeras palabras)."""
+        words = line.split()
+        short = " ".join(words[:self.summary_words]) + (" …" if len(words) > self.summary_words else "")
+        tokens = self._count(short)
+        self._summary.append((short, tokens))
+        self._summary_tokens += tokens
+        while len(self._summary) > 1 and self._summary_tokens > self.summary_tokens:
+            _, old = self._summary.popleft()
+            self._summary_tokens -= old
+
+    def _render(self):
+        parts: List[str] = []
+        budget = self.max_tokens
+        if self._summary:
+            parts.append(_SUMMARY_HEADER)
+            parts.extend(line for line, _ in self._summary)
+            parts.append(_RECENT_HEADER)
+            budget -= self._summary_tokens + self._count(_SUMMARY_HEADER + _RECENT_HEADER)
+        recent: List[str] = []
+        for _, line, tokens in reversed(self._window):
+            if tokens > budget:
+                # Mensaje largo (p. ej. un listado de propiedades): se recorta al presupuesto que queda
+                if budget > 0:
+                    recent.append(line[: budget * 4 - 8] + " …")
+                break
+            recent.append(line)
+            budget -= tokens
+        parts.extend(reversed(recent))
+        self._rendered = "\n".join(parts)
+
+    # -------- Lectura --------
+    @property
+    def messages(self) -> List[Any]:
+        """Mensajes completos de la ventana, del más viejo al más reciente."""
+        return [message for message, _, _ in self._window]
+
+    @property
+    def summary(self) -> str:
+        return "\n".join(line for line, _ in self._summary)
+
+    @property
+    def tokens(self) -> int:
+        return self._window_tokens + self._summary_tokens
+
+    def render(self) -> str:
+        """Resumen + turnos recientes dentro de max_tokens (precalculado al agregar mensajes)."""
+        return self._rendered
+
+    def prompt(self, mensaje: str) -> str:
+        """Consulta para el router con el historial como contexto."""
+        return f"{self._rendered}\nUsuario: {mensaje}" if self._rendered else mensaje
+
+    def footprint(self) -> Tuple[int, int]:
+        """(tokens, bytes) que retiene la ventana; lo usa SessionMemoryStore para su presupuesto."""
+        size = sum(len(line.encode("utf-8")) for _, line, _ in self._window)
+        size += sum(len(line.encode("utf-8")) for line, _ in self._summary)
+        return self.tokens, size
+
+
+# ============================================================================
+# TESTS
+# ============================================================================
+
+if __name__ == "__main__":
+    import time
+
+    window = HistoryWindow(max_tokens=400, summary_tokens=100)
+    listado = "Resultados: " + " ".join(f"https://bienesadjudicadoscr.com/propiedades/casa-{i}" for i in range(60))
+
+    for turno in range(200):
+        window.put_messages([("user", f"pregunta número {turno} sobre casas"), ("assistant", f"respuesta {turno}")])
+    window.put_messages([("assistant", listado)])
+
+    assert window.messages[-1][1] == listado                 # el último mensaje se conserva completo
+    # Cada línea se cuenta por separado: el total puede redondear ~1 token por línea
+    assert len(window.render()) // 4 <= window.max_tokens + window.render().count("\n")
+    assert window.summary.splitlines()[-1].startswith("assistant: respuesta 199")
+    print(window.prompt("y la anterior?")[:300], "...")
+
+    inicio = time.perf_counter()
+    for _ in range(10000):
+        window.prompt("y la anterior?")
+    print(f"prompt(): {(time.perf_counter() - inicio) / 10000 * 1e6:.2f} µs por turno")
+    print(f"✓ {window.total_messages} mensajes, {window.tokens} tokens retenidos, footprint {window.footprint()}")
@@ -1,14 +1,19 @@
 import logging
 from app.core.config import get_settings
-from llama_index.llms.openai import OpenAI
 from llama_index.core import Settings
 from app.services.tools.Router import llamaRouter
 from app.data import evaPrompt
 from llama_index.embeddings.openai.base import OpenAIEmbedding
-from llama_index.core.memory import Memory
 from llama_index.core.llms import ChatMessage
+from llama_index.core.utils import get_tokenizer
 from app.services.property_detector import detect_property_reference
 from app.services.conversation_context import expand_contextual_question
+from app.services.llm_client import get_llm
+from app.services.request_context import request_scope
+from app.services.greeting_reminders import GreetingReminders
+from app.services.session_memory import SessionMemoryStore
+from app.services.history_window import HistoryWindow
+from app.services.session_backend import get_session_backend
 
 logger = logging.getLogger(__name__)
 
@@ -17,23 +22,11 @@ class LlamaOrchestor:
         self.settings = settings
         
         
-        Settings.llm= OpenAI(
-            api_key=self.settings.openai_api_key,
-            model=self.settings.openai_model,
-            max_tokens=self.settings.openai_max_tokens,
-            temperature=0.1,
-            timeout=120.0,
-            system_prompt=(
-                "Responde en español. Tienes acceso a bases de datos como Easycore y Bienes Adjudicados y a un servicio externo de internet. "
-                "Elige la herramienta adecuada según la consulta del usuario. "
-                "Cuando proporciones información o listados de propiedades, debes incluir explícitamente a qué banco pertenecen. "
-                "Si el usuario te solicita redactar o hacer posts/publicaciones para redes sociales, utiliza la herramienta posts_generation. "
-                "Si el usuario pregunta específicamente por bancos, estadísticas de bancos o propiedades de un banco, utiliza la herramienta bancos. "
-                "Cuando generes consultas SQL para buscar personas por nombre, utiliza LIKE en vez de igualdad exacta. "
-                "Por ejemplo: WHERE nombre LIKE '%Silvia%' en vez de WHERE nombre = 'Silvia'. "
-                "Haz la búsqueda insensible a mayúsculas y busca tanto en nombre como en apellido. "
-                "Si el usuario da solo el nombre, busca coincidencias parciales en nombre y apellido. "
-            )
+        # Cliente único por proceso: el nombre del usuario se inyecta por llamada
+        Settings.llm = get_llm(
+            self.settings.openai_api_key,
+            self.settings.openai_model,
+            self.settings.openai_max_tokens,
         )
 
         self.idUsuario= None
@@ -44,62 +37,34 @@ class LlamaOrchestor:
             timeout=120.0
         )
         self.router = llamaRouter.LlamaRouter(settings)
-
-        self.memories = {}  # session_id -> Memory
+        self.greeting_reminders = GreetingReminders(self)
+
+        # session_id -> HistoryWindow, con desalojo por LRU, inactividad y presupuesto de tokens/bytes.
+        # Con un backend compartido (session_backend_url) el historial sobrevive reinicios y se ve entre workers.
+        tokenizer = get_tokenizer()
+        self.memories = SessionMemoryStore(
+            lambda session_id: HistoryWindow(max_tokens=self.settings.history_window_tokens, tokenizer=tokenizer),
+            tokenizer=tokenizer,
+            backend=get_session_backend(),
+            to_message=lambda role, content: ChatMessage(role=role, content=content),
+        )
         
-    def _mem(self, session_id: str) -> Memory:
-        if session_id not in self.memories:
-            self.memories[session_id] = Memory.from_defaults(
-                session_id=session_id,
-                token_limit=20000
-            )
+    def _mem(self, session_id: str) -> HistoryWindow:
         self.idUsuario = session_id
-    
-        return self.memories[self.idUsuario]
+        return self.memories.get(session_id)
 
-    def procesar_mensaje(self, mensaje: str , session_id: str, nombreUsuario: str, user_roles: list[str] | None = None) -> str:
-        """
-        Procesa un mensaje usando routing + memoria por sesión.
+    async def _amem(self, session_id: str) -> HistoryWindow:
+        self.idUsuario = session_id
+        return await self.memories.aget(session_id)
 
-        - Router decide usando SOLO el mensaje actual.
-        - Memoria se usa cuando el usuario hace referencias contextuales.
-        - Guarda user + assistant en memoria.
+    def _construir_consulta(self, mensaje: str, session_id: str, mem: HistoryWindow) -> tuple[str, str]:
         """
+        Resuelve referencias contextuales y arma el texto que recibe el router.
 
-        # Actualizar system prompt dinámicamente con el nombre del usuario
-        user_context = f"Estás conversando con {nombreUsuario}. " if nombreUsuario else "Estás conversando con el usuario. "
-        dynamic_system_prompt = (
-            f"{user_context}"
-            "Responde en español. Tienes acceso a bases de datos como Easycore y Bienes Adjudicados y a un servicio externo de internet. "
-            "Elige la herramienta adecuada según la consulta del usuario. "
-            "Cuando proporciones información o listados de propiedades, debes incluir explícitamente a qué banco pertenecen. "
-            "Si el usuario te solicita redactar o hacer posts/publicaciones para redes sociales, utiliza la herramienta posts_generation. "
-            "Si el usuario pregunta específicamente por bancos, estadísticas de bancos o propiedades de un banco, utiliza la herramienta bancos. "
-            "Cuando generes consultas SQL para buscar personas por nombre, utiliza LIKE en vez de igualdad exacta. "
-            "Por ejemplo: WHERE nombre LIKE '%Silvia%' en vez de WHERE nombre = 'Silvia'. "
-            "Haz la búsqueda insensible a mayúsculas y busca tanto en nombre como en apellido. "
-            "Si el usuario da solo el nombre, busca coincidencias parciales en nombre y apellido. "
-        )
-        Settings.llm = OpenAI(
-            api_key=self.settings.openai_api_key,
-            model=self.settings.openai_model,
-            max_tokens=self.settings.openai_max_tokens,
-            temperature=0.1,
-            timeout=120.0,
-            system_prompt=dynamic_system_prompt
-        )
-
-        # Obtener memoria de la sesión
-        mem = self._mem(session_id)
-
-        # Recuperar historial relevante
-        chat_history = mem.get(input=mensaje) or []
-
-        # Tomar últimos turnos para contexto (evita prompts gigantes)
-        last = chat_history[-10:]
-
-
-        mensaje = detect_property_reference(mensaje, last)
+        Returns:
+            (mensaje procesado, texto de consulta para el router)
+        """
+        mensaje = detect_property_reference(mensaje, mem.messages)
         mensaje = expand_contextual_question(mensaje, session_id)
         # Detectar si el usuario está haciendo referencia contextual
         ref_words = (
@@ -110,26 +75,76 @@ class LlamaOrchestor:
 
         usar_historial = any(w in mensaje.lower() for w in ref_words)
 
-        # Routing (selector decide tool)
-        query_text = mensaje if not usar_historial else "\n".join([f"{h.role}: {h.content}" for h in last]) + "\nUsuario: " + mensaje
-        raw = self.router.query(query_text, session_id=session_id, user_roles=user_roles or [])
+        # Routing (selector decide tool); el texto del historial ya viene armado y dentro del presupuesto
+        query_text = mensaje if not usar_historial else mem.prompt(mensaje)
+        return mensaje, query_text
+
+    def _user_id(self, session_id: str):
+        """La sesión es el ID del usuario en Easycore (ver /api/chat)."""
+        try:
+            return int(session_id)
+        except (TypeError, ValueError):
+            return None
 
+    def _normalizar_respuesta(self, raw) -> str:
         resp = raw.response if hasattr(raw, "response") else raw
-        
+
         # seguridad: si por alguna razón llega bytes
         if isinstance(resp, (bytes, bytearray)):
             resp = resp.decode("utf-8", errors="replace")
 
-        resp = str(resp)
+        return str(resp)
+
+    def _mensajes_a_guardar(self, nombreUsuario: str, mensaje: str, resp: str) -> list[ChatMessage]:
+        return [
+            ChatMessage(role="user", content=f"{nombreUsuario}: {mensaje}"),
+            ChatMessage(role="assistant", content=resp),
+        ]
+
+    def procesar_mensaje(self, mensaje: str , session_id: str, nombreUsuario: str, user_roles: list[str] | None = None) -> str:
+        """
+        Procesa un mensaje usando routing + memoria por sesión.
+
+        - Router decide usando SOLO el mensaje actual.
+        - Memoria se usa cuando el usuario hace referencias contextuales.
+        - Guarda user + assistant en memoria.
+        """
+        # El nombre viaja en el contexto de la request y el cliente LLM lo inyecta por llamada
+        with request_scope(nombre_usuario=nombreUsuario or None):
+            # Historial de la sesión (ventana de últimos turnos + resumen, acotada en tokens)
+            mem = self._mem(session_id)
+
+            mensaje, query_text = self._construir_consulta(mensaje, session_id, mem)
+            raw = self.router.query(query_text, session_id=session_id, user_roles=user_roles or [], user_id=self._user_id(session_id))
+            resp = self._normalizar_respuesta(raw)
+
+            # Guardar en memoria (si no es tool)
+            if not self.router.is_tool_response(resp):
+                mensajes = self._mensajes_a_guardar(nombreUsuario, mensaje, resp)
+                mem.put_messages(mensajes)
+                self.memories.record(session_id, mensajes)
+            return resp
+
+    async def aprocesar_mensaje(self, mensaje: str, session_id: str, nombreUsuario: str, user_roles: list[str] | None = None) -> str:
+        """
+        Versión async de procesar_mensaje.
+
+        Usa las variantes async de memoria, router y engines para no bloquear
+        el event loop de uvicorn mientras se espera al LLM, Tavily o la BD.
+        """
+        # El nombre viaja en el contexto de la request y el cliente LLM lo inyecta por llamada
+        with request_scope(nombre_usuario=nombreUsuario or None):
+            mem = await self._amem(session_id)
+            mensaje, query_text = self._construir_consulta(mensaje, session_id, mem)
+            raw = await self.router.aquery(query_text, session_id=session_id, user_roles=user_roles or [], user_id=self._user_id(session_id))
+            resp = self._normalizar_respuesta(raw)
+
+            if not self.router.is_tool_response(resp):
+                mensajes = self._mensajes_a_guardar(nombreUsuario, mensaje, resp)
+                await mem.aput_messages(mensajes)
+                await self.memories.arecord(session_id, mensajes)
+            return resp
 
-        # Guardar en memoria (si no es tool)
-        if not self.router.is_tool_response(resp):
-            mem.put_messages([
-                ChatMessage(role="user", content=f"{nombreUsuario}: {mensaje}"),
-                ChatMessage(role="assistant", content=resp),
-            ])
-        return resp
-    
     def obtenerIDUsuario(self):
         return self.idUsuario
 
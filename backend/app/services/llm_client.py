@@ -0,0 +1,148 @@
+"""
+Cliente LLM de larga vida para EVA
+
+Antes cada mensaje construía un `OpenAI(...)` nuevo y sobrescribía
+`Settings.llm` sólo para meter el nombre del usuario en el system prompt:
+eso recreaba el cliente HTTP en cada turno y, con requests concurrentes,
+un usuario podía recibir el prompt de otro.
+
+Ahora hay un único cliente por proceso (mismo pool de conexiones) con el
+system prompt estático, y el nombre del usuario se inyecta por llamada como
+un mensaje de sistema adicional, leído del RequestContext de la request.
+"""
+
+import logging
+from functools import lru_cache
+from typing import List, Sequence
+
+from llama_index.core.llms import ChatMessage, MessageRole
+from llama_index.llms.openai import OpenAI
+
+from app.services.request_context import get_request_context
+
+logger = logging.getLogger(__name__)
+
+
+EVA_SYSTEM_PROMPT = (
+    "Responde en español. Tienes acceso a bases de datos como Easycore y Bienes Adjudicados y a un servicio externo de internet. "
+    "Elige la herramienta adecuada según la consulta del usuario. "
+    "Cuando proporciones información o listados de propiedades, debes incluir explícitamente a qué banco pertenecen. "
+    "Si el usuario te solicita redactar o hacer posts/publicaciones para redes sociales, utiliza la herramienta posts_generation. "
+    "Si el usuario pregunta específicamente por bancos, estadísticas de bancos o propiedades de un banco, utiliza la herramienta bancos. "
+    "Cuando generes consultas SQL para buscar personas por nombre, utiliza LIKE en vez de igualdad exacta. "
+    "Por ejemplo: WHERE nombre LIKE '%Silvia%' en vez de WHERE nombre = 'Silvia'. "
+    "Haz la búsqueda insensible a mayúsculas y busca tanto en nombre como en apellido. "
+    "Si el usuario da solo el nombre, busca coincidencias parciales en nombre y apellido. "
+)
+
+
+def user_context_prefix(nombre_usuario: str | None) -> str:
+    """Prefijo con el nombre del usuario que se antepone a cada llamada."""
+    if nombre_usuario:
+        return f"Estás conversando con {nombre_usuario}. "
+    return "Estás conversando con el usuario. "
+
+
+class EvaOpenAI(OpenAI):
+    """
+    OpenAI con inyección del usuario por llamada.
+
+    El system prompt del cliente es fijo; `_extend_messages` agrega un mensaje
+    de sistema con el nombre del usuario de la request actual, sin mutar el
+    cliente compartido.
+    """
+
+    def _extend_messages(self, messages: Sequence[ChatMessage]) -> List[ChatMessage]:
+        messages = super()._extend_messages(messages)
+        prefix = ChatMessage(
+            role=MessageRole.SYSTEM,
+            content=user_context_prefix(get_request_context().nombre_usuario),
+        )
+        return [prefix, *messages]
+
+
+@lru_cache(maxsize=1)
+def get_llm(api_key: str, model: str, max_tokens: int) -> EvaOpenAI:
+    """Retorna el cliente LLM compartido del proceso (se crea una sola vez)."""
+    logger.info(f"✓ Cliente LLM creado ({model})")
+    return EvaOpenAI(
+        api_key=api_key,
+        model=model,
+        max_tokens=max_tokens,
+        temperature=0.1,
+        timeout=120.0,
+        system_prompt=EVA_SYSTEM_PROMPT,
+    )
+
+
+def complete_text(llm, prompt: str) -> str:
+    """
+    `llm.complete(prompt).text`, pero si la request es de /api/chat/stream
+    emite cada delta al cliente a medida que llega.
+    """
+    stream = get_request_context().stream
+    if stream is None:
+        return llm.complete(prompt).text
+
+    parts = []
+    for chunk in llm.stream_complete(prompt):
+        if chunk.delta:
+            parts.append(chunk.delta)
+            stream.emit(chunk.delta)
+    return "".join(parts)
+
+
+async def acomplete_text(llm, prompt: str) -> str:
+    """Versión async de complete_text."""
+    stream = get_request_context().stream
+    if stream is None:
+        return (await llm.acomplete(prompt)).text
+
+    parts = []
+    async for chunk in await llm.astream_complete(prompt):
+        if chunk.delta:
+            parts.append(chunk.delta)
+            stream.emit(chunk.delta)
+    return "".join(parts)
+
+
+# ============================================================================
+# TESTS
+# ============================================================================
+
+if __name__ == "__main__":
+    import time
+
+    from app.services.request_context import request_scope
+
+    N = 200
+    kwargs = dict(api_key="sk-benchmark", model="gpt-4.1-2025-04-14", max_tokens=2000)
+    mensajes = [ChatMessage(role=MessageRole.USER, content="¿Cuántas propiedades tiene el BCR?")]
+
+    # Antes: un cliente nuevo por turno con el nombre en el system prompt
+    inicio = time.perf_counter()
+    for i in range(N):
+        llm = OpenAI(
+            **kwargs,
+            temperature=0.1,
+            timeout=120.0,
+            system_prompt=user_context_prefix(f"Usuario {i}") + EVA_SYSTEM_PROMPT,
+        )
+        llm._extend_messages(mensajes)
+    antes = (time.perf_counter() - inicio) / N
+
+    # Ahora: cliente compartido + prefijo por llamada
+    inicio = time.perf_counter()
+    for i in range(N):
+        with request_scope(nombre_usuario=f"Usuario {i}"):
+            get_llm(**kwargs)._extend_messages(mensajes)
+    ahora = (time.perf_counter() - inicio) / N
+
+    print(f"Overhead por turno (antes): {antes * 1000:.3f} ms")
+    print(f"Overhead por turno (ahora): {ahora * 1000:.3f} ms")
+    print(f"Mejora: {antes / ahora:.1f}x")
+
+    with request_scope(nombre_usuario="Ana"):
+        extendidos = get_llm(**kwargs)._extend_messages(mensajes)
+    assert extendidos[0].content == user_context_prefix("Ana")
+    print("✓ Nombre del usuario inyectado por llamada")
@@ -0,0 +1,100 @@
+"""
+Contexto por request - Datos del usuario que viajan con cada consulta
+
+Los engines del router son singletons compartidos entre todos los usuarios.
+En lugar de asignarles roles / user_id / session_id (estado mutable compartido),
+el router abre un `request_scope` y cada engine lee el contexto de la request
+actual con `get_request_context()`.
+
+Se basa en contextvars, así que cada tarea asyncio y cada hilo lanzado con
+`asyncio.to_thread` ve únicamente el contexto de su propia request.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Iterator, List, Optional
+
+
+@dataclass(frozen=True)
+class RequestContext:
+    """Datos del usuario autenticado para la request en curso."""
+    session_id: Optional[str] = None
+    user_id: Optional[int] = None
+    user_roles: List[str] = field(default_factory=list)
+    nombre_usuario: Optional[str] = None
+    # ResponseStream de /api/chat/stream (None en /api/chat)
+    stream: Optional[Any] = None
+
+
+_EMPTY_CONTEXT = RequestContext()
+
+_request_context: ContextVar[RequestContext] = ContextVar("eva_request_context", default=_EMPTY_CONTEXT)
+
+
+def get_request_context() -> RequestContext:
+    """Retorna el contexto de la request actual (vacío si no hay ninguna activa)."""
+    return _request_context.get()
+
+
+@contextmanager
+def request_scope(
+    session_id: Optional[str] = None,
+    user_id: Optional[int] = None,
+    user_roles: Optional[List[str]] = None,
+    nombre_usuario: Optional[str] = None,
+    stream: Optional[Any] = None,
+) -> Iterator[RequestContext]:
+    """
+    Activa un RequestContext durante el bloque `with` y restaura el anterior al salir.
+
+    Los campos que llegan en None se heredan del contexto activo, así el
+    orquestador y el router pueden anidar scopes sin perder datos.
+
+    Ejemplo:
+        with request_scope(session_id="42", user_id=42, user_roles=["admin"]):
+            engine.query("¿Cuántos empleados hay?")
+    """
+    parent = _request_context.get()
+    ctx = RequestContext(
+        session_id=session_id if session_id is not None else parent.session_id,
+        user_id=user_id if user_id is not None else parent.user_id,
+        user_roles=list(user_roles) if user_roles is not None else list(parent.user_roles),
+        nombre_usuario=nombre_usuario if nombre_usuario is not None else parent.nombre_usuario,
+        stream=stream if stream is not None else parent.stream,
+    )
+    token = _request_context.set(ctx)
+    try:
+        yield ctx
+    finally:
+        _request_context.reset(token)
+
+
+# ============================================================================
+# TESTS
+# ============================================================================
+
+if __name__ == "__main__":
+    import asyncio
+
+    async def _leer(session_id: str, user_id: int, delay: float) -> RequestContext:
+        with request_scope(session_id=session_id, user_id=user_id, user_roles=[f"rol_{user_id}"]):
+            await asyncio.sleep(delay)
+            return await asyncio.to_thread(get_request_context)
+
+    async def _main():
+        a, b = await asyncio.gather(_leer("a", 1, 0.05), _leer("b", 2, 0.01))
+        print(f"Request A: {a}")
+        print(f"Request B: {b}")
+        assert a.user_id == 1 and a.user_roles == ["rol_1"]
+        assert b.user_id == 2 and b.user_roles == ["rol_2"]
+        assert get_request_context() == _EMPTY_CONTEXT
+        print("✓ Contextos aislados entre requests concurrentes")
+
+        with request_scope(user_id=7, nombre_usuario="Ana"):
+            with request_scope(user_roles=["admin"]):
+                anidado = get_request_context()
+        assert anidado.user_id == 7 and anidado.nombre_usuario == "Ana" and anidado.user_roles == ["admin"]
+        print("✓ Scopes anidados heredan los campos no especificados")
+
+    asyncio.run(_main())
@@ -0,0 +1,378 @@
+"""
+ResponseCache - Cache semántico de respuestas del router
+
+Los usuarios repiten mucho las mismas preguntas de datos ("posts con más
+reacciones", "propiedades del BCR"...). Este cache va delante de
+LlamaRouter.query y tiene dos niveles:
+
+1. Exacto: consulta normalizada (minúsculas, sin tildes ni signos) + roles
+2. Semántico: similitud coseno del embedding de la consulta contra las
+   consultas ya cacheadas del mismo conjunto de roles. Consultas que solo
+   cambian un número, un ID, una URL o la provincia ("bajo 100 mil" vs
+   "bajo 200 mil") quedan por encima del umbral, así que un hit semántico
+   exige además que esos datos coincidan con la consulta cacheada
+
+Cada herramienta tiene su TTL. Solo los listados deterministas (bienes,
+bancos) se comparten entre usuarios con los mismos roles: las respuestas
+redactadas por el LLM llevan el nombre del usuario ("Estás conversando con
+..."), así que se guardan por user_id. Las herramientas personales
+(dashboard, recordatorios, citas) no se escriben salvo que se habilite
+explícitamente. Los listados compartidos solo se sirven por el nivel exacto:
+el router los guarda como resultados de búsqueda de la sesión y un cantón
+distinto no se detecta con una lista fija de lugares.
+"""
+
+import logging
+import re
+import threading
+import unicodedata
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from app.core.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+# TTL en segundos por herramienta (0 = no se cachea)
+TOOL_TTLS: Dict[str, int] = {
+    "bienes_adjudicados": 600,
+    "bancos": 900,
+    "rrhh_info": 300,
+    "posts_info": 600,
+    "general": 3600,
+    "easycore": 300,
+    "internet_bienesadjudicadoscr": 1800,
+    "internet_search": 900,
+    "pending_reminders": 60,
+    "customer_reminders": 60,
+    "operations_appointments": 60,
+    "posts_generation": 0,   # Contenido creativo: cada pedido debe ser distinto
+    "property_info": 0,      # Depende de la última propiedad de la sesión
+}
+
+# Respuestas armadas sin LLM (mismo texto para cualquier usuario con esos roles)
+SHARED_TOOLS = {"bienes_adjudicados", "bancos"}
+
+# Herramientas cuyos datos son del usuario autenticado
+USER_SCOPED_TOOLS = {"pending_reminders", "customer_reminders", "operations_appointments"}
+
+# Respuestas de error / sin acceso que nunca se guardan
+_NO_CACHE_PREFIXES = ("⚠️", "❌")
+
+_PUNCTUATION_RE = re.compile(r"[¿?¡!.,;:\"'()]+")
+_SPACES_RE = re.compile(r"\s+")
+_URL_RE = re.compile(r"https?://\S+|www\.\S+")
+_NUMBER_RE = re.compile(r"\d+")
+_PROVINCE_RE = re.compile(r"\b(san jose|alajuela|cartago|heredia|guanacaste|puntarenas|limon)\b")
+
+
+def normalize_query(query: str) -> str:
+    """Minúsculas, sin tildes, sin signos de puntuación y espacios colapsados."""
+    text = unicodedata.normalize("NFKD", query.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = _PUNCTUATION_RE.sub(" ", text)
+    return _SPACES_RE.sub(" ", text).strip()
+
+
+def query_specifics(query: str) -> frozenset:
+    """URLs, números y provincias de la consulta: lo que un hit semántico no puede cambiar."""
+    urls = _URL_RE.findall(query.lower())
+    rest = normalize_query(_URL_RE.sub(" ", query.lower()))
+    return frozenset(urls + _NUMBER_RE.findall(rest) + _PROVINCE_RE.findall(rest))
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    text: str
+    tool_name: str
+    tier: str  # "exacto" | "semantico"
+
+
+class MemoQueryEmbedder:
+    """
+    Envuelve el modelo de embeddings y memoriza los embeddings de consultas
+    recientes, para que el cache semántico y el EmbeddingToolSelector no
+    paguen dos veces el mismo texto dentro de una request.
+    """
+
+    def __init__(self, embed_model, maxsize: int = 512, ttl: float = 600):
+        self._embed_model = embed_model
+        self._memo = TTLCache(maxsize=maxsize, default_ttl=ttl)
+
+    def get_query_embedding(self, query: str):
+        vector = self._memo.get(query)
+        if vector is None:
+            vector = self._embed_model.get_query_embedding(query)
+            self._memo.set(query, vector)
+        return vector
+
+    async def aget_query_embedding(self, query: str):
+        vector = self._memo.get(query)
+        if vector is None:
+            vector = await self._embed_model.aget_query_embedding(query)
+            self._memo.set(query, vector)
+        return vector
+
+    def __getattr__(self, name):
+        # model_name, get_text_embedding_batch, etc. pasan al modelo real
+        return getattr(self._embed_model, name)
+
+
+class _SemanticIndex:
+    """
+    Vectores normalizados de las consultas cacheadas de un conjunto de roles
+    (acotado, FIFO), junto con los datos concretos de cada consulta.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, Tuple[np.ndarray, frozenset]]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None
+        self._keys: list = []
+
+    def add(self, key: Tuple, vector: np.ndarray, specifics: frozenset):
+        self._entries[key] = (vector, specifics)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._matrix = None
+
+    def nearest(self, vector: np.ndarray) -> Tuple[Optional[Tuple], float, frozenset]:
+        if not self._entries:
+            return None, 0.0, frozenset()
+        if self._matrix is None:
+            self._keys = list(self._entries.keys())
+            self._matrix = np.vstack([entry[0] for entry in self._entries.values()])
+        sims = self._matrix @ vector
+        best = int(np.argmax(sims))
+        key = self._keys[best]
+        return key, float(sims[best]), self._entries[key][1]
+
+
+class ResponseCache:
+    """
+    Cache de respuestas con nivel exacto + semántico, TTL por herramienta y LRU.
+
+    Uso:
+        cache = ResponseCache(embed_model=Settings.embed_model)
+        hit = cache.lookup(consulta, role_key, user_id)
+        if hit is None:
+            respuesta, tool = router.route(consulta)
+            cache.store(consulta, role_key, user_id, tool, str(respuesta))
+    """
+
+    def __init__(
+        self,
+        embed_model=None,
+        maxsize: int = 2000,
+        similarity_threshold: float = 0.95,
+        max_semantic_entries: int = 500,
+        cache_personal: bool = False,
+        tool_ttls: Optional[Dict[str, int]] = None,
+    ):
+        """
+        Args:
+            embed_model: Modelo de embeddings para el nivel semántico (None = solo exacto)
+            maxsize: Máximo de respuestas en memoria (LRU)
+            similarity_threshold: Similitud coseno mínima para un hit semántico
+            max_semantic_entries: Vectores guardados por conjunto de roles
+            cache_personal: Si True, también cachea herramientas personales (clave por user_id)
+            tool_ttls: TTL por herramienta (por defecto TOOL_TTLS)
+        """
+        self.embed_model = embed_model
+        self.similarity_threshold = similarity_threshold
+        self.max_semantic_entries = max_semantic_entries
+        self.cache_personal = cache_personal
+        self.tool_ttls = dict(TOOL_TTLS if tool_ttls is None else tool_ttls)
+        self._responses = TTLCache(maxsize=maxsize)
+        self._semantic: Dict[Tuple, _SemanticIndex] = {}
+        self._lock = threading.Lock()
+        self._stats = Counter()
+
+    # -------- Claves --------
+    def _keys(self, normalized: str, role_key: str, user_id) -> Tuple[Tuple, Tuple]:
+        """Clave compartida (por roles) y clave personal (por roles + usuario)."""
+        return ("shared", role_key, normalized), ("user", role_key, user_id, normalized)
+
+    def _partitions(self, role_key: str, user_id) -> Tuple[Tuple, Tuple]:
+        return ("shared", role_key), ("user", role_key, user_id)
+
+    def _vector(self, embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / np.linalg.norm(vector)
+
+    # -------- Lectura --------
+    def _exact(self, normalized: str, role_key: str, user_id) -> Optional[CachedResponse]:
+        for key in self._keys(normalized, role_key, user_id):
+            value = self._responses.get(key)
+            if value is not None:
+                return CachedResponse(text=value[0], tool_name=value[1], tier="exacto")
+        return None
+
+    def _semantic_match(self, vector: np.ndarray, query: str, role_key: str, user_id) -> Optional[CachedResponse]:
+        best_key, best_sim, best_specifics = None, 0.0, frozenset()
+        with self._lock:
+            for partition in self._partitions(role_key, user_id):
+                index = self._semantic.get(partition)
+                if index is None:
+                    continue
+                key, sim, specifics = index.nearest(vector)
+                if key is not None and sim > best_sim:
+                    best_key, best_sim, best_specifics = key, sim, specifics
+
+        if best_key is None or best_sim < self.similarity_threshold:
+            return None
+        if query_specifics(query) != best_specifics:
+            logger.info(f"  🧠 Cache semántico descartado: cambian números, URLs o provincia ({best_sim:.3f})")
+            return None
+        value = self._responses.get(best_key)  # puede haber expirado
+        if value is None:
+            return None
+        logger.info(f"  🧠 Cache semántico: similitud {best_sim:.3f}")
+        return CachedResponse(text=value[0], tool_name=value[1], tier="semantico")
+
+    def _finish_lookup(self, hit: Optional[CachedResponse]) -> Optional[CachedResponse]:
+        with self._lock:
+            self._stats["hits_" + hit.tier if hit else "misses"] += 1
+        if hit:
+            logger.info(f"💾 CACHE HIT ({hit.tier}) → {hit.tool_name}")
+        return hit
+
+    def lookup(self, query: str, role_key: str, user_id=None) -> Optional[CachedResponse]:
+        normalized = normalize_query(query)
+        hit = self._exact(normalized, role_key, user_id)
+        if hit is None and self.embed_model is not None:
+            try:
+                vector = self._vector(self.embed_model.get_query_embedding(query))
+                hit = self._semantic_match(vector, query, role_key, user_id)
+            except Exception as e:
+                logger.warning(f"⚠️ Nivel semántico del cache no disponible: {e}")
+        return self._finish_lookup(hit)
+
+    async def alookup(self, query: str, role_key: str, user_id=None) -> Optional[CachedResponse]:
+        """Versión async de lookup."""
+        normalized = normalize_query(query)
+        hit = self._exact(normalized, role_key, user_id)
+        if hit is None and self.embed_model is not None:
+            try:
+                vector = self._vector(await self.embed_model.aget_query_embedding(query))
+                hit = self._semantic_match(vector, query, role_key, user_id)
+            except Exception as e:
+                logger.warning(f"⚠️ Nivel semántico del cache no disponible: {e}")
+        return self._finish_lookup(hit)
+
+    # -------- Escritura --------
+    def _should_store(self, tool_name: str, text: str) -> bool:
+        if not text.strip() or text.lstrip().startswith(_NO_CACHE_PREFIXES):
+            return False
+        if not self.tool_ttls.get(tool_name, 0):
+            return False
+        if tool_name in USER_SCOPED_TOOLS and not self.cache_personal:
+            return False
+        return True
+
+    def _write(self, normalized: str, role_key: str, user_id, tool_name: str, text: str) -> Optional[Tuple]:
+        # Sin usuario no hay clave personal: solo se guardan las respuestas compartibles
+        if not self._should_store(tool_name, text) or (tool_name not in SHARED_TOOLS and user_id is None):
+            with self._lock:
+                self._stats["escrituras_omitidas"] += 1
+            return None
+
+        shared_key, user_key = self._keys(normalized, role_key, user_id)
+        key = shared_key if tool_name in SHARED_TOOLS else user_key
+        self._responses.set(key, (text, tool_name), ttl=self.tool_ttls[tool_name])
+        with self._lock:
+            self._stats["escrituras"] += 1
+        return key
+
+    def _indexable(self, key: Optional[Tuple], tool_name: str) -> bool:
+        # Los listados compartidos no entran al nivel semántico (ver docstring del módulo)
+        return key is not None and self.embed_model is not None and tool_name not in SHARED_TOOLS
+
+    def _index(self, key: Tuple, vector: np.ndarray, query: str):
+        partition = key[:-1]
+        with self._lock:
+            index = self._semantic.get(partition)
+            if index is None:
+                index = self._semantic[partition] = _SemanticIndex(self.max_semantic_entries)
+            index.add(key, vector, query_specifics(query))
+
+    def store(self, query: str, role_key: str, user_id, tool_name: str, text: str):
+        normalized = normalize_query(query)
+        key = self._write(normalized, role_key, user_id, tool_name, text)
+        if self._indexable(key, tool_name):
+            try:
+                self._index(key, self._vector(self.embed_model.get_query_embedding(query)), query)
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo indexar la consulta en el cache semántico: {e}")
+
+    async def astore(self, query: str, role_key: str, user_id, tool_name: str, text: str):
+        """Versión async de store."""
+        normalized = normalize_query(query)
+        key = self._write(normalized, role_key, user_id, tool_name, text)
+        if self._indexable(key, tool_name):
+            try:
+                self._index(key, self._vector(await self.embed_model.aget_query_embedding(query)), query)
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo indexar la consulta en el cache semántico: {e}")
+
+    def clear(self):
+        self._responses.clear()
+        with self._lock:
+            self._semantic.clear()
+
+    # -------- Métricas --------
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            counts = dict(self._stats)
+        hits = counts.get("hits_exacto", 0) + counts.get("hits_semantico", 0)
+        total = hits + counts.get("misses", 0)
+        return {
+            "hits_exacto": counts.get("hits_exacto", 0),
+            "hits_semantico": counts.get("hits_semantico", 0),
+            "misses": counts.get("misses", 0),
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+            "escrituras": counts.get("escrituras", 0),
+            "escrituras_omitidas": counts.get("escrituras_omitidas", 0),
+            "almacen": self._responses.stats(),
+        }
+
+
+# ============================================================================
+# TESTS
+# ============================================================================
+
+if __name__ == "__main__":
+    class _FakeEmbed:
+        """Embedding de bolsa de palabras: consultas con las mismas palabras → mismo vector."""
+
+        def get_query_embedding(self, text: str):
+            vector = np.zeros(64, dtype=np.float32)
+            for word in normalize_query(text).split():
+                vector[hash(word) % 64] += 1
+            return vector
+
+    # Umbral bajo a propósito: "ID 150" vs "ID 151" lo supera y debe frenarlo query_specifics
+    cache = ResponseCache(embed_model=_FakeEmbed(), similarity_threshold=0.75)
+    cache.store("¿Cuáles son las casas del BCR en Heredia?", "soporte", 7, "bienes_adjudicados", "Casas...")
+    cache.store("¿Qué es un remate?", "soporte", 7, "general", "Ana, un remate es...")
+    cache.store("Mi dashboard", "soporte", 7, "pending_reminders", "Tienes 3 clientes")
+    cache.store("Datos del colaborador ID 150", "soporte", 7, "rrhh_info", "Ana, el colaborador 150...")
+
+    assert cache.lookup("cuales son las casas del bcr en heredia", "soporte", 8).tier == "exacto"
+    assert cache.lookup("¿Cuáles son las casas en Heredia? del BCR", "soporte", 8) is None   # listado: solo exacto
+    assert cache.lookup("¿Qué es un remate", "soporte", 7).tier == "exacto"
+    assert cache.lookup("Remate ¿qué es un?", "soporte", 7).tier == "semantico"
+    assert cache.lookup("Colaborador ID 150 datos del", "soporte", 7).tier == "semantico"
+    assert cache.lookup("Datos del colaborador ID 151", "soporte", 7) is None              # otro ID
+    assert query_specifics("casas en Heredia bajo 100 mil") != query_specifics("casas en Heredia bajo 200 mil")
+    assert query_specifics("casas en Limón") != query_specifics("casas en Cartago")
+    assert cache.lookup("¿Cuáles son las casas del BCR en Heredia?", "rrhh", 8) is None   # otro rol
+    assert cache.lookup("¿Qué es un remate?", "soporte", 7).tier == "exacto"             # LLM: solo su usuario
+    assert cache.lookup("¿Qué es un remate?", "soporte", 8) is None
+    assert cache.lookup("Mi dashboard", "soporte", 7) is None                              # personal: no se escribe
+    print(f"✓ Cache de respuestas: {cache.stats()}")
@@ -0,0 +1,175 @@
+"""
+ResponseStream - Respuesta del chat en streaming (Server-Sent Events)
+
+POST /api/chat/stream abre un ResponseStream y lo deja en el RequestContext.
+Las herramientas que generan la respuesta final con el LLM (Tavily híbrido,
+posts, búsqueda en internet, general) emiten los tokens a medida que llegan
+con `emit()` / `llm_client.complete_text()`; funciona también desde los hilos
+de `asyncio.to_thread`. Las respuestas deterministas (listados de BD, cache)
+se envían en trozos al terminar.
+
+Eventos:
+    inicio     {}                               apenas se acepta la request
+    token      {"texto": "..."}                 fragmento de la respuesta
+    reinicio   {}                               el router descartó lo emitido (probará otra herramienta)
+    fin        {"respuesta": "...", "id": ...}  texto definitivo completo
+    error      {"detalle": "..."}
+"""
+
+import asyncio
+import json
+import logging
+from typing import Any, AsyncIterator, Awaitable, Dict, List, Optional
+
+from app.services.request_context import get_request_context, request_scope
+
+logger = logging.getLogger(__name__)
+
+
+# Tamaño aproximado de cada trozo al enviar una respuesta ya completa
+CHUNK_CHARS = 400
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def chunk_text(text: str, size: int = CHUNK_CHARS) -> List[str]:
+    """Corta en trozos de ~size caracteres, preferiblemente en saltos de línea."""
+    chunks = []
+    while len(text) > size:
+        cut = text.rfind("\n", 0, size)
+        cut = cut + 1 if cut > 0 else size
+        chunks.append(text[:cut])
+        text = text[cut:]
+    if text:
+        chunks.append(text)
+    return chunks
+
+
+class ResponseStream:
+    """
+    Uso:
+        stream = ResponseStream()
+        return StreamingResponse(stream.sse(orch.aprocesar_mensaje(...)), media_type="text/event-stream")
+    """
+
+    def __init__(self):
+        self._queue: "asyncio.Queue[tuple]" = asyncio.Queue()
+        self._loop = asyncio.get_running_loop()
+        self.emitted = False
+
+    # -------- Productores (cualquier hilo) --------
+    def _put(self, event: str, data: Dict[str, Any]):
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, (event, data))
+
+    def emit(self, text: str):
+        if text:
+            self.emitted = True
+            self._put("token", {"texto": text})
+
+    def discard(self):
+        if self.emitted:
+            self.emitted = False
+            self._put("reinicio", {})
+
+    # -------- Consumidor --------
+    async def sse(self, work: Awaitable[Any], response_id: Any = None) -> AsyncIterator[str]:
+        """Ejecuta `work` con este stream activo y traduce lo emitido a eventos SSE."""
+        yield sse_event("inicio", {})
+
+        # La tarea copia el contexto al crearse: ahí ve el stream
+        with request_scope(stream=self):
+            task = asyncio.ensure_future(work)
+
+        try:
+            while True:
+                getter = asyncio.ensure_future(self._queue.get())
+                done, _ = await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+                if getter not in done:
+                    getter.cancel()
+                    break
+                yield sse_event(*getter.result())
+
+            # Lo que se emitió justo antes de terminar
+            while not self._queue.empty():
+                yield sse_event(*self._queue.get_nowait())
+
+            try:
+                response_text = str(task.result())
+            except Exception as e:
+                logger.error(f"❌ Error en chat por streaming: {e}", exc_info=True)
+                yield sse_event("error", {"detalle": str(e)})
+                return
+
+            if not self.emitted:
+                for chunk in chunk_text(response_text):
+                    yield sse_event("token", {"texto": chunk})
+            yield sse_event("fin", {"respuesta": response_text, "id": response_id})
+        finally:
+            # Cliente desconectado: no seguir gastando LLM / BD
+            if not task.done():
+                task.cancel()
+
+
+def current_stream() -> Optional[ResponseStream]:
+    return get_request_context().stream
+
+
+def emit(text: str):
+    """Emite texto al stream de la request actual (no hace nada en /api/chat)."""
+    stream = current_stream()
+    if stream is not None:
+        stream.emit(text)
+
+
+def discard():
+    """Avisa al cliente que descarte lo emitido (el router va a probar otra herramienta)."""
+    stream = current_stream()
+    if stream is not None:
+        stream.discard()
+
+
+# ============================================================================
+# TESTS
+# ============================================================================
+
+if __name__ == "__main__":
+    import time
+
+    def _llm_en_hilo() -> str:
+        """Simula un LLM que produce 20 tokens en 1 s desde un hilo de to_thread."""
+        partes = []
+        for i in range(20):
+            time.sleep(0.05)
+            partes.append(f"tok{i} ")
+            emit(f"tok{i} ")
+        return "".join(partes)
+
+    async def _respuesta() -> str:
+        return await asyncio.to_thread(_llm_en_hilo)
+
+    async def _listado() -> str:
+        await asyncio.sleep(0.1)
+        return "\n".join(f"🏠 Casa {i} - $100,000 - Banco Nacional" for i in range(40))
+
+    async def _consumir(work) -> tuple:
+        stream = ResponseStream()
+        inicio = time.perf_counter()
+        primer_token = None
+        eventos = []
+        async for evento in stream.sse(work):
+            if evento.startswith("event: token") and primer_token is None:
+                primer_token = time.perf_counter() - inicio
+            eventos.append(evento.split("\n", 1)[0][len("event: "):])
+        return primer_token, time.perf_counter() - inicio, eventos
+
+    primer, total, eventos = asyncio.run(_consumir(_respuesta()))
+    print(f"LLM: primer token a los {primer * 1000:.0f} ms, respuesta completa a los {total * 1000:.0f} ms")
+    assert eventos[0] == "inicio" and eventos[-1] == "fin" and eventos.count("token") == 20
+
+    primer, total, eventos = asyncio.run(_consumir(_listado()))
+    print(f"Listado determinista: {eventos.count('token')} trozos, primero a los {primer * 1000:.0f} ms")
+    assert eventos[-1] == "fin" and eventos.count("token") > 1
+    assert emit("sin stream") is None
+    print("✓ Streaming SSE")
@@ -0,0 +1,393 @@
+"""
+SessionBackend - Estado de conversación compartible entre workers
+
+Guarda por sesión:
+- el historial de chat (lista de mensajes [rol, contenido])
+- el contexto conversacional (última propiedad, últimos resultados de búsqueda)
+
+Implementaciones:
+- InMemorySessionBackend: un solo proceso (por defecto)
+- SQLiteSessionBackend: varios workers en la misma máquina
+- RedisSessionBackend: varias réplicas (redis-py, o fakeredis en pruebas)
+
+Se elige con `session_backend_url` en Settings:
+    memory://
+    sqlite:///.cache/sessions.db
+    redis://localhost:6379/0
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.core.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+# (rol, contenido) - forma compacta de un ChatMessage
+Message = Tuple[str, str]
+
+# Payloads más grandes que esto se comprimen (los resultados de búsqueda ocupan varios KB)
+_COMPRESS_OVER = 512
+
+
+def encode(value: Any) -> bytes:
+    """JSON compacto; con zlib si el payload es grande. El primer byte indica el formato."""
+    raw = json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+    if len(raw) > _COMPRESS_OVER:
+        return b"z" + zlib.compress(raw, 6)
+    return b"j" + raw
+
+
+def decode(payload: Optional[bytes]) -> Any:
+    if not payload:
+        return None
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    body = payload[1:]
+    if payload[:1] == b"z":
+        body = zlib.decompress(body)
+    return json.loads(body)
+
+
+class SessionBackend(ABC):
+    """Interfaz de almacenamiento de sesiones."""
+
+    # True si otros procesos pueden escribir la misma sesión (hay que releer antes de usar caches locales)
+    shared = True
+
+    def __init__(self, ttl: Optional[float] = 7 * 24 * 3600, max_messages: int = 200):
+        """
+        Args:
+            ttl: Segundos sin actividad tras los que se descarta la sesión (None = nunca)
+            max_messages: Máximo de mensajes de historial que se conservan por sesión
+        """
+        self.ttl = ttl
+        self.max_messages = max_messages
+
+    # -------- Historial --------
+    @abstractmethod
+    def append_messages(self, session_id: str, messages: Sequence[Message]) -> int:
+        """Agrega mensajes al historial y retorna la nueva versión del historial."""
+
+    @abstractmethod
+    def get_messages(self, session_id: str, limit: Optional[int] = None) -> List[Message]:
+        """Últimos `limit` mensajes (todos si es None), del más viejo al más reciente."""
+
+    @abstractmethod
+    def version(self, session_id: str) -> int:
+        """Versión del historial: crece con cada mensaje agregado (0 = sin historial)."""
+
+    # -------- Contexto --------
+    @abstractmethod
+    def get_context(self, session_id: str) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    def set_context(self, session_id: str, context: Dict[str, Any]):
+        ...
+
+    # -------- Ciclo de vida --------
+    @abstractmethod
+    def delete(self, session_id: str):
+        """Borra historial y contexto de la sesión."""
+
+    def context_stats(self) -> Dict[str, Any]:
+        """Sesiones con contexto y bytes que ocupan (si el backend puede medirlo barato)."""
+        return {"backend": type(self).__name__}
+
+
+class InMemorySessionBackend(SessionBackend):
+    """Backend de un solo proceso (sin serialización)."""
+
+    shared = False
+
+    def __init__(self, ttl: Optional[float] = 7 * 24 * 3600, max_messages: int = 200, max_sessions: int = 10000):
+        super().__init__(ttl, max_messages)
+        self._messages = TTLCache(maxsize=max_sessions, default_ttl=ttl)
+        self._context = TTLCache(maxsize=max_sessions, default_ttl=ttl)
+        self._lock = threading.Lock()
+
+    def append_messages(self, session_id: str, messages: Sequence[Message]) -> int:
+        with self._lock:
+            version, history = self._messages.get(session_id) or (0, [])
+            history = (history + [tuple(m) for m in messages])[-self.max_messages:]
+            version += len(messages)
+            self._messages.set(session_id, (version, history))
+            return version
+
+    def get_messages(self, session_id: str, limit: Optional[int] = None) -> List[Message]:
+        _, history = self._messages.get(session_id) or (0, [])
+        return list(history[-limit:] if limit else history)
+
+    def version(self, session_id: str) -> int:
+        return (self._messages.get(session_id) or (0, []))[0]
+
+    def get_context(self, session_id: str) -> Dict[str, Any]:
+        return dict(self._context.get(session_id) or {})
+
+    def set_context(self, session_id: str, context: Dict[str, Any]):
+        self._context.set(session_id, dict(context))
+
+    def delete(self, session_id: str):
+        self._messages.pop(session_id)
+        self._context.pop(session_id)
+
+    def context_stats(self) -> Dict[str, Any]:
+        contexts = self._context.values()
+        return {
+            **super().context_stats(),
+            "sesiones": len(contexts),
+            "max_sesiones": self._context.maxsize,
+            # Tamaño serializado: aproxima lo que ocuparía en un backend compartido
+            "bytes_aprox": sum(len(encode(c)) for c in contexts),
+        }
+
+
+class SQLiteSessionBackend(SessionBackend):
+    """Backend en un archivo SQLite (WAL): lo comparten los workers de una misma máquina."""
+
+    _PURGE_EVERY = 500  # escrituras entre limpiezas de sesiones inactivas
+
+    def __init__(self, path: str, ttl: Optional[float] = 7 * 24 * 3600, max_messages: int = 200):
+        super().__init__(ttl, max_messages)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10, isolation_level=None)
+        self._lock = threading.Lock()
+        self._writes = 0
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS session_messages ("
+                " seq INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL,"
+                " payload BLOB NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_session_messages ON session_messages (session_id, seq)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS session_context ("
+                " session_id TEXT PRIMARY KEY, payload BLOB NOT NULL, updated_at REAL NOT NULL)"
+            )
+            # Versión propia de cada sesión (seq es global: lo mueven las escrituras de todas las sesiones)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS session_versions ("
+                " session_id TEXT PRIMARY KEY, version INTEGER NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def _after_write(self):
+        self._writes += 1
+        if self.ttl is not None and self._writes % self._PURGE_EVERY == 0:
+            cutoff = time.time() - self.ttl
+            self._conn.execute("DELETE FROM session_messages WHERE updated_at < ?", (cutoff,))
+            self._conn.execute("DELETE FROM session_context WHERE updated_at < ?", (cutoff,))
+            self._conn.execute("DELETE FROM session_versions WHERE updated_at < ?", (cutoff,))
+
+    def _fresh(self) -> float:
+        return time.time() - self.ttl if self.ttl is not None else 0.0
+
+    def append_messages(self, session_id: str, messages: Sequence[Message]) -> int:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO session_messages (session_id, payload, updated_at) VALUES (?, ?, ?)",
+                    [(session_id, encode(list(m)), now) for m in messages],
+                )
+                # Recortar a los últimos max_messages
+                self._conn.execute(
+                    "DELETE FROM session_messages WHERE session_id = ? AND seq NOT IN ("
+                    " SELECT seq FROM session_messages WHERE session_id = ? ORDER BY seq DESC LIMIT ?)",
+                    (session_id, session_id, self.max_messages),
+                )
+                self._conn.execute(
+                    "UPDATE session_messages SET updated_at = ? WHERE session_id = ?", (now, session_id)
+                )
+                # Una sesión expirada (aún sin purgar) vuelve a empezar, como en Redis
+                self._conn.execute(
+                    "INSERT INTO session_versions (session_id, version, updated_at) VALUES (?, ?, ?)"
+                    " ON CONFLICT(session_id) DO UPDATE SET"
+                    " version = CASE WHEN updated_at >= ? THEN version ELSE 0 END + excluded.version,"
+                    " updated_at = excluded.updated_at",
+                    (session_id, len(messages), now, self._fresh()),
+                )
+                version = self._conn.execute(
+                    "SELECT version FROM session_versions WHERE session_id = ?", (session_id,)
+                ).fetchone()[0]
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._after_write()
+            return version
+
+    def get_messages(self, session_id: str, limit: Optional[int] = None) -> List[Message]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT payload FROM session_messages WHERE session_id = ? AND updated_at >= ?"
+                " ORDER BY seq DESC LIMIT ?",
+                (session_id, self._fresh(), limit or self.max_messages),
+            ).fetchall()
+        return [tuple(decode(row[0])) for row in reversed(rows)]
+
+    def version(self, session_id: str) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version FROM session_versions WHERE session_id = ? AND updated_at >= ?",
+                (session_id, self._fresh()),
+            ).fetchone()
+        return row[0] if row else 0
+
+    def get_context(self, session_id: str) -> Dict[str, Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM session_context WHERE session_id = ? AND updated_at >= ?",
+                (session_id, self._fresh()),
+            ).fetchone()
+        return decode(row[0]) if row else {}
+
+    def set_context(self, session_id: str, context: Dict[str, Any]):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO session_context (session_id, payload, updated_at) VALUES (?, ?, ?)"
+                " ON CONFLICT(session_id) DO UPDATE SET payload = excluded.payload, updated_at = excluded.updated_at",
+                (session_id, encode(context), time.time()),
+            )
+            self._after_write()
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM session_messages WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM session_context WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM session_versions WHERE session_id = ?", (session_id,))
+
+    def context_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sessions, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(payload)), 0) FROM session_context WHERE updated_at >= ?",
+                (self._fresh(),),
+            ).fetchone()
+        return {**super().context_stats(), "sesiones": sessions, "bytes": size}
+
+
+class RedisSessionBackend(SessionBackend):
+    """Backend sobre el protocolo Redis: lo comparten todas las réplicas."""
+
+    def __init__(self, client, prefix: str = "eva:session:", ttl: Optional[float] = 7 * 24 * 3600, max_messages: int = 200):
+        """
+        Args:
+            client: redis.Redis (o fakeredis.FakeRedis) sin decode_responses
+        """
+        super().__init__(ttl, max_messages)
+        self.client = client
+        self.prefix = prefix
+
+    def _keys(self, session_id: str) -> Tuple[str, str, str]:
+        base = f"{self.prefix}{session_id}"
+        return f"{base}:msgs", f"{base}:ctx", f"{base}:ver"
+
+    def append_messages(self, session_id: str, messages: Sequence[Message]) -> int:
+        msgs_key, ctx_key, ver_key = self._keys(session_id)
+        pipe = self.client.pipeline()
+        pipe.rpush(msgs_key, *[encode(list(m)) for m in messages])
+        pipe.ltrim(msgs_key, -self.max_messages, -1)
+        pipe.incrby(ver_key, len(messages))
+        if self.ttl is not None:
+            for key in (msgs_key, ctx_key, ver_key):
+                pipe.expire(key, int(self.ttl))
+        return int(pipe.execute()[2])
+
+    def get_messages(self, session_id: str, limit: Optional[int] = None) -> List[Message]:
+        raw = self.client.lrange(self._keys(session_id)[0], -(limit or self.max_messages), -1)
+        return [tuple(decode(item)) for item in raw]
+
+    def version(self, session_id: str) -> int:
+        return int(self.client.get(self._keys(session_id)[2]) or 0)
+
+    def get_context(self, session_id: str) -> Dict[str, Any]:
+        return decode(self.client.get(self._keys(session_id)[1])) or {}
+
+    def set_context(self, session_id: str, context: Dict[str, Any]):
+        ex = int(self.ttl) if self.ttl is not None else None
+        self.client.set(self._keys(session_id)[1], encode(context), ex=ex)
+
+    def delete(self, session_id: str):
+        self.client.delete(*self._keys(session_id))
+
+
+def create_session_backend(url: str) -> SessionBackend:
+    """Crea el backend a partir de una URL (memory://, sqlite:///ruta, redis://...)."""
+    if not url or url.startswith("memory://"):
+        return InMemorySessionBackend()
+    if url.startswith("sqlite:///"):
+        return SQLiteSessionBackend(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("session_backend_url usa Redis pero el paquete 'redis' no está instalado") from e
+        return RedisSessionBackend(redis.Redis.from_url(url))
+    raise ValueError(f"session_backend_url no soportada: {url}")
+
+
+@lru_cache(maxsize=1)
+def get_session_backend() -> SessionBackend:
+    """Backend de sesiones del proceso, según Settings.session_backend_url."""
+    from app.core.config import get_settings
+
+    url = get_settings().session_backend_url
+    backend = create_session_backend(url)
+    logger.info(f"✓ Backend de sesiones: {type(backend).__name__}")
+    return backend
+
+
+# ============================================================================
+# TESTS
+# ============================================================================
+
+if __name__ == "__main__":
+    import tempfile
+
+    resultados = [
+        {"id": i, "nombre": f"Casa {i} en Heredia", "precio_usd": 100000 + i, "property_url": f"https://x/p/{i}"}
+        for i in range(10)
+    ]
+    payload = encode({"last_search_results": resultados})
+    print(f"Contexto con 10 resultados: JSON {len(json.dumps(resultados))} B → {len(payload)} B")
+
+    backends = [
+        InMemorySessionBackend(max_messages=4),
+        SQLiteSessionBackend(os.path.join(tempfile.mkdtemp(), "sessions.db"), max_messages=4),
+    ]
+    try:
+        import fakeredis
+        backends.append(RedisSessionBackend(fakeredis.FakeRedis(), max_messages=4))
+    except ImportError:
+        print("(fakeredis no instalado: se omite RedisSessionBackend)")
+
+    for backend in backends:
+        name = type(backend).__name__
+        for i in range(3):
+            version = backend.append_messages("u1", [("user", f"pregunta {i}"), ("assistant", f"respuesta {i}")])
+        assert version == backend.version("u1") == 6 and len(backend.get_messages("u1")) == 4
+        # Escribir en otra sesión no mueve la versión de u1 (si no, u1 se rehidrataría sin motivo)
+        backend.append_messages("u2", [("user", "hola")])
+        assert backend.version("u1") == 6 and backend.version("u2") == 1
+        assert backend.get_messages("u1", limit=2) == [("user", "pregunta 2"), ("assistant", "respuesta 2")]
+
+        backend.set_context("u1", {"last_search_results": resultados})
+        assert backend.get_context("u1")["last_search_results"][1]["nombre"] == "Casa 1 en Heredia"
+
+        backend.delete("u1")
+        assert backend.version("u1") == 0 and backend.get_context("u1") == {}
+        print(f"✓ {name}")
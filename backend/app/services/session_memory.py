@@ -0,0 +1,315 @@
+"""
+SessionMemoryStore - Memorias de chat por sesión con límites de tamaño
+
+Reemplaza el dict `session_id -> Memory` del orquestador, que crecía sin
+límite (Memory archiva los mensajes que salen de su ventana, no los borra).
+Desaloja por:
+- inactividad (idle_ttl)
+- número de sesiones (LRU)
+- presupuesto total de tokens y de bytes de los mensajes guardados (LRU)
+
+Con un SessionBackend compartido (SQLite / Redis) el historial también se
+escribe ahí: si otro worker agregó mensajes a la sesión (su versión cambió),
+la Memory local se reconstruye desde el backend antes de usarla.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.services.session_backend import Message, SessionBackend
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Session:
+    memory: Any
+    last_access: float
+    tokens: int = 0
+    bytes: int = 0
+    version: int = 0  # versión del historial en el backend que refleja esta Memory
+
+
+class SessionMemoryStore:
+    """
+    Uso:
+        store = SessionMemoryStore(lambda sid: HistoryWindow(max_tokens=1500))
+        mem = store.get(session_id)
+        await mem.aput_messages(mensajes)
+        store.record(session_id, mensajes)   # contabiliza tokens / bytes (y guarda en el backend)
+
+    En código async, `await store.aget(...)` / `await store.arecord(...)`.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[str], Any],
+        max_sessions: int = 2000,
+        idle_ttl: Optional[float] = 2 * 3600,
+        max_total_tokens: Optional[int] = 20_000_000,
+        max_total_bytes: Optional[int] = 256 * 1024 * 1024,
+        tokenizer: Optional[Callable[[str], list]] = None,
+        backend: Optional[SessionBackend] = None,
+        to_message: Callable[[str, str], Any] = lambda role, content: (role, content),
+    ):
+        """
+        Args:
+            factory: Crea la Memory de una sesión nueva
+            max_sessions: Máximo de sesiones vivas (se desaloja la menos usada)
+            idle_ttl: Segundos sin actividad tras los que se descarta una sesión (None = nunca)
+            max_total_tokens: Presupuesto de tokens guardados entre todas las sesiones
+            max_total_bytes: Presupuesto de bytes (UTF-8) guardados entre todas las sesiones
+            tokenizer: Función texto -> tokens (por defecto, len(texto) // 4)
+            backend: Backend de sesiones; solo se usa para el historial si es compartido
+            to_message: Convierte (rol, contenido) del backend en el mensaje que espera la Memory
+        """
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_total_tokens = max_total_tokens
+        self.max_total_bytes = max_total_bytes
+        self.tokenizer = tokenizer
+        self.backend = backend if backend is not None and backend.shared else None
+        self._backend_for_delete = backend
+        self.to_message = to_message
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_tokens = 0
+        self.total_bytes = 0
+        self._evictions = Counter()
+        self.rehydrations = 0
+
+    # -------- Acceso --------
+    def get(self, session_id: str):
+        """Memory de la sesión (la crea si no existe) y la marca como la más reciente."""
+        remote = self.backend.version(session_id) if self.backend else None
+        memory, stale = self._checkout(session_id, remote)
+        if stale:
+            history = self.backend.get_messages(session_id)
+            memory.put_messages([self.to_message(role, content) for role, content in history])
+            self._account(session_id, [content for _, content in history])
+        return memory
+
+    async def aget(self, session_id: str):
+        """Como get(), sin bloquear el event loop con las lecturas al backend."""
+        remote = await asyncio.to_thread(self.backend.version, session_id) if self.backend else None
+        memory, stale = self._checkout(session_id, remote)
+        if stale:
+            history = await asyncio.to_thread(self.backend.get_messages, session_id)
+            await memory.aput_messages([self.to_message(role, content) for role, content in history])
+            self._account(session_id, [content for _, content in history])
+        return memory
+
+    def _checkout(self, session_id: str, remote: Optional[int]) -> Tuple[Any, bool]:
+        """(memory, hay_que_hidratar). Si la versión del backend cambió, descarta la Memory local."""
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            session = self._sessions.get(session_id)
+            if session is not None and remote is not None and session.version != remote:
+                self._evict(session_id, "version")
+                session = None
+            if session is None:
+                session = self._sessions[session_id] = _Session(self.factory(session_id), now)
+                self._evict_over_budget(keep=session_id)
+                stale = bool(remote)
+                if stale:
+                    # Se marca ya para que un request concurrente no hidrate dos veces
+                    session.version = remote
+                    self.rehydrations += 1
+                return session.memory, stale
+            session.last_access = now
+            self._sessions.move_to_end(session_id)
+            return session.memory, False
+
+    def record(self, session_id: str, messages: Iterable[Any]):
+        """Suma al tamaño de la sesión los mensajes que se acaban de guardar en su Memory."""
+        compact = self._compact(messages)
+        self._account(session_id, [content for _, content in compact])
+        if self.backend and compact:
+            self._synced(session_id, self.backend.append_messages(session_id, compact), len(compact))
+
+    async def arecord(self, session_id: str, messages: Iterable[Any]):
+        compact = self._compact(messages)
+        self._account(session_id, [content for _, content in compact])
+        if self.backend and compact:
+            version = await asyncio.to_thread(self.backend.append_messages, session_id, compact)
+            self._synced(session_id, version, len(compact))
+
+    def delete(self, session_id: str) -> bool:
+        if self._backend_for_delete is not None:
+            self._backend_for_delete.delete(session_id)
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is None:
+                return False
+            self._discount(session)
+            return True
+
+    # -------- Contabilidad --------
+    @staticmethod
+    def _compact(messages: Iterable[Any]) -> List[Message]:
+        compact = []
+        for message in messages:
+            if isinstance(message, tuple):
+                compact.append((str(message[0]), str(message[1] or "")))
+                continue
+            role = getattr(message, "role", "user")
+            compact.append((str(getattr(role, "value", role)), str(getattr(message, "content", message) or "")))
+        return compact
+
+    def _account(self, session_id: str, contents: List[str]):
+        tokens = 0
+        size = 0
+        for content in contents:
+            size += len(content.encode("utf-8"))
+            tokens += len(self.tokenizer(content)) if self.tokenizer else len(content) // 4
+
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return
+            footprint = getattr(session.memory, "footprint", None)
+            if footprint is not None:
+                # Memorias acotadas (HistoryWindow) informan lo que retienen realmente
+                tokens, size = footprint()
+                tokens -= session.tokens
+                size -= session.bytes
+            session.tokens += tokens
+            session.bytes += size
+            self.total_tokens += tokens
+            self.total_bytes += size
+            self._evict_over_budget(keep=session_id)
+
+    def _synced(self, session_id: str, version: int, added: int):
+        """Adopta la versión del backend solo si nadie más escribió entre medio."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None and version == session.version + added:
+                session.version = version
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._sessions
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    # -------- Desalojo (con el lock tomado) --------
+    def _discount(self, session: _Session):
+        self.total_tokens -= session.tokens
+        self.total_bytes -= session.bytes
+
+    def _evict(self, session_id: str, reason: str):
+        session = self._sessions.pop(session_id)
+        self._discount(session)
+        self._evictions[reason] += 1
+        logger.debug(f"🧹 Memoria de sesión {session_id} desalojada ({reason})")
+
+    def _evict_idle(self, now: float):
+        if self.idle_ttl is None:
+            return
+        # El OrderedDict está en orden de último acceso: basta recorrer desde el inicio
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_access < self.idle_ttl:
+                break
+            self._evict(session_id, "inactividad")
+
+    def _over_budget(self) -> Optional[str]:
+        if len(self._sessions) > self.max_sessions:
+            return "lru"
+        if self.max_total_tokens is not None and self.total_tokens > self.max_total_tokens:
+            return "tokens"
+        if self.max_total_bytes is not None and self.total_bytes > self.max_total_bytes:
+            return "bytes"
+        return None
+
+    def _evict_over_budget(self, keep: str):
+        reason = self._over_budget()
+        while reason:
+            victim = next((sid for sid in self._sessions if sid != keep), None)
+            if victim is None:
+                break
+            self._evict(victim, reason)
+            reason = self._over_budget()
+
+    # -------- Métricas --------
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "sesiones": len(self._sessions),
+                "max_sesiones": self.max_sessions,
+                "tokens": self.total_tokens,
+                "max_tokens": self.max_total_tokens,
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_total_bytes,
+                "desalojos": dict(self._evictions),
+                "rehidrataciones": self.rehydrations,
+                "backend": type(self._backend_for_delete).__name__ if self._backend_for_delete else None,
+            }
+
+
+# ============================================================================
+# TESTS
+# ============================================================================
+
+if __name__ == "__main__":
+    store = SessionMemoryStore(lambda sid: [], max_sessions=3, idle_ttl=0.05, max_total_bytes=100)
+
+    for sid in ("a", "b", "c"):
+        store.get(sid)
+    store.get("a")                       # "a" pasa a ser la más reciente
+    store.get("d")                       # desaloja "b" (LRU)
+    assert "b" not in store and "a" in store
+
+    store.record("a", ["x" * 80])
+    store.record("c", ["y" * 40])        # 120 bytes > 100: desaloja la menos usada que no es "c"
+    assert "c" in store and store.total_bytes <= 100
+
+    time.sleep(0.06)
+    store.get("e")                       # las demás estaban inactivas
+    assert len(store) == 1
+    print(f"✓ {store.stats()}")
+
+    # Dos "workers" con el mismo backend SQLite
+    import os
+    import tempfile
+
+    from app.services.session_backend import SQLiteSessionBackend
+
+    class _ListMemory(list):
+        def put_messages(self, messages):
+            self.extend(messages)
+
+        async def aput_messages(self, messages):
+            self.extend(messages)
+
+    shared = SQLiteSessionBackend(os.path.join(tempfile.mkdtemp(), "sessions.db"))
+    worker_a = SessionMemoryStore(lambda sid: _ListMemory(), backend=shared)
+    worker_b = SessionMemoryStore(lambda sid: _ListMemory(), backend=shared)
+
+    mem_a = worker_a.get("u1")
+    mem_a.extend([("user", "hola"), ("assistant", "¡Hola!")])
+    worker_a.record("u1", [("user", "hola"), ("assistant", "¡Hola!")])
+    assert worker_a.get("u1") is mem_a                      # nadie más escribió: misma Memory
+    worker_b.record("u2", [("user", "otra sesión")])
+    mem_a.append(("user", "gracias"))
+    worker_a.record("u1", [("user", "gracias")])
+    assert worker_a.get("u1") is mem_a                      # escrituras de otras sesiones no la invalidan
+
+    mem_b = asyncio.run(worker_b.aget("u1"))                 # otro worker ve el historial
+    assert mem_b == [("user", "hola"), ("assistant", "¡Hola!"), ("user", "gracias")]
+    mem_b.append(("user", "casas en Escazú"))
+    asyncio.run(worker_b.arecord("u1", [("user", "casas en Escazú")]))
+
+    assert worker_a.get("u1")[-1] == ("user", "casas en Escazú")  # A se rehidrata
+    worker_a.delete("u1")
+    assert shared.version("u1") == 0
+    print(f"✓ {worker_a.stats()}")
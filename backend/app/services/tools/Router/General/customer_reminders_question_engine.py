@@ -2,6 +2,7 @@
 Customer Reminders Question Engine - Responde preguntas sobre recordatorios de clientes
 """
 
+import asyncio
 import logging
 from typing import Optional
 from llama_index.core.base.base_query_engine import BaseQueryEngine
@@ -9,6 +10,7 @@ from llama_index.core.schema import QueryBundle
 from llama_index.core.base.response.schema import Response
 from llama_index.core.callbacks import CallbackManager
 from .customer_reminders_service import CustomerRemindersService
+from app.services.request_context import get_request_context
 
 logger = logging.getLogger(__name__)
 
@@ -35,8 +37,6 @@ class CustomerRemindersQuestionEngine(BaseQueryEngine):
         """
         super().__init__(callback_manager=CallbackManager([]))
         self.sql_database = sql_database
-        self.user_roles = []
-        self.user_id = None
         self.data_service = CustomerRemindersService(sql_database)
         logger.info("✓ CustomerRemindersQuestionEngine inicializado")
 
@@ -84,18 +84,19 @@ class CustomerRemindersQuestionEngine(BaseQueryEngine):
             logger.error(f"  ❌ Error: {str(e)}", exc_info=True)
             return Response(response=f"⚠️ Error procesando tu consulta: {str(e)}")
 
-    def set_user_roles(self, roles):
-        """Setter para asignar roles del usuario"""
-        self.user_roles = roles if roles else []
+    @property
+    def user_roles(self) -> list:
+        """Roles del usuario de la request actual (ver app.services.request_context)."""
+        return get_request_context().user_roles
 
-    def set_user_id(self, user_id):
-        """Setter para asignar ID del usuario"""
-        self.user_id = user_id
-        logger.info(f"  👤 User ID asignado: {user_id}")
+    @property
+    def user_id(self):
+        """ID del usuario de la request actual (ver app.services.request_context)."""
+        return get_request_context().user_id
 
     async def _aquery(self, query_bundle: QueryBundle) -> Response:
-        """Versión async de _query."""
-        return self._query(query_bundle)
+        """Versión async de _query: las consultas a BD corren en un hilo para no bloquear el event loop."""
+        return await asyncio.to_thread(self._query, query_bundle)
 
     def _get_prompt_modules(self):
         """Requerido por BaseQueryEngine."""
@@ -3,6 +3,8 @@ from llama_index.core.base.response.schema import Response
 from llama_index.core.prompts import PromptTemplate
 from llama_index.core import Settings
 
+from app.services.llm_client import acomplete_text, complete_text
+
 GENERAL_PROMPT = PromptTemplate(
     "Eres EVA, un asistente útil y breve.\n"
     "Si el usuario saluda, saluda y pregunta qué necesita.\n"
@@ -15,5 +17,10 @@ GENERAL_PROMPT = PromptTemplate(
 class GeneralQueryEngine(CustomQueryEngine):
     def custom_query(self, query_str: str) -> Response:
         llm = Settings.llm
-        txt = llm.complete(GENERAL_PROMPT.format(q=query_str)).text
+        txt = complete_text(llm, GENERAL_PROMPT.format(q=query_str))
+        return Response(response=txt)
+
+    async def acustom_query(self, query_str: str) -> Response:
+        llm = Settings.llm
+        txt = await acomplete_text(llm, GENERAL_PROMPT.format(q=query_str))
         return Response(response=txt)
@@ -3,6 +3,7 @@ Operations Question Answering Engine - Responde preguntas sobre citas y operacio
 Solo usuarios con rol 'operations' o 'super_admin' pueden acceder a esta información
 """
 
+import asyncio
 import logging
 from typing import Optional
 from llama_index.core.base.base_query_engine import BaseQueryEngine
@@ -10,6 +11,7 @@ from llama_index.core.schema import QueryBundle
 from llama_index.core.base.response.schema import Response
 from llama_index.core.callbacks import CallbackManager
 from .operations_data_service import OperationsDataService
+from app.services.request_context import get_request_context
 
 logger = logging.getLogger(__name__)
 
@@ -49,8 +51,6 @@ class OperationsQuestionEngine(BaseQueryEngine):
         """
         super().__init__(callback_manager=CallbackManager([]))
         self.sql_database = sql_database
-        self.user_roles = []  # Se asigna desde el router
-        self.user_id = None  # Se asigna desde el router
         self.data_service = OperationsDataService(sql_database)
         logger.info("✓ OperationsQuestionEngine inicializado")
 
@@ -111,19 +111,19 @@ class OperationsQuestionEngine(BaseQueryEngine):
             logger.error(f"  ❌ Error en OperationsDataService: {str(e)}", exc_info=True)
             return Response(response=f"⚠️ Error procesando tu consulta: {str(e)}")
 
-    def set_user_roles(self, roles):
-        """Setter para asignar roles del usuario desde el router"""
-        self.user_roles = roles if roles else []
-        logger.info(f"  👤 Roles asignados: {self.user_roles}")
+    @property
+    def user_roles(self) -> list:
+        """Roles del usuario de la request actual (ver app.services.request_context)."""
+        return get_request_context().user_roles
 
-    def set_user_id(self, user_id):
-        """Setter para asignar ID del usuario desde el router"""
-        self.user_id = user_id
-        logger.info(f"  👤 User ID asignado: {user_id}")
+    @property
+    def user_id(self):
+        """ID del usuario de la request actual (ver app.services.request_context)."""
+        return get_request_context().user_id
 
     async def _aquery(self, query_bundle: QueryBundle) -> Response:
-        """Versión async de _query."""
-        return self._query(query_bundle)
+        """Versión async de _query: las consultas a BD corren en un hilo para no bloquear el event loop."""
+        return await asyncio.to_thread(self._query, query_bundle)
 
     def _get_prompt_modules(self):
         """Requerido por BaseQueryEngine."""
@@ -3,12 +3,23 @@ User Dashboard Service - Muestra todo lo que el usuario tiene en easycore
 """
 
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from typing import Optional, Dict, List, Any
 from datetime import datetime
 from sqlalchemy import text
 
+from app.core.database import EASYCORE, PROFILES
+
 logger = logging.getLogger(__name__)
 
+# Hilos compartidos por todos los dashboards, tantos como conexiones admite el pool de Easycore:
+# varios dashboards a la vez no hacen cola uno detrás de otro, y más hilos solo esperarían conexión
+_DASHBOARD_EXECUTOR = ThreadPoolExecutor(
+    max_workers=PROFILES[EASYCORE].pool_size + PROFILES[EASYCORE].max_overflow,
+    thread_name_prefix="dashboard",
+)
+
 
 class UserDashboardService:
     """
@@ -31,6 +42,25 @@ class UserDashboardService:
         'qué tengo asignado', 'resumen', 'overview', 'estado', 'mi estatus'
     }
 
+    # (método, etiqueta) en el orden en que se muestran
+    DASHBOARD_SECTIONS = [
+        ('_get_user_info', 'Información del usuario'),
+        ('_get_user_customers', 'Clientes'),
+        ('_get_user_properties', 'Propiedades asignadas'),
+        ('_get_user_operations', 'Operaciones'),
+        ('_get_user_projects', 'Proyectos'),
+        ('_get_user_campaigns', 'Campañas'),
+        ('_get_user_credits', 'Solicitudes de crédito'),
+        ('_get_user_offers', 'Ofertas'),
+        ('_get_user_leaves', 'Vacaciones/Permisos'),
+        ('_get_user_third_party_properties', 'Propiedades de terceros'),
+        ('_get_user_collaborations', 'Colaboraciones'),
+        ('_get_user_financial_controls', 'Controles financieros'),
+    ]
+
+    # Segundos máximos para todo el dashboard (las secciones corren en paralelo)
+    SECTION_TIMEOUT = 8.0
+
     def __init__(self, sql_database=None):
         """
         Args:
@@ -64,69 +94,41 @@ class UserDashboardService:
             return f"⚠️ Error al generar tu dashboard: {str(e)[:100]}"
 
     def _get_user_dashboard(self, user_id: int) -> str:
-        """Genera dashboard completo del usuario"""
+        """
+        Genera dashboard completo del usuario.
+
+        Las secciones son consultas independientes: se lanzan en paralelo y el
+        tiempo total queda cerca de la consulta más lenta. Una sección que falla
+        o supera SECTION_TIMEOUT se omite y se avisa al final (resultado parcial).
+        """
         try:
             response = "📊 **MI DASHBOARD EASYCORE**\n\n"
 
-            # Información del usuario
-            user_info = self._get_user_info(user_id)
-            if user_info:
-                response += user_info
-
-            # 1. Clientes
-            customers = self._get_user_customers(user_id)
-            if customers:
-                response += customers
-
-            # 2. Propiedades asignadas
-            properties = self._get_user_properties(user_id)
-            if properties:
-                response += properties
-
-            # 3. Operaciones
-            operations = self._get_user_operations(user_id)
-            if operations:
-                response += operations
-
-            # 4. Proyectos
-            projects = self._get_user_projects(user_id)
-            if projects:
-                response += projects
-
-            # 5. Campañas
-            campaigns = self._get_user_campaigns(user_id)
-            if campaigns:
-                response += campaigns
-
-            # 6. Solicitudes de crédito
-            credits = self._get_user_credits(user_id)
-            if credits:
-                response += credits
-
-            # 7. Ofertas
-            offers = self._get_user_offers(user_id)
-            if offers:
-                response += offers
-
-            # 8. Vacaciones/Permisos
-            leaves = self._get_user_leaves(user_id)
-            if leaves:
-                response += leaves
-
-            # 9. Propiedades de terceros
-            third_party = self._get_user_third_party_properties(user_id)
-            if third_party:
-                response += third_party
-
-            # 10. Solicitudes de colaboración
-            collabs = self._get_user_collaborations(user_id)
-            if collabs:
-                response += collabs
-
-            # 11. Controles financieros
-            financial = self._get_user_financial_controls(user_id)
-            if financial:
-                response += financial
+            deadline = time.monotonic() + self.SECTION_TIMEOUT
+            futures = [
+                (label, _DASHBOARD_EXECUTOR.submit(getattr(self, method), user_id))
+                for method, label in self.DASHBOARD_SECTIONS
+            ]
+
+            missing = []
+            for label, future in futures:
+                try:
+                    section = future.result(timeout=max(0.0, deadline - time.monotonic()))
+                except FutureTimeoutError:
+                    # Si aún no empezó, se saca de la cola para no ocupar un hilo de otro dashboard
+                    future.cancel()
+                    logger.warning(f"⏱️ Sección '{label}' superó {self.SECTION_TIMEOUT}s, se omite")
+                    missing.append(label)
+                    continue
+                except Exception as e:
+                    logger.error(f"❌ Error en sección '{label}': {str(e)}")
+                    missing.append(label)
+                    continue
+                if section:
+                    response += section
+
+            if missing:
+                response += f"\n⚠️ No se pudo cargar: {', '.join(missing)}. Intenta de nuevo en unos minutos.\n"
 
             return response if len(response) > 50 else "ℹ️ No tienes datos asignados aún."
 
@@ -405,3 +407,31 @@ class UserDashboardService:
         except Exception as e:
             logger.error(f"❌ Error ejecutando SQL: {str(e)}")
             raise
+
+
+# ============================================================================
+# TESTS
+# ============================================================================
+
+if __name__ == "__main__":
+    class _SlowDashboard(UserDashboardService):
+        """Simula ~50 ms por consulta y una sección colgada."""
+
+        SECTION_TIMEOUT = 0.5
+
+        def _execute_query(self, sql: str, params: Optional[Dict] = None) -> List[Dict]:
+            time.sleep(3 if "financial_controls" in sql else 0.05)
+            if "GROUP BY" in sql:
+                return [{'total': 2, 'request_status': 'pending'}]
+            if "FROM users" in sql:
+                return [{'name': 'Ana', 'email': 'ana@demo', 'code': None, 'state': 'active',
+                         'country_name': 'CR', 'job_position': None, 'phone': None}]
+            return [{'total': 3}]
+
+    service = _SlowDashboard(sql_database=object())
+    inicio = time.perf_counter()
+    dashboard = service._get_user_dashboard(1)
+    elapsed = time.perf_counter() - inicio
+    print(dashboard)
+    print(f"Dashboard en {elapsed * 1000:.0f} ms (secuencial ≈ {11 * 50 + 3000} ms)")
+    assert "Controles financieros" in dashboard and elapsed < 1.0
@@ -3,9 +3,10 @@ Posts Generation Engine - Genera contenido de posts para redes sociales
 Accesible para todos los usuarios sin restricción de roles
 """
 
+import asyncio
 import logging
 import re
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 from difflib import SequenceMatcher
 from llama_index.core.base.base_query_engine import BaseQueryEngine
 from llama_index.core.schema import QueryBundle
@@ -13,6 +14,10 @@ from llama_index.core.base.response.schema import Response
 from llama_index.core.callbacks import CallbackManager
 from llama_index.core import Settings
 from sqlalchemy import text
+from app.core.cache import TTLCache
+from app.services.request_context import get_request_context
+from app.services.llm_client import complete_text
+from app.services.response_stream import emit
 
 logger = logging.getLogger(__name__)
 
@@ -61,7 +66,8 @@ class PostsGenerationEngine(BaseQueryEngine):
         """Inicializar el engine de generación de posts"""
         super().__init__(callback_manager=CallbackManager([]))
         self.sql_database = sql_database
-        self.user_roles = []  # Se asigna desde el router (acceso abierto)
+        # Propiedades leídas recientemente (pedir otro post de la misma no vuelve a la BD)
+        self._property_cache = TTLCache(maxsize=500, default_ttl=300)
         logger.info("✓ PostsGenerationEngine inicializado")
 
     def _is_generation_request(self, query: str) -> bool:
@@ -104,6 +110,20 @@ class PostsGenerationEngine(BaseQueryEngine):
 
         return None
 
+    def _extract_property_ids(self, query: str) -> List[int]:
+        """Extrae uno o varios IDs (ej: 'propiedades 150, 151 y 152' o '#150 #151')"""
+        query_lower = query.lower()
+        match = re.search(
+            r'(?:ids?|propiedad(?:es)?|property|properties|inmuebles?)\s+#?(\d+(?:\s*(?:,|y|e|and)\s*#?\d+)*)',
+            query_lower,
+        )
+        ids = [int(n) for n in re.findall(r'\d+', match.group(1))] if match else []
+        ids += [int(n) for n in re.findall(r'#(\d+)', query_lower)]
+        if not ids:
+            single = self._extract_property_id(query)
+            ids = [single] if single is not None else []
+        return list(dict.fromkeys(ids))
+
     def _extract_property_url(self, query: str) -> Optional[str]:
         """Extrae URL de propiedad de la query"""
         # Buscar URLs de bienesadjudicados.com o URLs genéricas
@@ -115,34 +135,44 @@ class PostsGenerationEngine(BaseQueryEngine):
 
     def _get_property_data(self, property_id: int) -> Optional[Dict]:
         """Obtiene datos de la propiedad desde BD"""
+        return self._get_properties_data([property_id]).get(property_id)
+
+    def _get_properties_data(self, property_ids: List[int]) -> Dict[int, Dict]:
+        """Obtiene varias propiedades con una sola consulta IN (las ya leídas salen del cache)"""
         if not self.sql_database:
             logger.warning("SQL Database no disponible para obtener datos de propiedad")
-            return None
-
-        try:
-            connection = self.sql_database._engine.connect()
-
-            sql = """
+            return {}
+
+        found = {}
+        missing = []
+        for property_id in property_ids:
+            cached = self._property_cache.get(property_id)
+            if cached is not None:
+                found[property_id] = cached
+            elif property_id not in missing:
+                missing.append(property_id)
+
+        if missing:
+            params = {f"id_{i}": property_id for i, property_id in enumerate(missing)}
+            sql = f"""
             SELECT
                 id, name, description, price, location,
                 property_type, bedrooms, bathrooms,
                 area, agent_name, bank_name, status
             FROM properties
-            WHERE id = :property_id
-            LIMIT 1
+            WHERE id IN ({', '.join(':' + k for k in params)})
             """
-
-            result = connection.execute(text(sql), {'property_id': property_id})
-            row = result.fetchone()
-            connection.close()
-
-            if row:
-                return dict(row._mapping)
-            return None
-
-        except Exception as e:
-            logger.error(f"❌ Error obteniendo datos de propiedad: {str(e)}")
-            return None
+            try:
+                with self.sql_database._engine.connect() as connection:
+                    rows = connection.execute(text(sql), params).fetchall()
+                for row in rows:
+                    data = dict(row._mapping)
+                    self._property_cache.set(data['id'], data)
+                    found[data['id']] = data
+            except Exception as e:
+                logger.error(f"❌ Error obteniendo datos de propiedad: {str(e)}")
+
+        return {i: found[i] for i in property_ids if i in found}
 
     def _detect_platform(self, query: str) -> str:
         """
@@ -240,17 +270,18 @@ class PostsGenerationEngine(BaseQueryEngine):
                 return Response(response=clarification)
 
             # Detectar si hay ID o URL de propiedad
-            property_id = self._extract_property_id(query)
+            property_ids = self._extract_property_ids(query)
             property_url = self._extract_property_url(query)
-            property_data = None
+            property_data = []
 
-            if property_id:
-                logger.info(f"  🏠 ID de propiedad detectado: {property_id}")
-                property_data = self._get_property_data(property_id)
+            if property_ids:
+                logger.info(f"  🏠 IDs de propiedad detectados: {property_ids}")
+                # Un post para varias propiedades: una sola consulta, no una por ID
+                property_data = list(self._get_properties_data(property_ids).values())
                 if property_data:
-                    logger.info(f"  ✅ Datos de propiedad obtenidos")
+                    logger.info(f"  ✅ Datos de {len(property_data)} propiedad(es) obtenidos")
                 else:
-                    logger.warning(f"  ⚠️ No se encontraron datos para propiedad ID {property_id}")
+                    logger.warning(f"  ⚠️ No se encontraron datos para propiedades IDs {property_ids}")
             elif property_url:
                 logger.info(f"  🔗 URL detectada: {property_url}")
 
@@ -260,11 +291,13 @@ class PostsGenerationEngine(BaseQueryEngine):
             logger.info(f"  ✅ Post generado exitosamente")
 
             # Agregar pregunta de ayuda adicional al final
-            response_with_help = (
-                f"{response_text}\n\n"
+            help_text = (
+                f"\n\n"
                 f"---\n"
                 f"¿Te puedo ayudar con algo más? (editar, cambiar tono, otra plataforma, etc) 💬"
             )
+            emit(help_text)
+            response_with_help = f"{response_text}{help_text}"
 
             return Response(response=response_with_help)
 
@@ -273,10 +306,10 @@ class PostsGenerationEngine(BaseQueryEngine):
             return Response(response=f"⚠️ Error al generar el post: {str(e)}")
 
     def _generate_post(self, query: str, platform: str, content_type: str,
-                       property_data: Optional[Dict] = None, property_url: Optional[str] = None) -> str:
+                       property_data: Optional[List[Dict]] = None, property_url: Optional[str] = None) -> str:
         """
         Genera contenido de post usando el LLM
-        Si hay datos de propiedad, los incluye en el prompt
+        Si hay datos de propiedad(es), los incluye en el prompt
         """
         try:
             llm = Settings.llm
@@ -288,7 +321,7 @@ class PostsGenerationEngine(BaseQueryEngine):
             # Agregar contexto de propiedad si está disponible
             property_context = ""
             if property_data:
-                property_context = self._format_property_context(property_data)
+                property_context = "\n".join(self._format_property_context(p) for p in property_data)
 
             prompt = (
                 f"Eres un experto en marketing inmobiliario y redes sociales.\n\n"
@@ -315,14 +348,14 @@ class PostsGenerationEngine(BaseQueryEngine):
                 f"Respuesta:"
             )
 
-            response_text = llm.complete(prompt).text
+            # El encabezado se emite antes para que el caption llegue en streaming debajo
+            platform_emoji = self._get_platform_emoji(platform)
+            header = f"{platform_emoji} **NUEVO POST GENERADO PARA {platform.upper()}**\n\n"
+            emit(header)
+            response_text = complete_text(llm, prompt)
 
             # Formatear respuesta con contexto
-            platform_emoji = self._get_platform_emoji(platform)
-            formatted_response = (
-                f"{platform_emoji} **NUEVO POST GENERADO PARA {platform.upper()}**\n\n"
-                f"{response_text}"
-            )
+            formatted_response = f"{header}{response_text}"
 
             return formatted_response
 
@@ -480,13 +513,13 @@ class PostsGenerationEngine(BaseQueryEngine):
         return emoji_map.get(platform, '📱')
 
     async def _aquery(self, query_bundle: QueryBundle) -> Response:
-        """Versión async de _query."""
-        return self._query(query_bundle)
+        """Versión async de _query: BD y LLM corren en un hilo para no bloquear el event loop."""
+        return await asyncio.to_thread(self._query, query_bundle)
 
-    def set_user_roles(self, roles):
-        """Setter para asignar roles del usuario desde el router (no afecta acceso abierto)"""
-        self.user_roles = roles if roles else []
-        logger.info(f"  👤 Roles asignados (acceso abierto para generación): {self.user_roles}")
+    @property
+    def user_roles(self) -> list:
+        """Roles del usuario de la request actual (ver app.services.request_context)."""
+        return get_request_context().user_roles
 
     def _get_prompt_modules(self):
         """Requerido por BaseQueryEngine."""
@@ -4,6 +4,7 @@ Para preguntas específicas como "a que banco pertenece?" sin necesidad de web c
 """
 
 import re
+import asyncio
 import logging
 from typing import Optional, Dict, Any
 
@@ -12,6 +13,7 @@ from llama_index.core.schema import QueryBundle
 from llama_index.core.base.response.schema import Response
 from llama_index.core.callbacks import CallbackManager
 from llama_index.core import Settings
+from app.services.request_context import get_request_context
 
 logger = logging.getLogger(__name__)
 
@@ -38,9 +40,13 @@ class PropertyQuestionEngine(BaseQueryEngine):
         super().__init__(callback_manager=CallbackManager([]))
         self.context_manager = context_manager
         self.property_db_service = property_db_service
-        self.session_id = None  # Se asigna dinámicamente desde el router
         logger.info("✓ PropertyQuestionEngine inicializado")
     
+    @property
+    def session_id(self):
+        """Sesión de la request actual (ver app.services.request_context)."""
+        return get_request_context().session_id
+
     def _query(self, query_bundle: QueryBundle) -> Response:
         """
         Responde preguntas sobre propiedades desde la BD.
@@ -48,6 +54,11 @@ class PropertyQuestionEngine(BaseQueryEngine):
         query = query_bundle.query_str
         logger.info(f"📋 Pregunta sobre propiedad: {query}")
 
+        # "compara la 1, 2 y 3": varias propiedades en una sola consulta
+        comparison = self._compare_properties(query)
+        if comparison is not None:
+            return comparison
+
         # Obtener datos de la propiedad
         property_data = None
 
@@ -77,7 +88,7 @@ class PropertyQuestionEngine(BaseQueryEngine):
         # 4️⃣ Si no encontró, intentar usar contexto (última propiedad de la conversación)
         if not property_data and self.context_manager and self.session_id:
             logger.info(f"  📚 Intentando obtener propiedad del contexto...")
-            property_data = self.context_manager.get_last_property(self.session_id)
+            property_data = self._from_context(self.session_id)
             if property_data:
                 logger.info(f"  ✓ Propiedad obtenida del contexto: {property_data.get('nombre', 'N/A')}")
 
@@ -118,6 +129,64 @@ class PropertyQuestionEngine(BaseQueryEngine):
 
         return Response(response=response_text)
     
+    def _compare_properties(self, query: str) -> Optional[Response]:
+        """
+        Compara varias propiedades: números de la última búsqueda ("compara la 1, 2 y 3")
+        o IDs ("compara las propiedades ID 150 y 151"). None si la pregunta no es una comparación.
+        """
+        if not re.search(r'\bcompar', query.lower()):
+            return None
+        numbers = list(dict.fromkeys(int(n) for n in re.findall(r'\b(\d+)\b', query)))
+        if len(numbers) < 2:
+            return None
+
+        if re.search(r'\bids?\b', query, re.IGNORECASE):
+            # IDs explícitos: no son posiciones de la lista
+            snapshots = [None] * len(numbers)
+            ids = numbers
+        else:
+            # Posiciones de la última lista mostrada; nunca se interpretan como IDs
+            results = self.context_manager.get_search_results(self.session_id) if self.context_manager and self.session_id else []
+            if not results or not all(1 <= n <= len(results) for n in numbers):
+                return Response(
+                    response=(
+                        "No tengo una búsqueda reciente con esos números. "
+                        "Repite la búsqueda o indícame los IDs (por ejemplo: \"compara los ID 150 y 151\")."
+                    )
+                )
+            snapshots = [results[n - 1] for n in numbers]
+            ids = [snapshot.id for snapshot in snapshots]
+
+        logger.info(f"  ⚖️ Comparando propiedades: {ids}")
+        rows = self.property_db_service.get_properties_by_ids([i for i in ids if i is not None])
+        properties = [
+            rows.get(i) or (snapshot.to_dict() if snapshot is not None else None)
+            for i, snapshot in zip(ids, snapshots)
+        ]
+        properties = [p for p in properties if p]
+        if len(properties) < 2:
+            return None
+
+        parts = [f"## Comparacion de {len(properties)} propiedades\n"]
+        for i, property_data in enumerate(properties, 1):
+            parts.append(f"### {i}. " + self._generate_property_summary(property_data).response)
+        return Response(response="\n\n---\n\n".join(parts))
+
+    def _from_context(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        El contexto solo guarda un snapshot (id, url, nombre, precio, banco):
+        se vuelve a leer la fila completa para responder agente, cuartos, área, etc.
+        """
+        snapshot = self.context_manager.get_last_snapshot(session_id)
+        if snapshot is None:
+            return None
+        property_data = None
+        if snapshot.id is not None:
+            property_data = self.property_db_service.get_property_by_id(snapshot.id)
+        if not property_data and snapshot.url:
+            property_data = self.property_db_service.get_property_by_url(snapshot.url)
+        return property_data or snapshot.to_dict()
+
     def _detect_question_type(self, query: str) -> Optional[str]:
         """
         Detecta qué tipo de pregunta es.
@@ -352,8 +421,8 @@ class PropertyQuestionEngine(BaseQueryEngine):
         return "No pude encontrar esa información específica."
     
     async def _aquery(self, query_bundle: QueryBundle) -> Response:
-        """Versión async."""
-        return self._query(query_bundle)
+        """Versión async de _query: las consultas a BD corren en un hilo para no bloquear el event loop."""
+        return await asyncio.to_thread(self._query, query_bundle)
     
     def _get_prompt_modules(self):
         """Requerido por BaseQueryEngine."""
@@ -1,22 +1,159 @@
 """
 Query Preprocessor - Detecta patrones específicos en consultas del usuario
 para enrutarlas directamente a la herramienta correcta sin pasar por el selector LLM
+
+Además del ID de propiedad, clasifica intenciones fáciles por keywords
+(citas, cumpleaños, posts de Instagram, bancos...) con un puntaje por
+herramienta. Solo enruta directo cuando el puntaje es claro; si no, la
+consulta sigue al selector LLM. Lleva métricas de hit-rate para medir
+cuántas llamadas al selector se ahorran.
 """
 
 import re
 import logging
-from typing import Optional, Tuple
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Pattern, Tuple
 from enum import Enum
 
+from .operations_data_service import OperationsDataService
+from .posts_data_service import PostsDataService
+from .rrhh_data_service import RrhhDataService
+
 logger = logging.getLogger(__name__)
 
 
 class QueryType(Enum):
     """Tipos de consulta detectables"""
     PROPERTY_ID = "property_id"  # Consulta con ID de propiedad específico
+    RRHH = "rrhh"                                     # → rrhh_info
+    OPERATIONS = "operations"                         # → operations_appointments
+    CUSTOMER_REMINDERS = "customer_reminders"         # → customer_reminders
+    PENDING_REMINDERS = "pending_reminders"           # → pending_reminders
+    POSTS_INFO = "posts_info"                         # → posts_info
+    POSTS_GENERATION = "posts_generation"             # → posts_generation
+    BANKS = "banks"                                   # → bancos
+    INTERNET_BIENES = "internet_bienes"               # → internet_bienesadjudicadoscr
     GENERAL = "general"           # Consulta general (usa router)
 
 
+# Herramienta del router a la que va cada intención detectada por keywords
+TOOL_BY_QUERY_TYPE: Dict[QueryType, str] = {
+    QueryType.RRHH: "rrhh_info",
+    QueryType.OPERATIONS: "operations_appointments",
+    QueryType.CUSTOMER_REMINDERS: "customer_reminders",
+    QueryType.PENDING_REMINDERS: "pending_reminders",
+    QueryType.POSTS_INFO: "posts_info",
+    QueryType.POSTS_GENERATION: "posts_generation",
+    QueryType.BANKS: "bancos",
+    QueryType.INTERNET_BIENES: "internet_bienesadjudicadoscr",
+}
+
+STRONG_WEIGHT = 3  # Frase inequívoca de la intención
+WEAK_WEIGHT = 1    # Keyword de los data services (puede aparecer en otras intenciones)
+
+# Puntaje mínimo y ventaja sobre la segunda intención para enrutar sin LLM
+MIN_SCORE = 3
+MIN_MARGIN = 2
+
+_SOCIAL_PLATFORMS = ("instagram", "facebook", "twitter", "tiktok", "linkedin", "youtube")
+
+# Frases fuertes por intención (regex). Deben identificar la herramienta por sí solas.
+STRONG_RULES: Dict[QueryType, List[str]] = {
+    QueryType.RRHH: [
+        r"cumpleaños?", r"recursos humanos", r"rrhh", r"expedientes?",
+        r"vacaciones", r"incapacidad(es)?", r"reglamento", r"c[oó]digo (de )?conducta",
+        r"pol[ií]ticas? internas?", r"asesores certificados",
+    ],
+    QueryType.OPERATIONS: [
+        r"mis citas", r"tengo (una )?citas?", r"citas (pendientes|agendadas|programadas)",
+        r"pr[oó]ximas citas", r"citas con",
+    ],
+    QueryType.CUSTOMER_REMINDERS: [
+        r"recordatorios? de clientes?", r"clientes sin (cita|seguimiento)",
+        r"necesitan seguimiento", r"clientes pendientes", r"seguimientos? pendientes?",
+    ],
+    QueryType.PENDING_REMINDERS: [
+        r"mi dashboard", r"mis datos", r"mi informaci[oó]n", r"qu[eé] tengo asignado",
+        r"mi resumen", r"mis pendientes", r"mis tareas", r"resumen de mis actividades",
+    ],
+    QueryType.POSTS_INFO: [
+        *(rf"(posts?|publicaciones) (de|en) {p}" for p in _SOCIAL_PLATFORMS),
+        r"engagement", r"(posts?|publicaciones) con m[aá]s", r"(mejores|top) posts?",
+        r"estad[ií]sticas de (los )?posts?",
+    ],
+    QueryType.POSTS_GENERATION: [
+        r"(elabora|genera|crea|escribe|redacta|haz|hazme|prepara)\w*\b.{0,40}\b(posts?|publicaci[oó]n|caption|tweet|reel|copy)",
+        *(rf"(posts?|publicaci[oó]n|caption|copy) para {p}" for p in _SOCIAL_PLATFORMS),
+    ],
+    QueryType.INTERNET_BIENES: [
+        r"https?://(www\.)?bienesadjudicadoscr\.com\S*",
+    ],
+}
+
+# Nombres de bancos: frase fuerte de BANKS solo si la consulta no busca propiedades
+# ("casas del BCR en Heredia" es una búsqueda de bienes_adjudicados, no una pregunta de bancos)
+BANK_NAMES: List[str] = [
+    r"banco nacional", r"banco de costa rica", r"banco popular", r"bcr", r"bccr", r"bncr",
+    r"davivienda", r"scotiabank", r"promerica", r"lafise", r"coopenae", r"mucap",
+    r"bac( credomatic)?",
+]
+
+# Tipos de propiedad y provincias que convierten la consulta en una búsqueda: con ellos las
+# frases fuertes cuentan como débiles ("casas de vacaciones en Guanacaste" no es de RRHH)
+PROPERTY_SEARCH_TERMS: List[str] = [
+    r"casas?", r"lotes?", r"terrenos?", r"apartamentos?", r"fincas?", r"locales?( comerciales?)?",
+    r"bodegas?", r"oficinas?", r"condominios?", r"quintas?",
+    r"san jos[eé]", r"alajuela", r"cartago", r"heredia", r"guanacaste", r"puntarenas", r"lim[oó]n",
+]
+
+# Intenciones cuya frase fuerte ya habla de propiedades (un post de una casa, un enlace del sitio)
+PROPERTY_AWARE_INTENTS = {QueryType.POSTS_GENERATION, QueryType.INTERNET_BIENES}
+
+# Keywords débiles: se reutilizan los sets que ya mantienen los data services
+WEAK_KEYWORDS: Dict[QueryType, Iterable[str]] = {
+    QueryType.RRHH: (
+        RrhhDataService.EMPLOYEES_KEYWORDS | RrhhDataService.LEAVES_KEYWORDS
+        | RrhhDataService.POLICIES_KEYWORDS | RrhhDataService.BIRTHDAYS_KEYWORDS
+    ),
+    QueryType.OPERATIONS: OperationsDataService.APPOINTMENTS_KEYWORDS,
+    QueryType.CUSTOMER_REMINDERS: {"seguimiento", "seguimientos", "agendar", "llamada", "llamadas"},
+    QueryType.POSTS_INFO: (
+        PostsDataService.POSTS_KEYWORDS | PostsDataService.REACTIONS_KEYWORDS
+        | PostsDataService.COMMENTS_KEYWORDS | PostsDataService.SHARES_KEYWORDS
+        | PostsDataService.VIEWS_KEYWORDS | PostsDataService.REACH_KEYWORDS
+    ),
+    QueryType.BANKS: {"banco", "bancos", "remate", "remates", "entidad financiera"},
+}
+
+
+# El orquestador antepone el historial como "rol: contenido" y cierra con "\nUsuario: <mensaje>"
+_HISTORY_MARKER = "\nusuario: "
+
+
+def has_chat_history(query: str) -> bool:
+    """True si la consulta trae historial antepuesto por el orquestador."""
+    return _HISTORY_MARKER in query.lower()
+
+
+def current_user_message(query: str) -> str:
+    """Último mensaje del usuario, sin el historial antepuesto."""
+    idx = query.lower().rfind(_HISTORY_MARKER)
+    return query[idx + len(_HISTORY_MARKER):] if idx != -1 else query
+
+
+def _compile(patterns: Iterable[str], escape: bool) -> List[Pattern]:
+    compiled = []
+    for pattern in patterns:
+        pattern = pattern.strip()
+        # Keywords de 1-2 letras ('x', 'ig', 'tt') generan demasiados falsos positivos
+        if not pattern or (escape and len(pattern) < 3):
+            continue
+        body = re.escape(pattern) if escape else pattern
+        compiled.append(re.compile(rf"(?<!\w){body}(?!\w)"))
+    return compiled
+
+
 class QueryPreprocessor:
     """
     Pre-procesa consultas para detectar patrones y enrutarlas directamente.
@@ -33,6 +170,16 @@ class QueryPreprocessor:
             response = router.query(query)
     """
 
+    def __init__(self, min_score: int = MIN_SCORE, min_margin: int = MIN_MARGIN):
+        self.min_score = min_score
+        self.min_margin = min_margin
+        self._strong = {qt: _compile(patterns, escape=False) for qt, patterns in STRONG_RULES.items()}
+        self._weak = {qt: _compile(keywords, escape=True) for qt, keywords in WEAK_KEYWORDS.items()}
+        self._bank_names = _compile(BANK_NAMES, escape=False)
+        self._property_terms = _compile(PROPERTY_SEARCH_TERMS, escape=False)
+        self._stats = Counter()
+        self._stats_lock = threading.Lock()
+
     def analyze(self, query: str) -> Tuple[QueryType, Optional[int]]:
         """
         Analiza una consulta y detecta el tipo y parámetros.
@@ -40,6 +187,11 @@ class QueryPreprocessor:
         Returns:
             Tuple[QueryType, Optional[int]]: (tipo_consulta, property_id si aplica)
         """
+        query_type, property_id = self._analyze(query)
+        self._record(query_type)
+        return query_type, property_id
+
+    def _analyze(self, query: str) -> Tuple[QueryType, Optional[int]]:
         query_lower = query.lower()
 
         # Detectar si tiene ID de propiedad
@@ -53,9 +205,99 @@ class QueryPreprocessor:
                 logger.info(f"  ✓ Consulta sobre propiedad → EnrutandoDirecto a property_info")
                 return QueryType.PROPERTY_ID, property_id
 
+        # Intenciones por keywords (solo sobre el mensaje actual, no el historial)
+        intent = self._classify_intent(self._current_message(query_lower))
+        if intent is not None:
+            return intent, None
+
         # Si no detectó patrón específico, usa router normal
         return QueryType.GENERAL, None
 
+    def _current_message(self, query_lower: str) -> str:
+        """El orquestador puede anteponer historial; se puntúa solo el último mensaje del usuario."""
+        return current_user_message(query_lower)
+
+    def score_intents(self, query_lower: str) -> Dict[QueryType, int]:
+        """Puntaje de cada intención: frases fuertes + keywords de los data services."""
+        property_search = self._is_property_search(query_lower)
+        scores: Dict[QueryType, int] = {}
+        for query_type in TOOL_BY_QUERY_TYPE:
+            strong_weight = WEAK_WEIGHT if property_search and query_type not in PROPERTY_AWARE_INTENTS else STRONG_WEIGHT
+            score = strong_weight * sum(1 for p in self._strong.get(query_type, []) if p.search(query_lower))
+            score += WEAK_WEIGHT * sum(1 for p in self._weak.get(query_type, []) if p.search(query_lower))
+            if query_type == QueryType.BANKS:
+                score += strong_weight * sum(1 for p in self._bank_names if p.search(query_lower))
+            if score:
+                scores[query_type] = score
+        return scores
+
+    def _is_property_search(self, query_lower: str) -> bool:
+        """
+        Con tipo de propiedad o provincia, una palabra de otra herramienta (un banco,
+        "vacaciones", "reglamento") es parte de la búsqueda: decide el selector LLM.
+        """
+        return any(p.search(query_lower) for p in self._property_terms)
+
+    def _classify_intent(self, query_lower: str) -> Optional[QueryType]:
+        """
+        Retorna la intención si es confiable (puntaje mínimo y ventaja clara
+        sobre la segunda); si no, None para que decida el selector LLM.
+        """
+        scores = self.score_intents(query_lower)
+        if not scores:
+            return None
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        best_type, best_score = ranked[0]
+        second_score = ranked[1][1] if len(ranked) > 1 else 0
+
+        if best_score >= self.min_score and best_score - second_score >= self.min_margin:
+            logger.info(
+                f"  ⚡ PreProcessor: intención {best_type.value} "
+                f"(puntaje {best_score}, ventaja {best_score - second_score}) → {TOOL_BY_QUERY_TYPE[best_type]}"
+            )
+            return best_type
+
+        logger.info(f"  🤔 PreProcessor: intención ambigua {[(t.value, s) for t, s in ranked[:3]]} → selector LLM")
+        return None
+
+    # -------- Métricas --------
+    def _record(self, query_type: QueryType):
+        with self._stats_lock:
+            self._stats["total"] += 1
+            self._stats[query_type.value] += 1
+
+    def record_fallback(self, query_type: QueryType):
+        """La herramienta elegida por keywords no respondió y la consulta volvió al selector LLM."""
+        with self._stats_lock:
+            self._stats["fallback_vacio"] += 1
+            self._stats[f"{query_type.value}_fallback"] += 1
+
+    def stats(self) -> Dict[str, object]:
+        """
+        Métricas del nivel de keywords: cuántas consultas se resolvieron sin selector.
+
+        Returns:
+            dict con total, directas, no resueltas (siguen al siguiente nivel), hit_rate y conteo por tipo
+        """
+        with self._stats_lock:
+            counts = dict(self._stats)
+
+        total = counts.get("total", 0)
+        unresolved = counts.get(QueryType.GENERAL.value, 0) + counts.get("fallback_vacio", 0)
+        direct = total - unresolved
+        return {
+            "total": total,
+            "directas": direct,
+            "no_resueltas": unresolved,
+            "hit_rate": round(direct / total, 4) if total else 0.0,
+            "por_tipo": {k: v for k, v in counts.items() if k != "total"},
+        }
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._stats.clear()
+
     def _extract_property_id(self, query_lower: str) -> Optional[int]:
         """
         Extrae ID de propiedad del query.
@@ -119,3 +361,40 @@ def get_preprocessor() -> QueryPreprocessor:
     if _preprocessor_instance is None:
         _preprocessor_instance = QueryPreprocessor()
     return _preprocessor_instance
+
+
+# ============================================================================
+# TESTS
+# ============================================================================
+
+if __name__ == "__main__":
+    preprocessor = QueryPreprocessor()
+
+    casos = [
+        ("¿Cuál es el precio de la propiedad 59338?", QueryType.PROPERTY_ID),
+        ("¿Tengo citas pendientes esta semana?", QueryType.OPERATIONS),
+        ("mis citas de mañana", QueryType.OPERATIONS),
+        ("¿Qué cumpleaños hay este mes?", QueryType.RRHH),
+        ("¿Cuántos días de vacaciones tiene María?", QueryType.RRHH),
+        ("Muéstrame los posts de Instagram con más reacciones", QueryType.POSTS_INFO),
+        ("Crea un post para Instagram de una casa en Escazú", QueryType.POSTS_GENERATION),
+        ("¿Qué propiedades tiene el Banco Nacional?", QueryType.BANKS),
+        ("casas del BCR en Heredia", QueryType.GENERAL),
+        ("lotes en venta del Banco Nacional en Alajuela", QueryType.GENERAL),
+        ("¿Qué clientes necesitan seguimiento?", QueryType.CUSTOMER_REMINDERS),
+        ("Mi dashboard", QueryType.PENDING_REMINDERS),
+        ("Info de https://bienesadjudicadoscr.com/propiedades/casa-en-heredia", QueryType.INTERNET_BIENES),
+        ("Hola, ¿cómo estás?", QueryType.GENERAL),
+        ("Casas en San José bajo 100 mil", QueryType.GENERAL),
+        ("casas de vacaciones en Guanacaste", QueryType.GENERAL),
+        ("quinta para vacaciones en Puntarenas", QueryType.GENERAL),
+        ("¿cuál es el reglamento del condominio de la propiedad?", QueryType.GENERAL),
+        ("engagement de los lotes en Heredia", QueryType.GENERAL),
+    ]
+
+    for consulta, esperado in casos:
+        obtenido, _ = preprocessor.analyze(consulta)
+        assert obtenido == esperado, f"{consulta!r}: {obtenido.value} (esperado {esperado.value})"
+    print(f"✓ {len(casos)} consultas clasificadas")
+
+    print(f"\nMétricas: {preprocessor.stats()}")
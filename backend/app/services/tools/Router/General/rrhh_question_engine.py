@@ -3,6 +3,7 @@ RRHH Question Answering Engine - Responde preguntas sobre RRHH con control de ac
 Solo usuarios con rol 'rrhh' o 'super_admin' pueden acceder a esta información
 """
 
+import asyncio
 import logging
 from typing import Optional
 from llama_index.core.base.base_query_engine import BaseQueryEngine
@@ -10,6 +11,7 @@ from llama_index.core.schema import QueryBundle
 from llama_index.core.base.response.schema import Response
 from llama_index.core.callbacks import CallbackManager
 from .rrhh_data_service import RrhhDataService
+from app.services.request_context import get_request_context
 
 logger = logging.getLogger(__name__)
 
@@ -63,7 +65,6 @@ class RrhhQuestionEngine(BaseQueryEngine):
         """
         super().__init__(callback_manager=CallbackManager([]))
         self.sql_database = sql_database
-        self.user_roles = []  # Se asigna desde el router
         self.data_service = RrhhDataService(sql_database)
         logger.info("✓ RrhhQuestionEngine inicializado")
 
@@ -119,14 +120,14 @@ class RrhhQuestionEngine(BaseQueryEngine):
             logger.error(f"  ❌ Error en RrhhDataService: {str(e)}", exc_info=True)
             return Response(response=f"⚠️ Error procesando tu consulta: {str(e)}")
 
-    def set_user_roles(self, roles):
-        """Setter para asignar roles del usuario desde el router"""
-        self.user_roles = roles if roles else []
-        logger.info(f"  👤 Roles asignados: {self.user_roles}")
+    @property
+    def user_roles(self) -> list:
+        """Roles del usuario de la request actual (ver app.services.request_context)."""
+        return get_request_context().user_roles
 
     async def _aquery(self, query_bundle: QueryBundle) -> Response:
-        """Versión async de _query."""
-        return self._query(query_bundle)
+        """Versión async de _query: las consultas a BD corren en un hilo para no bloquear el event loop."""
+        return await asyncio.to_thread(self._query, query_bundle)
 
     def _get_prompt_modules(self):
         """Requerido por BaseQueryEngine."""
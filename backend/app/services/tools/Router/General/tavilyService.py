@@ -3,6 +3,7 @@ TavilyService Híbrido - Combina datos de web (Tavily) + Base de Datos
 Siempre enriquece con precio, banco y agente desde la BD
 """
 
+import asyncio
 import json
 import re
 import logging
@@ -17,6 +18,8 @@ from llama_index.core.callbacks import CallbackManager
 from llama_index.core import Settings
 from llama_index.core.prompts import PromptTemplate
 
+from app.services.llm_client import complete_text
+
 logger = logging.getLogger(__name__)
 
 ALLOWED_DOMAIN = "bienesadjudicadoscr.com"
@@ -491,7 +494,7 @@ RESPUESTA FORMATEADA:
             logger.info("🤖 Enviando a LLM para formateo híbrido...")
 
             # Generar respuesta
-            formatted_response = llm.complete(prompt).text
+            formatted_response = complete_text(llm, prompt)
 
             logger.info("✓ Respuesta híbrida generada")
 
@@ -530,8 +533,8 @@ _Información combinada de nuestra base de datos y la página web oficial_
 """
 
     async def _aquery(self, query_bundle: QueryBundle) -> Response:
-        """Versión async."""
-        return self._query(query_bundle)
+        """Versión async: BD, crawl y LLM corren en un hilo para no bloquear el event loop."""
+        return await asyncio.to_thread(self._query, query_bundle)
 
     def _get_prompt_modules(self):
         """Requerido por BaseQueryEngine."""
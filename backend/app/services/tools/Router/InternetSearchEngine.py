@@ -1,7 +1,7 @@
 import logging
 from typing import Dict, Any
 
-from tavily import TavilyClient
+from tavily import TavilyClient, AsyncTavilyClient
 from llama_index.core.base.base_query_engine import BaseQueryEngine
 from llama_index.core.schema import QueryBundle
 from llama_index.core.base.response.schema import Response
@@ -9,6 +9,8 @@ from llama_index.core.callbacks import CallbackManager
 from llama_index.core import Settings
 from llama_index.core.prompts import PromptTemplate
 
+from app.services.llm_client import acomplete_text, complete_text
+
 logger = logging.getLogger(__name__)
 
 INTERNET_SEARCH_PROMPT = PromptTemplate("""
@@ -41,28 +43,42 @@ class InternetSearchEngine(BaseQueryEngine):
     def __init__(self, api_key: str):
         super().__init__(callback_manager=CallbackManager([]))
         self.client = TavilyClient(api_key=api_key)
+        self.async_client = AsyncTavilyClient(api_key=api_key)
         logger.info("✓ InternetSearchEngine inicializado (búsqueda general)")
 
+    def _search_kwargs(self, query: str) -> Dict[str, Any]:
+        return dict(
+            query=query,
+            search_depth="advanced",
+            max_results=5,
+            include_answer=True,
+            include_raw_content=False,
+        )
+
+    def _no_results_response(self) -> Response:
+        return Response(
+            response="No encontré información suficiente en internet para responder tu consulta. "
+                     "¿Podrías reformular la pregunta o darme más contexto?"
+        )
+
+    def _error_response(self, e: Exception) -> Response:
+        logger.error(f"❌ Error en búsqueda general: {e}", exc_info=True)
+        return Response(
+            response=f"Ocurrió un error al buscar en internet: {str(e)}. "
+                     "Por favor intenta de nuevo."
+        )
+
     def _query(self, query_bundle: QueryBundle) -> Response:
         query = query_bundle.query_str
         logger.info(f"🌐 BÚSQUEDA GENERAL EN INTERNET: {query}")
 
         try:
-            search_response = self.client.search(
-                query=query,
-                search_depth="advanced",
-                max_results=5,
-                include_answer=True,
-                include_raw_content=False,
-            )
+            search_response = self.client.search(**self._search_kwargs(query))
 
             search_text = self._format_results(search_response)
 
             if not search_text:
-                return Response(
-                    response="No encontré información suficiente en internet para responder tu consulta. "
-                             "¿Podrías reformular la pregunta o darme más contexto?"
-                )
+                return self._no_results_response()
 
             llm = Settings.llm
             prompt = INTERNET_SEARCH_PROMPT.format(
@@ -70,15 +86,11 @@ class InternetSearchEngine(BaseQueryEngine):
                 search_results=search_text
             )
 
-            final_response = llm.complete(prompt).text.strip()
+            final_response = complete_text(llm, prompt).strip()
             return Response(response=final_response)
 
         except Exception as e:
-            logger.error(f"❌ Error en búsqueda general: {e}", exc_info=True)
-            return Response(
-                response=f"Ocurrió un error al buscar en internet: {str(e)}. "
-                         "Por favor intenta de nuevo."
-            )
+            return self._error_response(e)
 
     def _format_results(self, search_response: Dict[str, Any]) -> str:
         parts = []
@@ -103,7 +115,27 @@ class InternetSearchEngine(BaseQueryEngine):
         return "\n".join(parts)
 
     async def _aquery(self, query_bundle: QueryBundle) -> Response:
-        return self._query(query_bundle)
+        query = query_bundle.query_str
+        logger.info(f"🌐 BÚSQUEDA GENERAL EN INTERNET (async): {query}")
+
+        try:
+            search_response = await self.async_client.search(**self._search_kwargs(query))
+
+            search_text = self._format_results(search_response)
+
+            if not search_text:
+                return self._no_results_response()
+
+            prompt = INTERNET_SEARCH_PROMPT.format(
+                user_query=query,
+                search_results=search_text
+            )
+
+            final_response = (await acomplete_text(Settings.llm, prompt)).strip()
+            return Response(response=final_response)
+
+        except Exception as e:
+            return self._error_response(e)
 
     def _get_prompt_modules(self):
         return {} 
\ No newline at end of file
@@ -1,12 +1,14 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 import logging
 
-from sqlalchemy import create_engine, text
 from sqlalchemy.engine import Engine
+from app.core.database import BIENES, afetch_all, fetch_all, get_engine
 from app.services.tools.Router.SQLQuery.filterbase import STOPWORDS, extraer_filtros
+from app.services.tools.Router.SQLQuery.bienesadjudicados.propertycatalog import PropertyCatalog
+from app.services.tools.Router.SQLQuery.bienesadjudicados.propertysearchindex import PropertySearchIndex
 
 logger = logging.getLogger(__name__)
 
@@ -48,24 +50,46 @@ TEXT_SEARCH_COLS = [
 @dataclass
 class BienesDB:
     engine: Engine
+    # Índice invertido en memoria; None = siempre SQL (ver enable_search_index)
+    search_index: Optional[PropertySearchIndex] = None
+    # Catálogo en memoria; si existe, alimenta el índice y resuelve las búsquedas solo con filtros
+    catalog: Optional[PropertyCatalog] = None
 
     @staticmethod
-    def build_engine(db_uri: str) -> Engine:
-        # ✅ SiteGround/shared hosting: conexiones frágiles -> pre_ping + recycle corto
-        logger.info(f"Creando engine de BD para Bienes Adjudicados")
-        return create_engine(
-            db_uri,
-            pool_pre_ping=True,
-            pool_recycle=300,  # 5 min
-            connect_args={
-                "connect_timeout": 10,
-                "read_timeout": 60,
-                "write_timeout": 60,
-                "charset": "utf8mb4",
-            },
+    def build_engine(db_uri: Optional[str] = None) -> Engine:
+        # ✅ SiteGround/shared hosting: el pool compartido de "bienes" ya aplica pre_ping + recycle corto
+        return get_engine(BIENES, db_uri)
+
+    def enable_search_index(self, refresh_interval: Optional[float] = 600) -> PropertySearchIndex:
+        """Activa la búsqueda por índice invertido (se carga en segundo plano en la primera búsqueda)."""
+        if self.catalog is not None:
+            # El catálogo ya tiene las filas y sabe cuándo cambian: el índice se reconstruye con él
+            self.search_index = PropertySearchIndex(
+                loader=self._load_catalog,
+                text_cols=TEXT_SEARCH_COLS,
+                refresh_interval=None,
+            )
+            self.catalog.on_refresh(lambda _snapshot: self.search_index.load())
+            return self.search_index
+
+        self.search_index = PropertySearchIndex(
+            loader=self._load_catalog,
+            text_cols=TEXT_SEARCH_COLS,
+            refresh_interval=refresh_interval,
         )
+        return self.search_index
 
-    def buscar(
+    def _load_catalog(self) -> List[Dict[str, Any]]:
+        cols = DEFAULT_SELECT_COLS + [c for c in TEXT_SEARCH_COLS if c not in DEFAULT_SELECT_COLS]
+        if self.catalog is not None:
+            snapshot = self.catalog.snapshot
+            if snapshot is None:
+                raise RuntimeError("El catálogo de propiedades aún no está cargado")
+            return snapshot.records(cols)
+        select_cols = ", ".join(f"`{c}`" for c in cols)
+        return fetch_all(self.engine, f"SELECT {select_cols} FROM `vw_get_all_properties`")
+
+    def _parse_search(
         self,
         q: Optional[str] = None,
         provincia: Optional[str] = None,
@@ -76,12 +100,13 @@ class BienesDB:
         precio_max: Optional[float] = None,
         limit: int = 25,
         filtros_adicionales: Optional[Dict[str, Any]] = None,
-    ) -> List[Dict[str, Any]]:
+    ) -> Optional[Dict[str, Any]]:
         """
-        Consulta controlada sobre vw_get_all_properties.
-        - Sin introspección de schema.
-        - Filtros con LIKE (case-insensitive).
-        - LIMIT forzado para evitar cargas.
+        Normaliza los filtros de una búsqueda (términos de texto, filtros
+        extraídos del texto, LIMIT forzado para evitar cargas).
+
+        Returns:
+            Argumentos para _build_search / PropertySearchIndex.search, o None si la búsqueda es demasiado amplia
         """
         logger.info(f"\n{'='*60}")
         logger.info(f"🔍 BÚSQUEDA EN BIENES ADJUDICADOS")
@@ -100,15 +125,7 @@ class BienesDB:
             precio_max = precio_max or filtros_adicionales.get("precio_max")
             logger.info(f"Filtros extraídos del texto: {filtros_adicionales}")
 
-        select_cols = ", ".join(f"`{c}`" for c in DEFAULT_SELECT_COLS)
-
-        where = []
-        params: Dict[str, Any] = {"limit": limit}
-
-        def add_like(field: str, value: Optional[str], param_name: str):
-            if value:
-                where.append(f"LOWER(`{field}`) LIKE :{param_name}")
-                params[param_name] = f"%{value.lower()}%"
+        terms: List[str] = []
 
         # ✅ MEJORADO: Procesamiento de búsqueda de texto
         if q:
@@ -121,23 +138,60 @@ class BienesDB:
             # ✅ Si solo hay provincias/cantones como términos, no filtres tanto
             has_meaningful_terms = any(t not in [p.lower() for p in ["san jose", "alajuela", "heredia", "cartago", "guanacaste", "puntarenas", "limon"]] for t in terms)
             
-            if terms:
-                term_blocks = []
-                for i, term in enumerate(terms):
-                    ors = []
-                    for j, col in enumerate(TEXT_SEARCH_COLS):
-                        pn = f"t_{i}_{j}"
-                        ors.append(f"LOWER(`{col}`) LIKE :{pn}")
-                        params[pn] = f"%{term}%"
-                    term_blocks.append("(" + " OR ".join(ors) + ")")
-                
-                if term_blocks:
-                    # ✅ Usar OR entre términos para búsquedas más flexibles
-                    where.append("(" + " OR ".join(term_blocks) + ")")
-            elif not any([provincia, canton, tipo, estado, precio_min, precio_max]):
+            if not terms and not any([provincia, canton, tipo, estado, precio_min, precio_max]):
                 # ✅ Si no hay términos útiles NI filtros, devolver vacío
                 logger.warning("⚠️ Búsqueda muy amplia sin filtros específicos - devolviendo vacío")
-                return []
+                return None
+
+        return {
+            "terms": terms,
+            "provincia": provincia,
+            "canton": canton,
+            "tipo": tipo,
+            "estado": estado,
+            "precio_min": precio_min,
+            "precio_max": precio_max,
+            "limit": limit,
+        }
+
+    def _build_search(
+        self,
+        terms: List[str],
+        provincia: Optional[str] = None,
+        canton: Optional[str] = None,
+        tipo: Optional[str] = None,
+        estado: Optional[str] = None,
+        precio_min: Optional[float] = None,
+        precio_max: Optional[float] = None,
+        limit: int = 25,
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        Construye la consulta controlada sobre vw_get_all_properties.
+        - Sin introspección de schema.
+        - Filtros con LIKE (case-insensitive).
+        """
+        select_cols = ", ".join(f"`{c}`" for c in DEFAULT_SELECT_COLS)
+
+        where = []
+        params: Dict[str, Any] = {"limit": limit}
+
+        def add_like(field: str, value: Optional[str], param_name: str):
+            if value:
+                where.append(f"LOWER(`{field}`) LIKE :{param_name}")
+                params[param_name] = f"%{value.lower()}%"
+
+        if terms:
+            term_blocks = []
+            for i, term in enumerate(terms):
+                ors = []
+                for j, col in enumerate(TEXT_SEARCH_COLS):
+                    pn = f"t_{i}_{j}"
+                    ors.append(f"LOWER(`{col}`) LIKE :{pn}")
+                    params[pn] = f"%{term}%"
+                term_blocks.append("(" + " OR ".join(ors) + ")")
+
+            # ✅ Usar OR entre términos para búsquedas más flexibles
+            where.append("(" + " OR ".join(term_blocks) + ")")
 
         # Filtros específicos
         add_like("provincia", provincia, "provincia")
@@ -169,24 +223,71 @@ class BienesDB:
         logger.info(f"\n🔧 PARÁMETROS:")
         logger.info(f"{params}")
         
+        return sql, params
+
+    def _log_rows(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        logger.info(f"✓ Query ejecutado - {len(rows)} resultados encontrados")
+
+        if not rows:
+            logger.warning("⚠️ No se encontraron resultados")
+            return []
+
+        # Mostrar preview de resultados
+        logger.info(f"\n📊 PREVIEW DE RESULTADOS (primeros 3):")
+        for i, row in enumerate(rows[:3], 1):
+            logger.info(f"  {i}. {row.get('nombre')} - {row.get('provincia')}, {row.get('canton')} - ${row.get('precio_usd')}")
+
+        return rows
+
+    def _search_in_index(self, spec: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        """Resultado desde el índice (o el catálogo) en memoria, o None si hay que ir a SQL."""
+        if not spec["terms"] and self.catalog is not None and self.catalog.ready():
+            # Solo filtros: los índices por columna del catálogo evitan recorrer todas las filas
+            logger.info("⚡ Búsqueda resuelta con el catálogo en memoria")
+            filters = {k: v for k, v in spec.items() if k != "terms"}
+            return self.catalog.filter(**filters, cols=DEFAULT_SELECT_COLS)
+
+        if self.search_index is None or not self.search_index.ready():
+            return None
         try:
-            with self.engine.connect() as conn:
-                rows = conn.execute(text(sql), params).mappings().all()
-            
-            logger.info(f"✓ Query ejecutado - {len(rows)} resultados encontrados")
-            
-            if not rows:
-                logger.warning("⚠️ No se encontraron resultados")
-                return []
-            
-            # Mostrar preview de resultados
-            if rows:
-                logger.info(f"\n📊 PREVIEW DE RESULTADOS (primeros 3):")
-                for i, row in enumerate(rows[:3], 1):
-                    logger.info(f"  {i}. {row.get('nombre')} - {row.get('provincia')}, {row.get('canton')} - ${row.get('precio_usd')}")
-            
-            return [dict(r) for r in rows]
-            
+            rows = self.search_index.search(**spec)
+        except Exception as e:
+            logger.warning(f"⚠️ Falló la búsqueda en el índice ({e}); se usa SQL")
+            return None
+        logger.info("⚡ Búsqueda resuelta con el índice en memoria")
+        return [{c: row.get(c) for c in DEFAULT_SELECT_COLS} for row in rows]
+
+    def buscar(self, q: Optional[str] = None, **filtros: Any) -> List[Dict[str, Any]]:
+        """Busca propiedades (ver _parse_search para los filtros)."""
+        spec = self._parse_search(q, **filtros)
+        if spec is None:
+            return []
+
+        rows = self._search_in_index(spec)
+        if rows is not None:
+            return self._log_rows(rows)
+
+        search = self._build_search(**spec)
+        try:
+            return self._log_rows(fetch_all(self.engine, *search))
+        except Exception as e:
+            logger.error(f"❌ ERROR ejecutando query SQL: {e}", exc_info=True)
+            raise
+
+    async def abuscar(self, q: Optional[str] = None, **filtros: Any) -> List[Dict[str, Any]]:
+        """Versión async de buscar (la consulta corre en un hilo del pool de bienes)."""
+        spec = self._parse_search(q, **filtros)
+        if spec is None:
+            return []
+
+        # El índice responde en microsegundos: no vale la pena un hilo
+        rows = self._search_in_index(spec)
+        if rows is not None:
+            return self._log_rows(rows)
+
+        search = self._build_search(**spec)
+        try:
+            return self._log_rows(await afetch_all(self.engine, *search))
         except Exception as e:
             logger.error(f"❌ ERROR ejecutando query SQL: {e}", exc_info=True)
             raise
@@ -0,0 +1,311 @@
+"""
+BankStatsService - Resumen de propiedades por banco, provincia y tipo
+
+BanksQueryEngine calculaba min / max / promedio y conteos sobre las primeras
+50 filas de `buscar`: lento y equivocado para bancos con más propiedades.
+Aquí se mantiene un resumen materializado de toda la vista, agrupado por
+(banco, provincia, tipo):
+
+    total, con_precio, suma, mínimo y máximo de precio_usd (> 0)
+
+Son unos cientos de grupos; cualquier pregunta de bancos (un banco, un banco
+en una provincia, solo lotes, comparación entre bancos) se responde sumando
+grupos en memoria.
+
+Fuente del resumen:
+- con PropertyCatalog: se recalcula en cada refresco del catálogo (sin BD)
+- sin catálogo (o mientras carga): un GROUP BY cada `refresh_interval` segundos
+"""
+
+import logging
+import re
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.core.database import BIENES, fetch_all, get_engine
+from app.services.tools.Router.SQLQuery.bienesadjudicados.propertycatalog import PropertyCatalog
+from app.services.tools.Router.SQLQuery.bienesadjudicados.propertysearchindex import normalize
+from app.services.tools.Router.utils.formatters import safe_float
+
+logger = logging.getLogger(__name__)
+
+
+GroupKey = Tuple[str, str, str]
+
+SUMMARY_SQL = """
+    SELECT
+        nombre_banco AS banco,
+        provincia,
+        tipo_propiedad AS tipo,
+        COUNT(*) AS total,
+        COUNT(CASE WHEN precio_usd > 0 THEN 1 END) AS con_precio,
+        SUM(CASE WHEN precio_usd > 0 THEN precio_usd END) AS suma,
+        MIN(CASE WHEN precio_usd > 0 THEN precio_usd END) AS minimo,
+        MAX(CASE WHEN precio_usd > 0 THEN precio_usd END) AS maximo
+    FROM vw_get_all_properties
+    GROUP BY nombre_banco, provincia, tipo_propiedad
+"""
+
+SAMPLE_COLS = ["id", "nombre", "provincia", "canton", "distrito", "tipo_propiedad", "precio_usd", "agent_name", "nombre_banco"]
+
+# Palabras que no identifican a un banco por sí solas
+_BANK_NOISE = {
+    "banco", "de", "del", "la", "el", "y", "sa", "costa", "rica", "grupo", "financiero",
+    "vivienda", "ahorro", "prestamo", "credito", "cooperativa",
+}
+_WORD = re.compile(r"[a-z0-9]+")
+
+_UNKNOWN = "Desconocido"
+
+
+def _bank_aliases(name: str, places: Set[str] = frozenset()) -> Tuple[str, str, List[str]]:
+    """
+    (nombre normalizado, siglas, palabras distintivas) - 'Banco de Costa Rica' -> siglas 'bcr'.
+
+    Las palabras de `places` (provincias, cantones) no cuentan como distintivas: en
+    "casas en Alajuela" no se menciona a Grupo Mutual Alajuela.
+    """
+    words = _WORD.findall(normalize(name))
+    initials = "".join(w[0] for w in words if w not in ("de", "del", "la", "el", "y"))
+    distinctive = [w for w in words if w not in _BANK_NOISE and w not in places and len(w) >= 3]
+    return " ".join(words), initials, distinctive
+
+
+class BankStatsService:
+    """
+    Uso:
+        stats = BankStatsService(engine, catalog=catalog)
+        bancos, provincia, tipo = stats.match("casas del BCR en Heredia")
+        stats.summarize(bancos[0], provincia=provincia, tipo=tipo)
+    """
+
+    def __init__(self, engine=None, catalog: Optional[PropertyCatalog] = None, refresh_interval: float = 300):
+        """
+        Args:
+            engine: Engine de Bienes (por defecto, el del registro)
+            catalog: Catálogo en memoria; si existe, el resumen se recalcula con cada refresco
+            refresh_interval: Segundos de vigencia del resumen calculado con SQL
+        """
+        self.engine = engine or get_engine(BIENES)
+        self.catalog = catalog
+        self.refresh_interval = refresh_interval
+        self._groups: Dict[GroupKey, List[float]] = {}
+        self._aliases: Dict[str, Tuple[str, str, List[str]]] = {}
+        # Posición en la clave (1 = provincia, 2 = tipo) -> [(valor normalizado, valor)]
+        self._values: Dict[int, List[Tuple[str, str]]] = {1: [], 2: []}
+        self._source = "pendiente"
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.rebuilds = 0
+
+        if catalog is not None:
+            catalog.on_refresh(self._rebuild_from_snapshot)
+
+    # -------- Construcción --------
+    def _publish(self, groups: Dict[GroupKey, List[float]], source: str, cantones: Iterable[str] = ()):
+        self._values = {
+            position: [(normalize(v), v) for v in {key[position] for key in groups} if v != _UNKNOWN and normalize(v)]
+            for position in (1, 2)
+        }
+        places = {w for normalized, _ in self._values[1] for w in _WORD.findall(normalized)}
+        places.update(w for canton in cantones for w in _WORD.findall(normalize(canton)))
+        self._aliases = {banco: _bank_aliases(banco, places) for banco, _, _ in groups if banco != _UNKNOWN}
+        self._groups = groups
+        self._source = source
+        self._loaded_at = time.monotonic()
+        self.rebuilds += 1
+        logger.info(f"✓ Resumen de bancos ({source}): {len(self._aliases)} bancos, {len(groups)} grupos")
+
+    def _rebuild_from_snapshot(self, snapshot):
+        columns = snapshot.columns
+        groups: Dict[GroupKey, List[float]] = {}
+        for banco, provincia, tipo, precio in zip(
+            columns["nombre_banco"], columns["provincia"], columns["tipo_propiedad"], columns["precio_usd"]
+        ):
+            key = (banco or _UNKNOWN, provincia or _UNKNOWN, tipo or _UNKNOWN)
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = [0, 0, 0.0, None, None]
+            group[0] += 1
+            try:
+                precio = float(precio) if precio is not None else 0.0
+            except (TypeError, ValueError):
+                precio = 0.0
+            if precio > 0:
+                group[1] += 1
+                group[2] += precio
+                group[3] = precio if group[3] is None else min(group[3], precio)
+                group[4] = precio if group[4] is None else max(group[4], precio)
+        self._publish(groups, "catalogo", cantones={c for c in columns["canton"] if c})
+
+    def _rebuild_from_sql(self):
+        groups: Dict[GroupKey, List[float]] = {}
+        for row in fetch_all(self.engine, SUMMARY_SQL):
+            key = (row["banco"] or _UNKNOWN, row["provincia"] or _UNKNOWN, row["tipo"] or _UNKNOWN)
+            group = groups.setdefault(key, [0, 0, 0.0, None, None])
+            # Claves que solo difieren en NULL / '' caen en el mismo grupo
+            group[0] += int(row["total"])
+            group[1] += int(row["con_precio"] or 0)
+            group[2] += float(row["suma"] or 0)
+            for i, value, pick in ((3, row["minimo"], min), (4, row["maximo"], max)):
+                if value is not None:
+                    group[i] = float(value) if group[i] is None else pick(group[i], float(value))
+        self._publish(groups, "sql")
+
+    def _ensure_fresh(self):
+        if self.catalog is not None and self._source == "catalogo":
+            return
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_interval:
+            return
+        with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_interval:
+                return
+            try:
+                self._rebuild_from_sql()
+            except Exception as e:
+                if not self._groups:
+                    raise
+                # Mejor un resumen de hace unos minutos que ninguno
+                logger.warning(f"⚠️ No se pudo refrescar el resumen de bancos ({str(e)[:100]}); se usa el anterior")
+                self._loaded_at = time.monotonic()
+
+    # -------- Consultas --------
+    def banks(self) -> List[str]:
+        self._ensure_fresh()
+        return sorted(self._aliases)
+
+    def match(self, query: str) -> Tuple[List[str], Optional[str], Optional[str]]:
+        """Bancos, provincia y tipo mencionados en la consulta (según los valores reales de la vista)."""
+        self._ensure_fresh()
+        text = " ".join(_WORD.findall(normalize(query)))
+        words = set(text.split())
+
+        bancos = [
+            banco for banco, (full, initials, distinctive) in self._aliases.items()
+            if full in text or (len(initials) >= 3 and initials in words) or any(w in words for w in distinctive)
+        ]
+
+        def find(position: int) -> Optional[str]:
+            # El valor más largo que aparece en la consulta ("casa" también cubre "casas")
+            hits = [value for normalized, value in self._values[position] if normalized in text]
+            return max(hits, key=len) if hits else None
+
+        return sorted(bancos), find(1), find(2)
+
+    def summarize(
+        self,
+        banco: Optional[str] = None,
+        provincia: Optional[str] = None,
+        tipo: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Estadísticas sobre todas las propiedades que cumplen los filtros (None = todos)."""
+        self._ensure_fresh()
+        self.lookups += 1
+        total = con_precio = 0
+        suma = 0.0
+        minimo = maximo = None
+        tipos: Dict[str, int] = {}
+        provincias: Dict[str, int] = {}
+        for (g_banco, g_provincia, g_tipo), (g_total, g_precio, g_suma, g_min, g_max) in self._groups.items():
+            if (banco and g_banco != banco) or (provincia and g_provincia != provincia) or (tipo and g_tipo != tipo):
+                continue
+            total += g_total
+            con_precio += g_precio
+            suma += g_suma
+            if g_min is not None:
+                minimo = g_min if minimo is None else min(minimo, g_min)
+                maximo = g_max if maximo is None else max(maximo, g_max)
+            tipos[g_tipo] = tipos.get(g_tipo, 0) + g_total
+            provincias[g_provincia] = provincias.get(g_provincia, 0) + g_total
+        return {
+            "banco": banco,
+            "total": total,
+            "con_precio": con_precio,
+            "precio_min": minimo,
+            "precio_max": maximo,
+            "precio_promedio": suma / con_precio if con_precio else None,
+            "tipos": dict(sorted(tipos.items(), key=lambda x: x[1], reverse=True)),
+            "provincias": dict(sorted(provincias.items(), key=lambda x: x[1], reverse=True)),
+        }
+
+    def sample(
+        self,
+        banco: str,
+        provincia: Optional[str] = None,
+        tipo: Optional[str] = None,
+        limit: int = 5,
+    ) -> List[Dict[str, Any]]:
+        """Propiedades más baratas del banco (con los mismos filtros), para mostrar de ejemplo."""
+        if self.catalog is not None and self.catalog.ready():
+            rows = self.catalog.filter(banco=banco, provincia=provincia, tipo=tipo, limit=None, cols=SAMPLE_COLS)
+            # filter() compara por subcadena; aquí se quiere el banco exacto
+            rows = [r for r in rows if r["nombre_banco"] == banco]
+            # Primero las que tienen precio (precio 0 = "a consultar")
+            rows.sort(key=lambda r: not (safe_float(r["precio_usd"]) > 0))
+            return rows[:limit]
+
+        where = ["nombre_banco = :banco"]
+        params: Dict[str, Any] = {"banco": banco, "limit": limit}
+        if provincia:
+            where.append("provincia = :provincia")
+            params["provincia"] = provincia
+        if tipo:
+            where.append("tipo_propiedad = :tipo")
+            params["tipo"] = tipo
+        cols = ", ".join(f"`{c}`" for c in SAMPLE_COLS)
+        sql = (
+            f"SELECT {cols} FROM `vw_get_all_properties` WHERE {' AND '.join(where)} "
+            f"ORDER BY (precio_usd IS NULL OR precio_usd <= 0), precio_usd LIMIT :limit"
+        )
+        return fetch_all(self.engine, sql, params)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "bancos": len(self._aliases),
+            "grupos": len(self._groups),
+            "fuente": self._source,
+            "edad_s": round(time.monotonic() - self._loaded_at, 1) if self._loaded_at else None,
+            "recalculos": self.rebuilds,
+            "consultas": self.lookups,
+        }
+
+
+# ============================================================================
+# TESTS
+# ============================================================================
+
+if __name__ == "__main__":
+    from types import SimpleNamespace
+
+    filas = [
+        ("Banco Nacional de Costa Rica", "Alajuela", "Casa", 120_000),
+        ("Banco Nacional de Costa Rica", "Alajuela", "Lote", 40_000),
+        ("Banco Nacional de Costa Rica", "Heredia", "Casa", 0),
+        ("Banco de Costa Rica", "Heredia", "Casa", 95_000),
+        ("Banco de Costa Rica", "Heredia", "Casa", 155_000),
+        ("Grupo Mutual Alajuela - La Vivienda", "Alajuela", "Casa", 80_000),
+    ]
+    snapshot = SimpleNamespace(columns={
+        "nombre_banco": [f[0] for f in filas],
+        "provincia": [f[1] for f in filas],
+        "tipo_propiedad": [f[2] for f in filas],
+        "precio_usd": [f[3] for f in filas],
+        "canton": ["San Ramón", "Grecia", "Barva", "Barva", "Santo Domingo", "Grecia"],
+    })
+    stats = BankStatsService(engine=object())
+    stats._rebuild_from_snapshot(snapshot)
+
+    # La provincia no arrastra a Grupo Mutual Alajuela; las siglas y palabras distintivas sí cuentan
+    assert stats.match("casas del banco nacional en alajuela") == (["Banco Nacional de Costa Rica"], "Alajuela", "Casa")
+    assert stats.match("propiedades del BCR")[0] == ["Banco de Costa Rica"]
+    assert stats.match("remates de la mutual")[0] == ["Grupo Mutual Alajuela - La Vivienda"]
+    assert stats.match("casas en Heredia") == ([], "Heredia", "Casa")
+
+    resumen = stats.summarize("Banco de Costa Rica", provincia="Heredia", tipo="Casa")
+    assert resumen["total"] == 2 and resumen["precio_min"] == 95_000 and resumen["precio_promedio"] == 125_000
+    # Precio 0 = "a consultar": cuenta en el total pero no en los precios
+    resumen = stats.summarize("Banco Nacional de Costa Rica")
+    assert resumen["total"] == 3 and resumen["con_precio"] == 2 and resumen["provincias"] == {"Alajuela": 2, "Heredia": 1}
+    print(f"✓ {stats.stats()}")
@@ -3,6 +3,7 @@ BienesQueryEngine Mejorado - Sugiere al usuario cómo obtener más detalles
 """
 
 from __future__ import annotations
+import re
 from typing import Any, Dict, List, Optional
 from llama_index.core.base.response.schema import Response
 from llama_index.core.base.base_query_engine import BaseQueryEngine
@@ -12,20 +13,46 @@ try:
 except Exception:
     from llama_index.core.callbacks.base import CallbackManager
 
+from app.services.request_context import get_request_context
+
+# Una línea del listado de _format_rows: "3. **nombre** | ... | 🔑 ID:123 | [Ver en web](url)"
+_LISTING_LINE = re.compile(r"^\d+\. \*\*(.*?)\*\* \|.*\| 🔑 ID:(\S+) \| \[Ver en web\]\((.*?)\)$", re.MULTILINE)
+
 
 class BienesQueryEngine(BaseQueryEngine):
-    def __init__(self, bienes_db, callback_manager: Optional[CallbackManager] = None):
+    def __init__(self, bienes_db, context_manager=None, callback_manager: Optional[CallbackManager] = None):
         if callback_manager is None:
             callback_manager = CallbackManager([])
 
         super().__init__(callback_manager=callback_manager)
         self.bienes_db = bienes_db
+        # Guarda la lista mostrada para resolver "la #2" o "compara la 1 y 3" después
+        self.context_manager = context_manager
 
     def _query(self, query_bundle) -> Response:
-        user_query = str(query_bundle)
+        rows = self.bienes_db.buscar(q=str(query_bundle), limit=20)
+        self._remember(rows)
+        return self._format_rows(rows)
+
+    def _remember(self, rows):
+        session_id = get_request_context().session_id
+        if self.context_manager is None or not session_id or not isinstance(rows, list) or not rows:
+            return
+        # Mismas posiciones que la lista numerada de _format_rows
+        self.context_manager.update_search_results(session_id, rows[:10])
 
-        rows = self.bienes_db.buscar(q=user_query, limit=20)
+    def remember_listing(self, text: str):
+        """
+        Guarda las propiedades de un listado ya formateado (respuesta servida desde
+        el cache, donde la búsqueda no se ejecuta).
+        """
+        rows = [
+            {"id": int(property_id) if property_id.isdigit() else None, "nombre": nombre, "property_url": url if url != "None" else None}
+            for nombre, property_id, url in _LISTING_LINE.findall(text or "")
+        ]
+        self._remember(rows)
 
+    def _format_rows(self, rows) -> Response:
         if not isinstance(rows, list) or len(rows) == 0:
             return Response(response="No encontré resultados para tu búsqueda.")
 
@@ -62,7 +89,9 @@ class BienesQueryEngine(BaseQueryEngine):
         return Response(response="\n".join(lines))
 
     async def _aquery(self, query_bundle) -> Response:
-        return self._query(query_bundle)
+        rows = await self.bienes_db.abuscar(q=str(query_bundle), limit=20)
+        self._remember(rows)
+        return self._format_rows(rows)
 
     def _get_prompt_modules(self) -> Dict[str, Any]:
         return {}
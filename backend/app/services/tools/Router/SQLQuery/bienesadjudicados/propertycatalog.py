@@ -0,0 +1,556 @@
+"""
+PropertyCatalog - Copia en memoria de vw_get_all_properties
+
+El catálogo de Bienes es chico y casi solo de lectura, pero cada búsqueda,
+resumen de banco o detalle de propiedad era una consulta al MySQL del hosting
+compartido. Aquí se guarda una foto del catálogo por columnas (una lista por
+columna) con índices ya armados:
+- id -> fila, slug de la URL -> fila
+- provincia / cantón / tipo / banco / estado (normalizados) -> filas
+- precio (COALESCE(precio_usd, precio_local)) ordenado para rangos
+
+Un hilo en segundo plano la refresca cada `refresh_interval` segundos:
+- si la vista tiene `updated_at`, compara COUNT + MAX(updated_at) y solo trae
+  las filas modificadas (si el total no cuadra, hubo borrados: recarga todo)
+- si no, recarga todo y compara un checksum para no reconstruir en vano
+
+Cada refresco arma un snapshot nuevo y lo reemplaza de una vez; las lecturas
+en curso siguen con el anterior.
+"""
+
+import bisect
+import logging
+import threading
+import time
+import zlib
+from functools import lru_cache
+from itertools import islice
+from typing import AbstractSet, Any, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+from app.services.tools.Router.SQLQuery.bienesadjudicados.propertysearchindex import normalize
+
+logger = logging.getLogger(__name__)
+
+
+VIEW = "vw_get_all_properties"
+
+# Columnas que se guardan (las que usan BienesDB, PropertyDatabaseService y BanksQueryEngine)
+CATALOG_COLUMNS = [
+    "id",
+    "nombre",
+    "estado",
+    "provincia",
+    "canton",
+    "distrito",
+    "direccion",
+    "tipo_propiedad",
+    "tipo_bien",
+    "tipo_oferta",
+    "precio_usd",
+    "precio_local",
+    "bedrooms",
+    "bathrooms",
+    "area_construccion",
+    "tamanio_lote",
+    "imagen",
+    "property_url",
+    "agent_name",
+    "agent_phone_number",
+    "nombre_banco",
+    "descripcion",
+]
+
+# Columnas categóricas con índice valor normalizado -> filas
+INDEXED_COLUMNS = ("provincia", "canton", "tipo_propiedad", "nombre_banco", "estado")
+
+
+def url_slug(url: Optional[str]) -> Optional[str]:
+    """Último segmento del path de una URL de propiedad, normalizado."""
+    if not url:
+        return None
+    path = urlparse(str(url)).path.strip("/")
+    if not path:
+        return None
+    return unquote(path.split("/")[-1]).strip().lower() or None
+
+
+def _price(usd: Any, local: Any) -> Optional[float]:
+    value = usd if usd is not None else local
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class CatalogSnapshot:
+    """Una foto del catálogo (inmutable una vez construida)."""
+
+    def __init__(self, columns: Dict[str, list], version: int, fingerprint: Any = None, max_updated: Any = None):
+        self.columns = columns
+        self.size = len(columns["id"])
+        self.version = version
+        self.fingerprint = fingerprint
+        self.max_updated = max_updated
+        self.loaded_at = time.monotonic()
+
+        self.by_id: Dict[Any, int] = {}
+        self.by_slug: Dict[str, int] = {}
+        for pos, (prop_id, url) in enumerate(zip(columns["id"], columns["property_url"])):
+            self.by_id[prop_id] = pos
+            slug = url_slug(url)
+            if slug:
+                self.by_slug.setdefault(slug, pos)
+
+        self.prices = [_price(u, l) for u, l in zip(columns["precio_usd"], columns["precio_local"])]
+        # (precio, fila) ordenado; las filas sin precio quedan fuera de los rangos
+        self.by_price: List[Tuple[float, int]] = sorted(
+            (price, pos) for pos, price in enumerate(self.prices) if price is not None
+        )
+        self._price_keys = [price for price, _ in self.by_price]
+        # Orden de listado (precio ascendente, sin precio al final) y posición de cada fila en él:
+        # un rango de precios es el tramo order[inicio:fin]
+        self.order = [pos for _, pos in self.by_price] + [pos for pos, price in enumerate(self.prices) if price is None]
+        self.rank = [0] * self.size
+        for rank, pos in enumerate(self.order):
+            self.rank[pos] = rank
+
+        # Valor normalizado -> filas en orden de listado (y el mismo conjunto para intersecar)
+        self.by_value: Dict[str, Dict[str, List[int]]] = {}
+        self._value_sets: Dict[str, Dict[str, frozenset]] = {}
+        for col in INDEXED_COLUMNS:
+            values = columns[col]
+            index: Dict[str, List[int]] = {}
+            for pos in self.order:
+                index.setdefault(normalize(values[pos]), []).append(pos)
+            self.by_value[col] = index
+            self._value_sets[col] = {key: frozenset(rows) for key, rows in index.items()}
+        # Nombre normalizado (sin tildes, espacios simples) -> primera fila con ese nombre
+        self.normalized_names = [" ".join(normalize(n).split()) for n in columns["nombre"]]
+        self.by_name: Dict[str, int] = {}
+        for pos, name in enumerate(self.normalized_names):
+            if name:
+                self.by_name.setdefault(name, pos)
+        self._sorted_names = sorted(self.by_name)
+
+    # -------- Acceso --------
+    def row(self, pos: int, cols: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        return {c: self.columns[c][pos] for c in (cols or self.columns)}
+
+    def records(self, cols: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        cols = list(cols or self.columns)
+        return [dict(zip(cols, values)) for values in zip(*(self.columns[c] for c in cols))]
+
+    def positions(self, col: str, needle: Optional[str]) -> Optional[Tuple[List[int], AbstractSet[int]]]:
+        """
+        Filas cuyo `col` contiene `needle` (como LIKE '%needle%'), en orden de listado
+        y como conjunto; None = sin filtro.
+        """
+        if not needle:
+            return None
+        needle = normalize(needle)
+        index = self.by_value[col]
+        sets = self._value_sets[col]
+        if needle in index:
+            return index[needle], sets[needle]
+        # Pocos valores distintos: se recorren las claves, no las filas
+        keys = [key for key in index if needle in key]
+        if len(keys) == 1:
+            return index[keys[0]], sets[keys[0]]
+        rows = sorted((pos for key in keys for pos in index[key]), key=self.rank.__getitem__)
+        return rows, frozenset(rows)
+
+    def price_range(self, low: Optional[float], high: Optional[float]) -> Optional[Tuple[int, int]]:
+        """Tramo [inicio, fin) de `order` con precio entre low y high; None = sin filtro."""
+        if low is None and high is None:
+            return None
+        start = bisect.bisect_left(self._price_keys, low) if low is not None else 0
+        end = bisect.bisect_right(self._price_keys, high) if high is not None else len(self._price_keys)
+        return start, end
+
+
+class PropertyCatalog:
+    """
+    Uso:
+        catalog = get_property_catalog()
+        catalog.start()                       # carga + refresco en segundo plano
+        if catalog.ready():
+            catalog.get_by_id(123)
+            catalog.filter(provincia="heredia", precio_max=150000, limit=20)
+    """
+
+    def __init__(self, engine=None, refresh_interval: Optional[float] = 300):
+        """
+        Args:
+            engine: Engine de Bienes (por defecto, el del registro)
+            refresh_interval: Segundos entre refrescos (None = solo la carga inicial)
+        """
+        self._engine = engine
+        self.refresh_interval = refresh_interval
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._listeners: List[Callable[["CatalogSnapshot"], None]] = []
+        self.has_updated_at: Optional[bool] = None
+        self.refreshes = 0
+        self.incremental = 0
+        self.unchanged = 0
+        self.errors = 0
+        self.lookups = 0
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            from app.core.database import BIENES, get_engine
+
+            self._engine = get_engine(BIENES)
+        return self._engine
+
+    @property
+    def snapshot(self) -> Optional[CatalogSnapshot]:
+        return self._snapshot
+
+    def ready(self) -> bool:
+        return self._snapshot is not None
+
+    def on_refresh(self, listener: Callable[[CatalogSnapshot], None]):
+        """Se llama con el snapshot nuevo cada vez que cambia (y ya, si hay uno)."""
+        self._listeners.append(listener)
+        if self._snapshot is not None:
+            listener(self._snapshot)
+
+    # -------- Carga / refresco --------
+    def _fetch(self, sql: str, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        from app.core.database import fetch_all
+
+        return fetch_all(self.engine, sql, params)
+
+    def _select(self, where: str = "", params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        cols = ", ".join(f"`{c}`" for c in CATALOG_COLUMNS)
+        return self._fetch(f"SELECT {cols} FROM `{VIEW}` {where}", params)
+
+    @staticmethod
+    def _is_missing_column(error: Exception) -> bool:
+        """True si el error es 'columna desconocida' (MySQL 1054, o 'no such column' en SQLite)."""
+        orig = getattr(error, "orig", error)
+        if getattr(orig, "args", None) and orig.args[0] == 1054:
+            return True
+        message = str(error).lower()
+        return "unknown column" in message or "no such column" in message
+
+    def _read_fingerprint(self) -> Optional[Tuple[int, Any]]:
+        """(total, MAX(updated_at)), o None si la vista no tiene updated_at."""
+        if self.has_updated_at is False:
+            return None
+        try:
+            row = self._fetch(f"SELECT COUNT(*) AS total, MAX(`updated_at`) AS ultimo FROM `{VIEW}`")[0]
+        except Exception as e:
+            if not self._is_missing_column(e):
+                # Caída o timeout del MySQL: refresh() lo cuenta y se reintenta en el siguiente ciclo
+                raise
+            logger.info(f"ℹ️ {VIEW} sin updated_at ({str(e)[:80]}): el catálogo se refresca por checksum")
+            self.has_updated_at = False
+            return None
+        self.has_updated_at = True
+        return int(row["total"]), row["ultimo"]
+
+    @staticmethod
+    def _columns(rows: List[Dict[str, Any]]) -> Dict[str, list]:
+        return {c: [row.get(c) for row in rows] for c in CATALOG_COLUMNS}
+
+    @staticmethod
+    def _checksum(rows: List[Dict[str, Any]]) -> int:
+        crc = 0
+        for row in rows:
+            crc = zlib.crc32(repr(tuple(row.get(c) for c in CATALOG_COLUMNS)).encode("utf-8"), crc)
+        return crc
+
+    def _publish(self, snapshot: CatalogSnapshot):
+        self._snapshot = snapshot
+        for listener in self._listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                logger.warning(f"⚠️ Listener del catálogo falló: {e}")
+
+    def _full_load(self, fingerprint) -> bool:
+        rows = self._select()
+        checksum = self._checksum(rows)
+        current = self._snapshot
+        if current is not None and fingerprint is None and current.fingerprint == checksum:
+            self.unchanged += 1
+            current.loaded_at = time.monotonic()
+            return False
+        version = current.version + 1 if current else 1
+        max_updated = fingerprint[1] if fingerprint else None
+        self._publish(CatalogSnapshot(self._columns(rows), version, fingerprint or checksum, max_updated))
+        return True
+
+    def _incremental(self, current: CatalogSnapshot, fingerprint: Tuple[int, Any]) -> bool:
+        if current.max_updated is None:
+            return self._full_load(fingerprint)
+        # >= para no perder filas escritas en el mismo segundo que el último refresco
+        changed = self._select("WHERE `updated_at` >= :since", {"since": current.max_updated})
+
+        columns = {c: list(values) for c, values in current.columns.items()}
+        by_id = dict(current.by_id)
+        for row in changed:
+            pos = by_id.get(row.get("id"))
+            if pos is None:
+                by_id[row.get("id")] = len(columns["id"])
+                for c in CATALOG_COLUMNS:
+                    columns[c].append(row.get(c))
+            else:
+                for c in CATALOG_COLUMNS:
+                    columns[c][pos] = row.get(c)
+
+        if len(columns["id"]) != fingerprint[0]:
+            # Hubo borrados (o filas que dejaron de cumplir la vista): recarga completa
+            return self._full_load(fingerprint)
+
+        self.incremental += 1
+        self._publish(CatalogSnapshot(columns, current.version + 1, fingerprint, fingerprint[1]))
+        logger.info(f"🔄 Catálogo de propiedades: {len(changed)} filas actualizadas")
+        return True
+
+    def refresh(self) -> bool:
+        """Trae los cambios de la vista. Retorna True si el snapshot cambió."""
+        with self._lock:
+            inicio = time.perf_counter()
+            try:
+                fingerprint = self._read_fingerprint()
+                current = self._snapshot
+                if current is None or fingerprint is None:
+                    changed = self._full_load(fingerprint)
+                elif fingerprint == current.fingerprint:
+                    self.unchanged += 1
+                    current.loaded_at = time.monotonic()
+                    changed = False
+                else:
+                    changed = self._incremental(current, fingerprint)
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"⚠️ No se pudo refrescar el catálogo de propiedades: {str(e)[:150]}")
+                return False
+
+            self.refreshes += 1
+            if changed:
+                logger.info(
+                    f"✓ Catálogo de propiedades v{self._snapshot.version}: {self._snapshot.size} filas "
+                    f"en {(time.perf_counter() - inicio) * 1000:.0f} ms"
+                )
+            return changed
+
+    def _run(self):
+        self.refresh()
+        while self.refresh_interval is not None and not self._stop.wait(self.refresh_interval):
+            self.refresh()
+
+    def start(self):
+        """Carga inicial y refrescos en un hilo daemon (idempotente)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="property-catalog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    # -------- Consultas --------
+    def get_by_id(self, property_id: Any) -> Optional[Dict[str, Any]]:
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        self.lookups += 1
+        pos = snapshot.by_id.get(property_id)
+        if pos is None and isinstance(property_id, str) and property_id.isdigit():
+            pos = snapshot.by_id.get(int(property_id))
+        return snapshot.row(pos) if pos is not None else None
+
+    def get_by_url(self, url: str) -> Optional[Dict[str, Any]]:
+        snapshot = self._snapshot
+        slug = url_slug(url)
+        if snapshot is None or not slug:
+            return None
+        self.lookups += 1
+        pos = snapshot.by_slug.get(slug)
+        return snapshot.row(pos) if pos is not None else None
+
+    def find_by_name(self, name: str) -> Optional[Dict[str, Any]]:
+        """
+        Propiedad por nombre, en el mismo orden que PropertyDatabaseService:
+        nombre exacto -> nombre que empieza con `name` -> nombre que lo contiene.
+        """
+        snapshot = self._snapshot
+        needle = " ".join(normalize(name).split())
+        if snapshot is None or not needle:
+            return None
+        self.lookups += 1
+        pos = snapshot.by_name.get(needle)
+        if pos is None:
+            names = snapshot._sorted_names
+            i = bisect.bisect_left(names, needle)
+            if i < len(names) and names[i].startswith(needle):
+                pos = snapshot.by_name[names[i]]
+        if pos is None:
+            pos = next((p for p, nombre in enumerate(snapshot.normalized_names) if needle in nombre), None)
+        return snapshot.row(pos) if pos is not None else None
+
+    def filter(
+        self,
+        provincia: Optional[str] = None,
+        canton: Optional[str] = None,
+        tipo: Optional[str] = None,
+        estado: Optional[str] = None,
+        banco: Optional[str] = None,
+        precio_min: Optional[float] = None,
+        precio_max: Optional[float] = None,
+        limit: Optional[int] = 25,
+        cols: Optional[Iterable[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Filas que cumplen todos los filtros, por precio ascendente (sin precio al final)."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return []
+        self.lookups += 1
+
+        candidates = [
+            candidate
+            for candidate in (
+                snapshot.positions("provincia", provincia),
+                snapshot.positions("canton", canton),
+                snapshot.positions("tipo_propiedad", tipo),
+                snapshot.positions("estado", estado),
+                snapshot.positions("nombre_banco", banco),
+            )
+            if candidate is not None
+        ]
+        start, end = snapshot.price_range(precio_min, precio_max) or (0, snapshot.size)
+
+        # Todas las listas vienen en orden de listado: se recorre la más corta (o el tramo de
+        # precios) probando pertenencia en las demás, y se corta al llegar a `limit`
+        candidates.sort(key=lambda candidate: len(candidate[0]))
+        if not candidates or end - start <= len(candidates[0][0]):
+            base, others = snapshot.order[start:end], [members for _, members in candidates]
+        else:
+            shortest, others = candidates[0][0], [members for _, members in candidates[1:]]
+            # La lista está ordenada por rank: el rango de precios es un tramo contiguo
+            by_rank = snapshot.rank.__getitem__
+            base = shortest[bisect.bisect_left(shortest, start, key=by_rank):bisect.bisect_left(shortest, end, key=by_rank)]
+
+        matches = iter(base)
+        for members in others:
+            matches = filter(members.__contains__, matches)
+        return [snapshot.row(pos, cols) for pos in islice(matches, limit)]
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "filas": snapshot.size if snapshot else 0,
+            "version": snapshot.version if snapshot else 0,
+            "edad_s": round(time.monotonic() - snapshot.loaded_at, 1) if snapshot else None,
+            "modo": {True: "updated_at", False: "checksum"}.get(self.has_updated_at, "pendiente"),
+            "refrescos": self.refreshes,
+            "incrementales": self.incremental,
+            "sin_cambios": self.unchanged,
+            "errores": self.errors,
+            "consultas": self.lookups,
+        }
+
+
+@lru_cache(maxsize=1)
+def get_property_catalog() -> PropertyCatalog:
+    """Catálogo compartido del proceso (lo usan BienesDB y PropertyDatabaseService)."""
+    from app.core.config import get_settings
+
+    return PropertyCatalog(refresh_interval=get_settings().bienes_catalog_refresh)
+
+
+# ============================================================================
+# TESTS
+# ============================================================================
+
+if __name__ == "__main__":
+    import random
+
+    from sqlalchemy import create_engine, text
+
+    logging.basicConfig(level=logging.WARNING)
+    random.seed(11)
+
+    provincias = ["San José", "Alajuela", "Heredia", "Cartago", "Guanacaste", "Puntarenas", "Limón"]
+    tipos = ["Casa", "Lote", "Apartamento", "Finca"]
+    bancos = ["Banco Nacional", "BCR", "Banco Popular", "BAC"]
+
+    def fila(i: int, updated: str) -> Dict[str, Any]:
+        row = {c: None for c in CATALOG_COLUMNS}
+        row.update({
+            "id": i, "nombre": f"{random.choice(tipos)} #{i}", "estado": "Disponible",
+            "provincia": random.choice(provincias), "canton": f"Cantón {i % 40}",
+            "tipo_propiedad": random.choice(tipos), "precio_usd": random.randint(20_000, 900_000),
+            "property_url": f"https://bienesadjudicadoscr.com/propiedades/p-{i}/",
+            "nombre_banco": random.choice(bancos), "updated_at": updated,
+        })
+        return row
+
+    def crear(con_updated_at: bool):
+        engine = create_engine("sqlite://")
+        cols = CATALOG_COLUMNS + (["updated_at"] if con_updated_at else [])
+        with engine.begin() as conn:
+            conn.execute(text(f"CREATE TABLE {VIEW} ({', '.join(cols)})"))
+            filas = [{c: r[c] for c in cols} for r in (fila(i, "2026-01-01 00:00:00") for i in range(20_000))]
+            conn.execute(text(f"INSERT INTO {VIEW} VALUES ({', '.join(':' + c for c in cols)})"), filas)
+        return engine
+
+    for con_updated_at in (True, False):
+        engine = crear(con_updated_at)
+        catalog = PropertyCatalog(engine, refresh_interval=None)
+        inicio = time.perf_counter()
+        assert catalog.refresh()
+        print(f"Carga ({catalog.snapshot.size} filas): {(time.perf_counter() - inicio) * 1000:.0f} ms")
+        assert not catalog.refresh()                         # sin cambios: no se reconstruye
+
+        with engine.begin() as conn:
+            extra = ", updated_at = '2026-02-01 00:00:00'" if con_updated_at else ""
+            conn.execute(text(f"UPDATE {VIEW} SET precio_usd = 1{extra} WHERE id = 7"))
+        assert catalog.refresh() and catalog.get_by_id(7)["precio_usd"] == 1
+        assert catalog.get_by_url("https://bienesadjudicadoscr.com/propiedades/P-7")["id"] == 7
+
+        with engine.begin() as conn:
+            conn.execute(text(f"DELETE FROM {VIEW} WHERE id = 8"))
+        assert catalog.refresh() and catalog.get_by_id(8) is None and catalog.snapshot.size == 19_999
+
+        baratas = catalog.filter(provincia="limon", tipo="casa", precio_max=200_000, limit=10)
+        assert baratas and all(r["provincia"] == "Limón" and r["precio_usd"] <= 200_000 for r in baratas)
+        assert [r["precio_usd"] for r in baratas] == sorted(r["precio_usd"] for r in baratas)
+
+        inicio = time.perf_counter()
+        for _ in range(1000):
+            catalog.filter(provincia="heredia", banco="bcr", precio_min=100_000, limit=20)
+        print(f"filter(): {(time.perf_counter() - inicio) * 1000:.1f} µs por consulta")
+        print(f"✓ {catalog.stats()}")
+
+    # Por nombre: exacto -> prefijo -> subcadena (no la primera fila que lo contenga)
+    columnas = {c: [None] * 3 for c in CATALOG_COLUMNS}
+    columnas["id"] = [1, 2, 3]
+    columnas["nombre"] = ["Casa Azul en Heredia", "Casa  Azul", "Lote Verde Cartago"]
+    catalog = PropertyCatalog(engine=object(), refresh_interval=None)
+    catalog._publish(CatalogSnapshot(columnas, 1))
+    assert catalog.find_by_name("casa azul")["id"] == 2
+    assert catalog.find_by_name("Lote Verde")["id"] == 3
+    assert catalog.find_by_name("en heredia")["id"] == 1
+    assert catalog.find_by_name("casa roja") is None
+
+    # Un error pasajero de la BD no cambia el modo a checksum
+    catalog = PropertyCatalog(crear(True), refresh_interval=None)
+    fetch = catalog._fetch
+
+    def _caida(sql, params=None):
+        catalog._fetch = fetch
+        raise RuntimeError("(2013, 'Lost connection to MySQL server during query')")
+
+    catalog._fetch = _caida
+    assert not catalog.refresh() and catalog.errors == 1 and catalog.has_updated_at is None
+    assert catalog.refresh() and catalog.has_updated_at is True
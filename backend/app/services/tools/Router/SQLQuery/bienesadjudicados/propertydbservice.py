@@ -5,12 +5,40 @@ Proporciona datos estructurados para complementar información web
 
 import re
 import logging
-from typing import Optional, Dict, Any
-from sqlalchemy import create_engine, text
+from typing import Optional, Dict, Any, Iterable
+from sqlalchemy import text
 from urllib.parse import urlparse, unquote
 
+from app.core.cache import TTLCache
+from app.core.database import BIENES, get_engine
+from app.services.tools.Router.SQLQuery.bienesadjudicados.propertysearchindex import normalize
+
 logger = logging.getLogger(__name__)
 
+# Campos que retorna cada búsqueda
+_PROPERTY_FIELDS = [
+    'nombre', 'provincia', 'canton', 'distrito', 'precio_usd', 'precio_local',
+    'tipo_propiedad', 'bedrooms', 'bathrooms', 'area_construccion', 'tamanio_lote',
+    'nombre_banco', 'tipo_oferta', 'agent_name', 'agent_phone_number', 'property_url',
+]
+# Lo que se lee de la BD (y se guarda en el cache): todas las búsquedas comparten la fila
+_LOOKUP_FIELDS = _PROPERTY_FIELDS + ['id', 'descripcion']
+
+# Cache de propiedades resueltas (mismo período que el refresco del catálogo)
+PROPERTY_CACHE_SIZE = 2000
+PROPERTY_CACHE_TTL = 300
+
+
+def normalize_slug(slug: Optional[str]) -> Optional[str]:
+    """'Casa-Cartago-123/' -> 'casa-cartago-123'."""
+    slug = (slug or "").strip().strip('/').lower()
+    return slug or None
+
+
+def normalize_name(name: str) -> str:
+    """Clave de un nombre: minúsculas, sin tildes y con espacios simples."""
+    return " ".join(normalize(name).split())
+
 
 class PropertyDatabaseService:
     """
@@ -18,18 +46,68 @@ class PropertyDatabaseService:
     Usado para obtener datos que Tavily no puede extraer de la web.
     """
     
-    def __init__(self, connection_uri: str):
+    def __init__(self, connection_uri: Optional[str] = None, catalog=None):
         """
         Args:
-            connection_uri: URI de conexión a la BD de bienes
+            connection_uri: URI de conexión a la BD de bienes (por defecto, la de Settings).
+                Solo se usa si el pool compartido de "bienes" aún no existe.
+            catalog: PropertyCatalog en memoria; si está cargado se consulta antes que la BD
         """
-        self.engine = create_engine(
-            connection_uri,
-            pool_pre_ping=True,
-            pool_recycle=1800,
-        )
+        self.engine = get_engine(BIENES, connection_uri)
+        self.catalog = catalog
+        # Propiedades resueltas recientemente, por ("id", id), ("slug", slug) y ("name", nombre normalizado)
+        self._cache = TTLCache(maxsize=PROPERTY_CACHE_SIZE, default_ttl=PROPERTY_CACHE_TTL)
+        self.db_lookups = 0
         logger.info("✓ PropertyDatabaseService inicializado")
-    
+
+    def _from_catalog(self, lookup: str, value: Any) -> Optional[Dict[str, Any]]:
+        """Busca en el catálogo en memoria; None si no está cargado o no hay coincidencia (se va a la BD)."""
+        if self.catalog is None or not self.catalog.ready():
+            return None
+        try:
+            row = getattr(self.catalog, lookup)(value)
+        except Exception as e:
+            logger.warning(f"⚠️ Falló la consulta al catálogo en memoria ({e}); se usa la BD")
+            return None
+        if row is not None:
+            logger.info(f"⚡ Propiedad desde el catálogo en memoria: {row.get('nombre')}")
+        return row
+
+    def _fetch_one(self, attempts) -> Optional[Dict[str, Any]]:
+        """Prueba cada (WHERE, params) en orden y retorna la primera fila encontrada."""
+        columns = ", ".join(_LOOKUP_FIELDS)
+        with self.engine.connect() as conn:
+            for where, params in attempts:
+                self.db_lookups += 1
+                query = text(f"SELECT {columns} FROM vw_get_all_properties WHERE {where} LIMIT 1")
+                row = conn.execute(query, params).mappings().first()
+                if row is not None:
+                    return dict(row)
+        return None
+
+    def _remember(self, row: Dict[str, Any], *keys) -> Dict[str, Any]:
+        """Guarda la fila bajo su id, su slug y las claves con que se pidió."""
+        slug = normalize_slug(self._extract_slug_from_url(row.get('property_url') or ''))
+        for key in (("id", row.get('id')), ("slug", slug)) + keys:
+            if key[1] is not None:
+                self._cache.set(key, row)
+        return row
+
+    def _resolve(self, key, lookup: str, value: Any, attempts, fields) -> Optional[Dict[str, Any]]:
+        """LRU -> catálogo en memoria -> BD (claves exactas primero); retorna solo `fields`."""
+        row = self._cache.get(key)
+        if row is not None:
+            logger.info(f"⚡ Propiedad desde el cache: {row.get('nombre')}")
+        else:
+            row = self._from_catalog(lookup, value)
+            if row is None:
+                row = self._fetch_one(attempts)
+                if row is not None:
+                    logger.info(f"🗄️ Propiedad desde la BD: {row.get('nombre')}")
+            if row is not None:
+                self._remember(row, key)
+        return {field: row.get(field) for field in fields} if row is not None else None
+
     def get_property_by_url(self, property_url: str) -> Optional[Dict[str, Any]]:
         """
         Busca una propiedad por su URL completa.
@@ -42,72 +120,31 @@ class PropertyDatabaseService:
         """
         try:
             # Extraer slug de la URL
-            slug = self._extract_slug_from_url(property_url)
+            slug = normalize_slug(self._extract_slug_from_url(property_url))
             
             if not slug:
                 logger.warning(f"⚠️ No se pudo extraer slug de URL: {property_url}")
                 return None
             
             logger.info(f"🔍 Buscando propiedad por slug: {slug}")
-            
-            # Query para buscar por URL
-            query = text("""
-                SELECT 
-                    nombre,
-                    provincia,
-                    canton,
-                    distrito,
-                    precio_usd,
-                    precio_local,
-                    tipo_propiedad,
-                    bedrooms,
-                    bathrooms,
-                    area_construccion,
-                    tamanio_lote,
-                    nombre_banco,
-                    tipo_oferta,
-                    agent_name,
-                    agent_phone_number,
-                    property_url
-                FROM vw_get_all_properties
-                WHERE property_url LIKE :url_pattern
-                LIMIT 1
-            """)
-            
-            with self.engine.connect() as conn:
-                result = conn.execute(
-                    query,
-                    {"url_pattern": f"%{slug}%"}
-                )
-                row = result.fetchone()
-                
-                if row:
-                    # Convertir a diccionario
-                    property_data = {
-                        'nombre': row[0],
-                        'provincia': row[1],
-                        'canton': row[2],
-                        'distrito': row[3],
-                        'precio_usd': row[4],
-                        'precio_local': row[5],
-                        'tipo_propiedad': row[6],
-                        'bedrooms': row[7],
-                        'bathrooms': row[8],
-                        'area_construccion': row[9],
-                        'tamanio_lote': row[10],
-                        'nombre_banco': row[11],
-                        'tipo_oferta': row[12],
-                        'agent_name': row[13],
-                        'agent_phone_number': row[14],
-                        'property_url': row[15],
-                    
-                    }
-                    
-                    logger.info(f"✓ Propiedad encontrada en BD: {property_data['nombre']}")
-                    return property_data
-                else:
-                    logger.warning(f"⚠️ Propiedad no encontrada en BD para slug: {slug}")
-                    return None
+
+            # La URL suele venir de nuestros propios listados: igualdad exacta (usa índice);
+            # el LIKE '%slug%' queda solo para URLs con otro host o formato
+            base = property_url.strip().split('?')[0].split('#')[0].rstrip('/')
+            variants = {base, base + '/'}
+            variants |= {v.replace('http://', 'https://', 1) for v in variants}
+            exact = {f"url_{i}": v for i, v in enumerate(sorted(variants))}
+            attempts = [
+                (f"property_url IN ({', '.join(':' + k for k in exact)})", exact),
+                ("property_url LIKE :url_pattern", {"url_pattern": f"%{slug}%"}),
+            ]
+
+            property_data = self._resolve(("slug", slug), "get_by_url", property_url, attempts, _PROPERTY_FIELDS)
+            if property_data:
+                logger.info(f"✓ Propiedad encontrada: {property_data['nombre']}")
+            else:
+                logger.warning(f"⚠️ Propiedad no encontrada en BD para slug: {slug}")
+            return property_data
                     
         except Exception as e:
             logger.error(f"❌ Error consultando BD: {e}", exc_info=True)
@@ -125,64 +162,23 @@ class PropertyDatabaseService:
         """
         try:
             logger.info(f"🔍 Buscando propiedad por nombre: {property_name}")
-            
-            query = text("""
-                SELECT 
-                    nombre,
-                    provincia,
-                    canton,
-                    distrito,
-                    precio_usd,
-                    precio_local,
-                    tipo_propiedad,
-                    bedrooms,
-                    bathrooms,
-                    area_construccion,
-                    tamanio_lote,
-                    nombre_banco,
-                    tipo_oferta,
-                    agent_name,
-                    agent_phone_number,
-                    property_url,
-                    descripcion
-                FROM vw_get_all_properties
-                WHERE nombre LIKE :name_pattern
-                LIMIT 1
-            """)
-            
-            with self.engine.connect() as conn:
-                result = conn.execute(
-                    query,
-                    {"name_pattern": f"%{property_name}%"}
-                )
-                row = result.fetchone()
-                
-                if row:
-                    property_data = {
-                        'nombre': row[0],
-                        'provincia': row[1],
-                        'canton': row[2],
-                        'distrito': row[3],
-                        'precio_usd': row[4],
-                        'precio_local': row[5],
-                        'tipo_propiedad': row[6],
-                        'bedrooms': row[7],
-                        'bathrooms': row[8],
-                        'area_construccion': row[9],
-                        'tamanio_lote': row[10],
-                        'nombre_banco': row[11],
-                        'tipo_oferta': row[12],
-                        'agent_name': row[13],
-                        'agent_phone_number': row[14],
-                        'property_url': row[15],
-                        'descripcion': row[16],
-                    }
-                    
-                    logger.info(f"✓ Propiedad encontrada: {property_data['nombre']}")
-                    return property_data
-                else:
-                    logger.warning(f"⚠️ Propiedad no encontrada: {property_name}")
-                    return None
+
+            name = " ".join(property_name.split())
+            # Nombre exacto y prefijo pueden usar índice; el comodín inicial es el último recurso
+            attempts = [
+                ("nombre = :name", {"name": name}),
+                ("nombre LIKE :name_prefix", {"name_prefix": f"{name}%"}),
+                ("nombre LIKE :name_pattern", {"name_pattern": f"%{name}%"}),
+            ]
+
+            property_data = self._resolve(
+                ("name", normalize_name(name)), "find_by_name", name, attempts, _PROPERTY_FIELDS + ['descripcion']
+            )
+            if property_data:
+                logger.info(f"✓ Propiedad encontrada: {property_data['nombre']}")
+            else:
+                logger.warning(f"⚠️ Propiedad no encontrada: {property_name}")
+            return property_data
                     
         except Exception as e:
             logger.error(f"❌ Error consultando BD: {e}", exc_info=True)
@@ -201,68 +197,69 @@ class PropertyDatabaseService:
         try:
             logger.info(f"🔍 Buscando propiedad por ID: {property_id}")
 
-            query = text("""
-                SELECT
-                    nombre,
-                    provincia,
-                    canton,
-                    distrito,
-                    precio_usd,
-                    precio_local,
-                    tipo_propiedad,
-                    bedrooms,
-                    bathrooms,
-                    area_construccion,
-                    tamanio_lote,
-                    nombre_banco,
-                    tipo_oferta,
-                    agent_name,
-                    agent_phone_number,
-                    property_url,
-                    id
-                FROM vw_get_all_properties
-                WHERE id = :property_id
-                LIMIT 1
-            """)
-
-            with self.engine.connect() as conn:
-                result = conn.execute(
-                    query,
-                    {"property_id": property_id}
-                )
-                row = result.fetchone()
-
-                if row:
-                    property_data = {
-                        'nombre': row[0],
-                        'provincia': row[1],
-                        'canton': row[2],
-                        'distrito': row[3],
-                        'precio_usd': row[4],
-                        'precio_local': row[5],
-                        'tipo_propiedad': row[6],
-                        'bedrooms': row[7],
-                        'bathrooms': row[8],
-                        'area_construccion': row[9],
-                        'tamanio_lote': row[10],
-                        'nombre_banco': row[11],
-                        'tipo_oferta': row[12],
-                        'agent_name': row[13],
-                        'agent_phone_number': row[14],
-                        'property_url': row[15],
-                        'id': row[16],
-                    }
-
-                    logger.info(f"✓ Propiedad encontrada en BD: {property_data['nombre']} (ID: {property_id})")
-                    return property_data
-                else:
-                    logger.warning(f"⚠️ Propiedad no encontrada en BD para ID: {property_id}")
-                    return None
+            if isinstance(property_id, str) and property_id.strip().isdigit():
+                property_id = int(property_id)
+            attempts = [("id = :property_id", {"property_id": property_id})]
+
+            property_data = self._resolve(("id", property_id), "get_by_id", property_id, attempts, _PROPERTY_FIELDS + ['id'])
+            if property_data:
+                logger.info(f"✓ Propiedad encontrada: {property_data['nombre']} (ID: {property_id})")
+            else:
+                logger.warning(f"⚠️ Propiedad no encontrada en BD para ID: {property_id}")
+            return property_data
 
         except Exception as e:
             logger.error(f"❌ Error consultando BD: {e}", exc_info=True)
             return None
 
+    def get_properties_by_ids(self, property_ids: Iterable[Any]) -> Dict[Any, Dict[str, Any]]:
+        """
+        Busca varias propiedades por ID con una sola consulta (cache y catálogo primero).
+
+        Args:
+            property_ids: IDs en el orden en que se quieren (se ignoran repetidos)
+
+        Returns:
+            {id: datos} en el orden pedido; los IDs que no existen no aparecen
+        """
+        ids = []
+        for property_id in property_ids:
+            if isinstance(property_id, str) and property_id.strip().isdigit():
+                property_id = int(property_id)
+            if property_id is not None and property_id not in ids:
+                ids.append(property_id)
+
+        fields = _PROPERTY_FIELDS + ['id']
+        found: Dict[Any, Dict[str, Any]] = {}
+        missing = []
+        for property_id in ids:
+            row = self._cache.get(("id", property_id)) or self._from_catalog("get_by_id", property_id)
+            if row is not None:
+                found[property_id] = self._remember(row)
+            else:
+                missing.append(property_id)
+
+        if missing:
+            logger.info(f"🔍 Buscando {len(missing)} propiedades por ID en una consulta: {missing}")
+            params = {f"id_{i}": property_id for i, property_id in enumerate(missing)}
+            query = text(
+                f"SELECT {', '.join(_LOOKUP_FIELDS)} FROM vw_get_all_properties "
+                f"WHERE id IN ({', '.join(':' + k for k in params)})"
+            )
+            try:
+                self.db_lookups += 1
+                with self.engine.connect() as conn:
+                    rows = conn.execute(query, params).mappings().all()
+                by_id = {row['id']: self._remember(dict(row)) for row in rows}
+                found.update((i, by_id[i]) for i in missing if i in by_id)
+            except Exception as e:
+                logger.error(f"❌ Error consultando BD: {e}", exc_info=True)
+
+        return {i: {field: found[i].get(field) for field in fields} for i in ids if i in found}
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return {**self._cache.stats(), "consultas_bd": self.db_lookups}
+
     def _extract_slug_from_url(self, url: str) -> Optional[str]:
         """
         Extrae el slug de una URL de propiedad.
@@ -378,7 +375,7 @@ def get_property_db_service(connection_uri: str = None) -> PropertyDatabaseServi
     Obtiene instancia global del servicio de BD.
     
     Args:
-        connection_uri: URI de conexión (solo necesario la primera vez)
+        connection_uri: URI de conexión (opcional; por defecto la de Settings)
         
     Returns:
         PropertyDatabaseService instance
@@ -386,8 +383,6 @@ def get_property_db_service(connection_uri: str = None) -> PropertyDatabaseServi
     global _property_db_service
     
     if _property_db_service is None:
-        if connection_uri is None:
-            raise ValueError("connection_uri requerido en primera llamada")
         _property_db_service = PropertyDatabaseService(connection_uri)
     
     return _property_db_service
@@ -444,6 +439,20 @@ if __name__ == "__main__":
     #     print("No se encontró la propiedad")
     
     # Test de extracción de slug
-    service = PropertyDatabaseService("dummy://")
+    service = PropertyDatabaseService("sqlite://")
     slug = service._extract_slug_from_url(test_url)
-    print(f"\nSlug extraído: {slug}")
\ No newline at end of file
+    print(f"\nSlug extraído: {slug}")
+    # Búsqueda exacta + cache: la segunda pregunta por la misma propiedad no va a la BD
+    with service.engine.begin() as conn:
+        conn.execute(text(f"CREATE TABLE vw_get_all_properties ({', '.join(_LOOKUP_FIELDS)})"))
+        conn.execute(
+            text(f"INSERT INTO vw_get_all_properties VALUES ({', '.join(':' + c for c in _LOOKUP_FIELDS)})"),
+            {**{c: None for c in _LOOKUP_FIELDS}, "id": 7, "nombre": "Casa en El Carmen", "property_url": test_url + "/"},
+        )
+    assert service.get_property_by_url(test_url)["nombre"] == "Casa en El Carmen"
+    consultas = service.db_lookups
+    assert service.get_property_by_url(test_url.upper().replace("HTTPS://", "https://"))["property_url"] == test_url + "/"
+    assert service.get_property_by_id("7")["id"] == 7
+    assert list(service.get_properties_by_ids([7, "7", 999])) == [7]
+    assert service.db_lookups == consultas + 1                 # 7 del cache, 999 en un solo IN
+    print(f"✓ {service.cache_stats()}")
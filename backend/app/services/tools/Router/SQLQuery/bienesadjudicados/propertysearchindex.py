@@ -0,0 +1,333 @@
+"""
+PropertySearchIndex - Índice invertido en memoria sobre vw_get_all_properties
+
+La búsqueda SQL de BienesDB arma un `LOWER(col) LIKE '%termino%'` por cada
+término y cada columna de TEXT_SEARCH_COLS (5 términos = 45 scans que no
+pueden usar índices) y ordena por un precio calculado. Sobre una vista de
+un hosting compartido tampoco se puede crear un índice FULLTEXT.
+
+Aquí el catálogo se lee una vez (y se refresca en segundo plano) y se arma:
+- postings: token normalizado -> {fila: peso del campo}
+- vocabulario ordenado para coincidencias por prefijo ("hered" -> heredia)
+- columnas de filtro ya normalizadas y el precio numérico por fila
+
+El ranking es por relevancia (idf × peso del campo, sumado por término) y
+luego por precio ascendente. Mientras el índice no está listo, BienesDB usa
+la consulta SQL de siempre.
+"""
+
+import bisect
+import heapq
+import logging
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+# Peso de cada columna en el ranking (las que no aparecen valen 1.0)
+FIELD_WEIGHTS = {
+    "nombre": 3.0,
+    "canton": 2.0,
+    "distrito": 2.0,
+    "provincia": 1.5,
+    "tipo_propiedad": 1.5,
+    "nombre_banco": 1.5,
+}
+
+# Mínimo de caracteres para expandir un término por prefijo
+MIN_PREFIX = 3
+
+# Segundos de espera antes de reintentar una carga fallida
+RETRY_AFTER = 60
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text: Any) -> str:
+    """minúsculas y sin tildes (como la collation *_ci de MySQL)."""
+    if text is None:
+        return ""
+    text = str(text).lower()
+    if text.isascii():
+        return text
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+@lru_cache(maxsize=65536)
+def _tokenize_str(text: str) -> Tuple[str, ...]:
+    return tuple(_TOKEN_RE.findall(normalize(text)))
+
+
+def tokenize(text: Any) -> Tuple[str, ...]:
+    # Provincias, cantones, tipos y bancos se repiten en miles de filas: se tokenizan una vez
+    return _tokenize_str(str(text)) if text is not None else ()
+
+
+class _IndexState:
+    """Estructuras de una carga del catálogo (inmutables una vez construidas)."""
+
+    def __init__(self, rows: List[Dict[str, Any]], text_cols: Sequence[str]):
+        self.rows = rows
+        self.loaded_at = time.monotonic()
+        self.postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+
+        for pos, row in enumerate(rows):
+            for col in text_cols:
+                weight = FIELD_WEIGHTS.get(col, 1.0)
+                for token in tokenize(row.get(col)):
+                    posting = self.postings[token]
+                    if posting.get(pos, 0.0) < weight:
+                        posting[pos] = weight
+
+        self.postings = dict(self.postings)
+        self.vocabulary = sorted(self.postings)
+        self.filters = {
+            col: [normalize(row.get(col)) for row in rows]
+            for col in ("provincia", "canton", "tipo_propiedad", "estado")
+        }
+        self.prices = [self._price(row) for row in rows]
+
+    @staticmethod
+    def _price(row: Dict[str, Any]) -> Optional[float]:
+        # Igual que COALESCE(precio_usd, precio_local)
+        for col in ("precio_usd", "precio_local"):
+            value = row.get(col)
+            if value is not None:
+                try:
+                    return float(value)
+                except (TypeError, ValueError):
+                    return None
+        return None
+
+    def expand(self, token: str) -> List[str]:
+        """Tokens del vocabulario que coinciden exacto o por prefijo."""
+        if len(token) < MIN_PREFIX:
+            return [token] if token in self.postings else []
+        start = bisect.bisect_left(self.vocabulary, token)
+        matches = []
+        for word in self.vocabulary[start:]:
+            if not word.startswith(token):
+                break
+            matches.append(word)
+        return matches
+
+
+class PropertySearchIndex:
+    """
+    Uso:
+        index = PropertySearchIndex(loader=lambda: fetch_all(engine, sql))
+        if index.ready():
+            rows = index.search(["escazu", "apartamento"], provincia="san jose", limit=20)
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[], List[Dict[str, Any]]],
+        text_cols: Sequence[str],
+        refresh_interval: Optional[float] = 600,
+    ):
+        """
+        Args:
+            loader: Devuelve todas las filas del catálogo (columnas de texto, filtros y precios)
+            text_cols: Columnas que entran al índice de texto
+            refresh_interval: Segundos entre recargas en segundo plano (None = no recargar)
+        """
+        self.loader = loader
+        self.text_cols = list(text_cols)
+        self.refresh_interval = refresh_interval
+        self._state: Optional[_IndexState] = None
+        self._loading = threading.Lock()
+        self._retry_at = 0.0
+        self.searches = 0
+        self.loads = 0
+        self.load_errors = 0
+
+    # -------- Carga --------
+    def load(self):
+        """Lee el catálogo y reemplaza el índice (las búsquedas en curso usan el anterior)."""
+        if not self._loading.acquire(blocking=False):
+            return
+        try:
+            inicio = time.perf_counter()
+            rows = self.loader()
+            self._state = _IndexState(rows, self.text_cols)
+            self.loads += 1
+            logger.info(
+                f"✓ Índice de búsqueda de propiedades: {len(rows)} filas, "
+                f"{len(self._state.vocabulary)} tokens en {(time.perf_counter() - inicio) * 1000:.0f} ms"
+            )
+        except Exception as e:
+            self.load_errors += 1
+            self._retry_at = time.monotonic() + RETRY_AFTER
+            logger.warning(f"⚠️ No se pudo cargar el índice de propiedades ({str(e)[:100]}); se usa SQL")
+        finally:
+            self._loading.release()
+
+    def _load_in_background(self):
+        if self._loading.locked() or time.monotonic() < self._retry_at:
+            return
+        threading.Thread(target=self.load, name="property-search-index", daemon=True).start()
+
+    def ready(self) -> bool:
+        """True si hay índice cargado. Dispara la carga / recarga en segundo plano cuando toca."""
+        state = self._state
+        if state is None:
+            self._load_in_background()
+            return False
+        if self.refresh_interval is not None and time.monotonic() - state.loaded_at > self.refresh_interval:
+            self._load_in_background()
+        return True
+
+    # -------- Búsqueda --------
+    def search(
+        self,
+        terms: Sequence[str],
+        provincia: Optional[str] = None,
+        canton: Optional[str] = None,
+        tipo: Optional[str] = None,
+        estado: Optional[str] = None,
+        precio_min: Optional[float] = None,
+        precio_max: Optional[float] = None,
+        limit: int = 25,
+    ) -> List[Dict[str, Any]]:
+        """Mismos filtros que BienesDB.buscar; términos en OR, ordenado por relevancia y precio."""
+        state = self._state
+        if state is None:
+            raise RuntimeError("El índice de propiedades no está cargado")
+        self.searches += 1
+
+        # Puntaje por fila: suma de idf × peso del campo de cada término que coincide
+        scores: Optional[Dict[int, float]] = None
+        if terms:
+            scores = {}
+            total = len(state.rows) or 1
+            for term in terms:
+                for query_token in tokenize(term):
+                    for token in state.expand(query_token):
+                        posting = state.postings[token]
+                        idf = math.log(1 + total / len(posting))
+                        for pos, weight in posting.items():
+                            scores[pos] = scores.get(pos, 0.0) + idf * weight
+        candidates = scores.keys() if scores is not None else range(len(state.rows))
+
+        checks = [
+            (state.filters[col], normalize(value))
+            for col, value in (("provincia", provincia), ("canton", canton), ("tipo_propiedad", tipo), ("estado", estado))
+            if value
+        ]
+        prices = state.prices
+        hits = []
+        for pos in candidates:
+            if any(needle not in column[pos] for column, needle in checks):
+                continue
+            price = prices[pos]
+            if precio_min is not None and (price is None or price < precio_min):
+                continue
+            if precio_max is not None and (price is None or price > precio_max):
+                continue
+            hits.append(pos)
+
+        def rank(pos: int):
+            price = prices[pos]
+            return (-(scores[pos] if scores is not None else 0.0), price is None, price or 0.0)
+
+        top = heapq.nsmallest(limit, hits, key=rank)
+        return [dict(state.rows[pos]) for pos in top]
+
+    def stats(self) -> Dict[str, Any]:
+        state = self._state
+        return {
+            "filas": len(state.rows) if state else 0,
+            "tokens": len(state.vocabulary) if state else 0,
+            "edad_s": round(time.monotonic() - state.loaded_at, 1) if state else None,
+            "busquedas": self.searches,
+            "cargas": self.loads,
+            "errores_carga": self.load_errors,
+        }
+
+
+# ============================================================================
+# TESTS
+# ============================================================================
+
+if __name__ == "__main__":
+    import os
+    import random
+    import statistics
+    import tempfile
+
+    from sqlalchemy import create_engine, text
+
+    from app.services.tools.Router.SQLQuery.bienesadjudicados.BienesAdjudicadosTool import (
+        DEFAULT_SELECT_COLS, TEXT_SEARCH_COLS, BienesDB,
+    )
+
+    logging.basicConfig(level=logging.WARNING)
+    random.seed(7)
+
+    # Catálogo sintético de 100k propiedades en SQLite (misma vista / columnas)
+    N = 100_000
+    provincias = ["San José", "Alajuela", "Heredia", "Cartago", "Guanacaste", "Puntarenas", "Limón"]
+    cantones = ["Escazú", "Santa Ana", "Belén", "Liberia", "Nicoya", "Grecia", "Paraíso", "Pococí", "Osa", "Tibás"]
+    tipos = ["Casa", "Lote", "Apartamento", "Local comercial", "Finca", "Bodega"]
+    bancos = ["Banco Nacional", "BCR", "Banco Popular", "BAC", "Davivienda", "Scotiabank"]
+
+    path = os.path.join(tempfile.mkdtemp(), "bienes.db")
+    engine = create_engine(f"sqlite:///{path}")
+    cols = DEFAULT_SELECT_COLS + [c for c in TEXT_SEARCH_COLS if c not in DEFAULT_SELECT_COLS]
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE TABLE vw_get_all_properties ({', '.join(cols)})"))
+        filas = []
+        for i in range(N):
+            tipo, canton = random.choice(tipos), random.choice(cantones)
+            filas.append({
+                "id": i, "nombre": f"{tipo} en {canton} #{i}", "estado": "Disponible",
+                "provincia": random.choice(provincias), "canton": canton, "distrito": f"Distrito {i % 300}",
+                "tipo_propiedad": tipo, "tipo_oferta": "Venta", "precio_usd": random.randint(20_000, 900_000),
+                "precio_local": None, "bedrooms": random.randint(0, 5), "bathrooms": random.randint(0, 4),
+                "area_construccion": random.randint(40, 400), "tamanio_lote": random.randint(100, 5000),
+                "imagen": None, "property_url": f"https://bienesadjudicadoscr.com/propiedades/p-{i}",
+                "agent_name": f"Agente {i % 80}", "nombre_banco": random.choice(bancos),
+                "direccion": f"{random.randint(100, 900)} metros norte de la iglesia de {canton}", "tipo_bien": tipo,
+            })
+        conn.execute(text(f"INSERT INTO vw_get_all_properties VALUES ({', '.join(':' + c for c in cols)})"), filas)
+
+    consultas = [
+        "apartamento en escazu",
+        "lote en liberia banco nacional",
+        "casa grecia hasta 150 mil",
+        "finca nicoya guanacaste",
+        "bodega tibas agente 12",
+    ]
+
+    def medir(db: BienesDB, repeticiones: int = 5) -> float:
+        tiempos = []
+        for _ in range(repeticiones):
+            for consulta in consultas:
+                inicio = time.perf_counter()
+                db.buscar(q=consulta, limit=20)
+                tiempos.append(time.perf_counter() - inicio)
+        return statistics.median(tiempos) * 1000
+
+    sql_db = BienesDB(engine)
+    print(f"SQL (LIKE × {len(TEXT_SEARCH_COLS)} columnas): {medir(sql_db, 2):.1f} ms por búsqueda (mediana)")
+
+    index_db = BienesDB(engine)
+    index = index_db.enable_search_index(refresh_interval=None)
+    inicio = time.perf_counter()
+    index.load()
+    print(f"Carga del índice ({N} filas): {(time.perf_counter() - inicio) * 1000:.0f} ms")
+    print(f"Índice invertido: {medir(index_db):.2f} ms por búsqueda (mediana)")
+
+    resultado = index_db.buscar(q="apartamento en escazu", limit=5)
+    assert resultado and all(r["canton"] == "Escazú" and r["tipo_propiedad"] == "Apartamento" for r in resultado)
+    assert set(resultado[0]) == set(DEFAULT_SELECT_COLS)
+    print(f"✓ {index.stats()}")
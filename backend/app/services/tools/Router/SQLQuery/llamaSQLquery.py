@@ -1,23 +1,16 @@
 from __future__ import annotations
 
-from sqlalchemy import create_engine
 from llama_index.core import SQLDatabase
 
+from app.core.database import EASYCORE, get_engine
+
 
 class LlamaSQLQuery:
-    """Builder mínimo: URI -> SQLAlchemy engine -> SQLDatabase (LlamaIndex)."""
+    """Builder mínimo: URI -> engine compartido del registro -> SQLDatabase (LlamaIndex)."""
 
-    def __init__(self, connection_uri: str):
+    def __init__(self, connection_uri: str | None = None, database: str = EASYCORE):
         self.connection_uri = connection_uri
-        self.sqlalchemy_engine = create_engine( self.connection_uri,
-        pool_pre_ping=True,          # evita conexiones muertas
-        pool_recycle=1800,           # recicla cada 30 min
-        pool_timeout=120,            # timeout de conexión 120s
-        connect_args={
-        "connect_timeout": 120,
-        "read_timeout": 120,
-        "write_timeout": 120,
-    },)
+        self.sqlalchemy_engine = get_engine(database, connection_uri)
         self.sql_database = SQLDatabase(self.sqlalchemy_engine)
 
     def get_sql_database(self) -> SQLDatabase:
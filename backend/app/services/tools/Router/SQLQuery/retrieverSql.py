@@ -6,8 +6,12 @@ import logging
 
 from llama_index.core.indices.struct_store import SQLTableRetrieverQueryEngine
 from llama_index.core.objects import SQLTableNodeMapping, ObjectIndex, SQLTableSchema
-from llama_index.core import VectorStoreIndex
+from llama_index.core import Settings, VectorStoreIndex
 from llama_index.core.prompts import PromptTemplate
+from llama_index.core.schema import MetadataMode
+from llama_index.core.vector_stores import FilterOperator, MetadataFilter, MetadataFilters
+
+from app.services.embedding_store import PersistedEmbeddings
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +20,75 @@ class TableRetrieverConfig:
     similarity_top_k: int = 6
 
 
+class TableSchemaIndex:
+    """Índice maestro de esquemas: un solo VectorStoreIndex sobre el catálogo completo.
+
+    Los catálogos por rol no crean índices propios; piden un retriever filtrado
+    por metadata (`name IN tablas_del_rol`), así que memoria y embeddings no
+    crecen con el número de combinaciones de roles.
+    """
+
+    def __init__(self, sql_database, table_catalog: dict, embeddings: Optional[PersistedEmbeddings] = None):
+        self.sql_database = sql_database
+        self.table_catalog = table_catalog
+        self.embeddings = embeddings
+
+        # Sin catálogo se indexan todas las tablas (como antes del índice maestro)
+        self.table_names = [
+            t for t in _usable_table_names(sql_database) if not table_catalog or t in table_catalog
+        ]
+        if not self.table_names:
+            raise ValueError("No encontré tablas para indexar en SQLDatabase. Revisa la conexión y el catálogo.")
+
+        logger.info(f"Indexando {len(self.table_names)} tablas en el índice maestro de esquemas")
+        self.obj_index = self._build()
+
+    def _build(self) -> ObjectIndex:
+        table_node_mapping = SQLTableNodeMapping(self.sql_database)
+        table_schema_objs = [
+            SQLTableSchema(table_name=t, context_str=self._table_context_str(t))
+            for t in self.table_names
+        ]
+
+        if self.embeddings is None:
+            return ObjectIndex.from_objects(table_schema_objs, table_node_mapping, VectorStoreIndex)
+
+        # Mismo índice que from_objects, pero con los vectores tomados del disco
+        nodes = table_node_mapping.to_nodes(table_schema_objs)
+        vectors = self.embeddings.get_or_embed(
+            [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+        )
+        for node, vector in zip(nodes, vectors):
+            node.embedding = vector
+
+        return ObjectIndex(
+            index=VectorStoreIndex(nodes, embed_model=Settings.embed_model),
+            object_node_mapping=table_node_mapping,
+        )
+
+    def _table_context_str(self, table_name: str) -> str:
+        if table_name in self.table_catalog:
+            return self.table_catalog[table_name][:1200]
+        return f"Tabla: {table_name}"
+
+    def as_retriever(self, table_names, similarity_top_k: int):
+        """Retriever de esquemas restringido a `table_names` (SQLTableNodeMapping guarda la tabla en metadata 'name')."""
+        allowed = [t for t in self.table_names if t in set(table_names)]
+        filters = MetadataFilters(
+            filters=[MetadataFilter(key="name", value=allowed, operator=FilterOperator.IN)]
+        )
+        return self.obj_index.as_retriever(similarity_top_k=similarity_top_k, filters=filters)
+
+
+def _usable_table_names(sql_database) -> List[str]:
+    # Compatibilidad con distintas versiones de LlamaIndex
+    if hasattr(sql_database, "get_usable_table_names"):
+        return list(sql_database.get_usable_table_names())
+    if hasattr(sql_database, "get_table_names"):
+        return list(sql_database.get_table_names())
+    return []
+
+
 class RetrieverSQL:
     """Construye un QueryEngine SQL con *table retrieval* (selección semántica de tablas).
 
@@ -26,7 +99,18 @@ class RetrieverSQL:
     Esto escala mucho mejor cuando hay decenas de tablas y/o múltiples bases.
     """
 
-    def __init__(self, sql_database, table_catalog: Optional[dict] = None, config: Optional[TableRetrieverConfig] = None):
+    def __init__(
+        self,
+        sql_database,
+        table_catalog: Optional[dict] = None,
+        config: Optional[TableRetrieverConfig] = None,
+        table_index: Optional[TableSchemaIndex] = None,
+    ):
+        """
+        Args:
+            table_index: Índice maestro compartido; si se pasa, no se construye un índice
+                propio y la recuperación se limita a las tablas de `table_catalog`
+        """
         self.sql_database = sql_database
         self.table_catalog = table_catalog or {}
         self.config = config or TableRetrieverConfig()
@@ -34,7 +118,10 @@ class RetrieverSQL:
         logger.info(f"Inicializando RetrieverSQL con {len(self.table_catalog)} tablas en catálogo")
         
         # Construir el index/engine
-        self._obj_index = self._build_table_object_index()
+        if table_index is None:
+            table_index = TableSchemaIndex(sql_database, self.table_catalog)
+        self._table_index = table_index
+        self._obj_index = table_index.obj_index
         self._query_engine = self._build_query_engine()
         
         logger.info("✓ RetrieverSQL configurado correctamente")
@@ -44,8 +131,7 @@ class RetrieverSQL:
         return self._query_engine
 
     def query(self, query: str):
-        nodes = self._obj_index.as_retriever(similarity_top_k=self.config.similarity_top_k).retrieve(query)
-        selected_tables = [n.node.metadata.get("table_name") for n in nodes if hasattr(n, "node")]
+        selected_tables = [t.table_name for t in self._table_retriever().retrieve(query)]
         logger.info(f"📊 Tablas seleccionadas para query: {selected_tables}")
         
         result = self._query_engine.query(query)
@@ -53,46 +139,10 @@ class RetrieverSQL:
         return result
 
     # ---------- Internal ----------
-    def _get_all_table_names(self) -> List[str]:
-        # Compatibilidad con distintas versiones de LlamaIndex
-        if hasattr(self.sql_database, "get_usable_table_names"):
-            return list(self.sql_database.get_usable_table_names())
-        if hasattr(self.sql_database, "get_table_names"):
-            return list(self.sql_database.get_table_names())
-        return []
-
-    def _table_context_str(self, table_name: str) -> str:
-        # Intenta obtener info real (columnas, etc.) desde SQLDatabase
-        if table_name in self.table_catalog:
-            return self.table_catalog[table_name][:1200]
-        return f"Tabla: {table_name}"
-
-    def _build_table_object_index(self):
-        all_table_names = self._get_all_table_names()
-        
-        if self.table_catalog:
-            allowed = set(self.table_catalog.keys())
-            all_table_names = [t for t in all_table_names if t in allowed]
-        
-        if not all_table_names:
-            raise ValueError("No encontré tablas para indexar en SQLDatabase. Revisa la conexión y el catálogo.")
-
-        logger.info(f"Indexando {len(all_table_names)} tablas: {all_table_names}")
-        
-        table_node_mapping = SQLTableNodeMapping(self.sql_database)
-
-        table_schema_objs = [
-            SQLTableSchema(
-                table_name=table_name,
-                context_str=self._table_context_str(table_name),
-            )
-            for table_name in all_table_names
-        ]
-
-        return ObjectIndex.from_objects(
-            table_schema_objs,
-            table_node_mapping,
-            VectorStoreIndex,
+    def _table_retriever(self):
+        return self._table_index.as_retriever(
+            self.table_catalog.keys() or self._table_index.table_names,
+            similarity_top_k=self.config.similarity_top_k,
         )
 
     def _build_query_engine(self):
@@ -202,10 +252,8 @@ class RetrieverSQL:
         ═══════════════════════════════════════════════════════════════════
         """)
 
-        table_retriever = self._obj_index.as_retriever(
-            similarity_top_k=self.config.similarity_top_k
-        )
-        
+        table_retriever = self._table_retriever()
+
         return SQLTableRetrieverQueryEngine(
             sql_database=self.sql_database,
             table_retriever=table_retriever,
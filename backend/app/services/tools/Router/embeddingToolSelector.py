@@ -0,0 +1,156 @@
+"""
+EmbeddingToolSelector - Selector local de herramientas por similitud de embeddings
+
+Nivel intermedio entre el pre-router por keywords y el PydanticSingleSelector:
+las descripciones (ToolMetadata.description) se embeben una sola vez y se
+persisten en disco (PersistedEmbeddings); en cada consulta solo se embebe el mensaje y se rankean
+las herramientas con una multiplicación de matrices NumPy.
+
+Si la ventaja entre las dos mejores herramientas es pequeña, no decide y la
+consulta sigue al selector LLM.
+"""
+
+import logging
+import os
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from llama_index.core.tools import QueryEngineTool
+
+from app.services.embedding_store import PersistedEmbeddings
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingToolSelector:
+    """
+    Rankea herramientas por similitud coseno entre la consulta y su descripción.
+
+    Uso:
+        selector = EmbeddingToolSelector(tools, embed_model, persist_path=".cache/tool_embeddings.json")
+        tool_name = selector.select("¿Qué posts de Instagram tienen más likes?")
+        if tool_name is None:
+            # margen insuficiente → usar el selector LLM
+            ...
+    """
+
+    def __init__(
+        self,
+        tools: Sequence[QueryEngineTool],
+        embed_model,
+        persist_path: Optional[str] = None,
+        min_similarity: float = 0.25,
+        min_margin: float = 0.04,
+    ):
+        """
+        Args:
+            tools: Herramientas candidatas (se usa metadata.name y metadata.description)
+            embed_model: Modelo de embeddings de LlamaIndex (Settings.embed_model)
+            persist_path: Archivo JSON donde se guardan los vectores de las descripciones
+            min_similarity: Similitud mínima de la mejor herramienta para decidir
+            min_margin: Ventaja mínima sobre la segunda herramienta para decidir
+        """
+        self.embed_model = embed_model
+        self.persist_path = persist_path
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self.tool_names: List[str] = [tool.metadata.name for tool in tools]
+        self._stats = Counter()
+        self._stats_lock = threading.Lock()
+
+        descriptions = [tool.metadata.description for tool in tools]
+        store = PersistedEmbeddings(persist_path, embed_model)
+        vectors = store.get_or_embed(descriptions)
+        store.prune(descriptions)  # descripciones viejas ya no sirven
+        matrix = np.asarray(vectors, dtype=np.float32)
+        # Normalizar filas: el producto punto pasa a ser similitud coseno
+        self._matrix = matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+        logger.info(f"✓ EmbeddingToolSelector listo ({len(self.tool_names)} herramientas)")
+
+    # -------- Selección --------
+    def rank(self, query_embedding: Sequence[float]) -> List[Tuple[str, float]]:
+        """Herramientas ordenadas por similitud coseno con la consulta."""
+        q = np.asarray(query_embedding, dtype=np.float32)
+        sims = self._matrix @ (q / np.linalg.norm(q))
+        order = np.argsort(sims)[::-1]
+        return [(self.tool_names[i], float(sims[i])) for i in order]
+
+    def _decide(self, query_embedding: Sequence[float]) -> Optional[str]:
+        ranked = self.rank(query_embedding)
+        best_name, best_sim = ranked[0]
+        second_sim = ranked[1][1] if len(ranked) > 1 else 0.0
+        margin = best_sim - second_sim
+
+        if best_sim >= self.min_similarity and margin >= self.min_margin:
+            logger.info(f"  🧭 EmbeddingSelector: {best_name} (sim {best_sim:.3f}, margen {margin:.3f})")
+            self._record("decididas")
+            return best_name
+
+        logger.info(
+            f"  🤔 EmbeddingSelector: margen insuficiente "
+            f"{[(n, round(s, 3)) for n, s in ranked[:3]]} → selector LLM"
+        )
+        self._record("delegadas_llm")
+        return None
+
+    def select(self, query: str) -> Optional[str]:
+        """Retorna el nombre de la herramienta, o None si debe decidir el selector LLM."""
+        return self._decide(self.embed_model.get_query_embedding(query))
+
+    async def aselect(self, query: str) -> Optional[str]:
+        """Versión async de select."""
+        return self._decide(await self.embed_model.aget_query_embedding(query))
+
+    # -------- Métricas --------
+    def _record(self, key: str):
+        with self._stats_lock:
+            self._stats["total"] += 1
+            self._stats[key] += 1
+
+    def stats(self) -> Dict[str, object]:
+        with self._stats_lock:
+            counts = dict(self._stats)
+        total = counts.get("total", 0)
+        decided = counts.get("decididas", 0)
+        return {
+            "total": total,
+            "decididas": decided,
+            "delegadas_llm": counts.get("delegadas_llm", 0),
+            "hit_rate": round(decided / total, 4) if total else 0.0,
+        }
+
+
+# ============================================================================
+# TESTS
+# ============================================================================
+
+if __name__ == "__main__":
+    import tempfile
+    import time
+
+    from llama_index.core.embeddings import MockEmbedding
+    from llama_index.core.tools import ToolMetadata
+
+    class _FakeTool:
+        def __init__(self, name: str, description: str):
+            self.metadata = ToolMetadata(name=name, description=description)
+
+    tools = [_FakeTool(f"tool_{i}", f"Descripción de la herramienta {i}") for i in range(13)]
+    path = os.path.join(tempfile.mkdtemp(), "tool_embeddings.json")
+
+    inicio = time.perf_counter()
+    EmbeddingToolSelector(tools, MockEmbedding(embed_dim=1536), persist_path=path)
+    print(f"Arranque en frío: {(time.perf_counter() - inicio) * 1000:.2f} ms")
+
+    inicio = time.perf_counter()
+    selector = EmbeddingToolSelector(tools, MockEmbedding(embed_dim=1536), persist_path=path)
+    print(f"Arranque con vectores persistidos: {(time.perf_counter() - inicio) * 1000:.2f} ms")
+
+    query_vec = np.random.rand(1536)
+    n = 10_000
+    inicio = time.perf_counter()
+    for _ in range(n):
+        selector.rank(query_vec)
+    print(f"Ranking por consulta (13 tools): {(time.perf_counter() - inicio) / n * 1e6:.1f} µs")
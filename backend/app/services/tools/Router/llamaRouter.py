@@ -1,15 +1,20 @@
 from __future__ import annotations
+import hashlib
 import logging
+import os
+from llama_index.core import Settings
 from llama_index.core.query_engine import RouterQueryEngine
 from llama_index.core.schema import QueryBundle
+from llama_index.core.base.response.schema import Response
 from llama_index.core.selectors import PydanticSingleSelector
 from llama_index.core.tools import QueryEngineTool, ToolMetadata
 from app.services.tools.Router.SQLQuery.llamaSQLquery import LlamaSQLQuery
-from app.services.tools.Router.SQLQuery.retrieverSql import RetrieverSQL, TableRetrieverConfig
+from app.services.tools.Router.SQLQuery.retrieverSql import RetrieverSQL, TableRetrieverConfig, TableSchemaIndex
 from app.services.tools.Router.SQLQuery.bienesadjudicados import BienesAdjudicadosTool
 from app.services.tools.Router.SQLQuery.bienesadjudicados.bienesqueryengine import BienesQueryEngine
 from app.services.tools.Router.SQLQuery.bienesadjudicados.banksqueryengine import BanksQueryEngine
 from app.services.tools.Router.SQLQuery.bienesadjudicados.propertydbservice import PropertyDatabaseService
+from app.services.tools.Router.SQLQuery.bienesadjudicados.propertycatalog import get_property_catalog
 from app.services.tools.Router.General.general_query_engine import GeneralQueryEngine
 from app.services.tools.Router.General.tavilyService import TavilyBienesQueryEngine
 from app.services.tools.Router.General.property_question_engine import PropertyQuestionEngine
@@ -19,8 +24,13 @@ from app.services.tools.Router.General.posts_question_engine import PostsQuestio
 from app.services.tools.Router.General.pending_reminders_question_engine import PendingRemindersQuestionEngine
 from app.services.tools.Router.General.customer_reminders_question_engine import CustomerRemindersQuestionEngine
 from app.services.tools.Router.General.posts_generation_engine import PostsGenerationEngine
-from app.services.tools.Router.General.query_preprocessor import QueryPreprocessor, QueryType
-from app.services.conversation_context import ConversationContext
+from app.services.tools.Router.General.query_preprocessor import QueryPreprocessor, QueryType, TOOL_BY_QUERY_TYPE, has_chat_history
+from app.services.tools.Router.embeddingToolSelector import EmbeddingToolSelector
+from app.services.conversation_context import get_context_manager
+from app.services.request_context import request_scope, get_request_context
+from app.services.response_cache import ResponseCache, MemoQueryEmbedder
+from app.services.response_stream import discard as discard_stream
+from app.services.embedding_store import PersistedEmbeddings
 from app.data import easycoreContext
 from app.data.easycoreRoleAccess import build_role_scoped_catalog, normalize_roles
 from app.services.tools.Router.InternetSearchEngine import InternetSearchEngine
@@ -48,6 +58,12 @@ def _get_conn_uri(settings, key: str) -> str:
     )
 
 
+def _catalog_fingerprint(catalog: dict[str, str]) -> str:
+    """Hash estable del catálogo (tablas + descripciones) para detectar cambios."""
+    payload = "\n".join(f"{table}\t{ctx}" for table, ctx in sorted(catalog.items()))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
 class LlamaRouter:
     """Router (LlamaIndex) para elegir entre herramientas de consulta."""
 
@@ -56,12 +72,19 @@ class LlamaRouter:
         settings,
         db1_key: str = "DB_URI_BIENES",
         db2_key: str = "DB_URI_EASYCORE",
-        context_manager=ConversationContext()
+        context_manager=None
     ):
         self.settings = settings
-        self.context_manager = context_manager
+        # Por defecto, la misma instancia que usa expand_contextual_question
+        self.context_manager = context_manager or get_context_manager()
+        # Copia en memoria de vw_get_all_properties (se carga y refresca en segundo plano)
+        self.property_catalog = None
+        if getattr(settings, "bienes_catalog_snapshot", True):
+            self.property_catalog = get_property_catalog()
+            self.property_catalog.start()
         self.property_db_service = PropertyDatabaseService(
-            connection_uri=_get_conn_uri(settings, "DB_URI_BIENES")
+            connection_uri=_get_conn_uri(settings, "DB_URI_BIENES"),
+            catalog=self.property_catalog,
         )
         self.query_preprocessor = QueryPreprocessor()
         logger.info("Inicializando LlamaRouter...")
@@ -70,8 +93,12 @@ class LlamaRouter:
         try:
             db1_uri = _get_conn_uri(settings, db1_key)
             engine_bienes = BienesAdjudicadosTool.BienesDB.build_engine(db1_uri)
-            bienes_db = BienesAdjudicadosTool.BienesDB(engine_bienes)
-            qe_bienes = BienesQueryEngine(bienes_db)
+            bienes_db = BienesAdjudicadosTool.BienesDB(engine_bienes, catalog=self.property_catalog)
+            if getattr(settings, "bienes_search_index", True):
+                bienes_db.enable_search_index()
+            self.bienes_db = bienes_db
+            qe_bienes = BienesQueryEngine(bienes_db, context_manager=self.context_manager)
+            self.bienes_engine = qe_bienes
 
             sql_db1_tool = QueryEngineTool(
                 query_engine=qe_bienes,
@@ -101,6 +128,7 @@ class LlamaRouter:
         # -------- Banks tool (Búsqueda de bancos y sus propiedades) --------
         try:
             qe_banks = BanksQueryEngine(bienes_db)
+            self.bank_stats = qe_banks.bank_stats
             banks_tool = QueryEngineTool(
                 query_engine=qe_banks,
                 metadata=ToolMetadata(
@@ -139,7 +167,15 @@ class LlamaRouter:
             db2_uri = _get_conn_uri(settings, db2_key)
             self.db2_sql_db = LlamaSQLQuery(db2_uri).get_sql_database()
             self.easycore_base_catalog = easycoreContext.TABLE_CATALOG_EASYCORE
+            self.easycore_catalog_fingerprint = _catalog_fingerprint(self.easycore_base_catalog)
             self.easycore_tool_cache = {}
+            self.role_router_cache = {}
+            # Vectores de esquemas en disco: compartidos entre arranques y catálogos por rol
+            self.table_embeddings = PersistedEmbeddings(
+                os.path.join(getattr(settings, "cache_dir", ".cache"), "easycore_table_embeddings.json"),
+                Settings.embed_model,
+            )
+            self.easycore_table_index = self._build_easycore_table_index()
 
             sql_db2_tool = self._build_easycore_tool_for_roles(["administrator"])
             logger.info("✓ Tool 'easycore' configurado correctamente")
@@ -475,6 +511,24 @@ class LlamaRouter:
         # -------- Router --------
         self.base_tools = [sql_db1_tool, banks_tool, rrhh_tool, operations_tool, posts_tool, posts_gen_tool, reminders_tool, customer_reminders_tool, general_tool, property_info_tool, internet_tool, internet_search_tool]
         self.default_tools = [*self.base_tools, sql_db2_tool]
+        self.tools_by_name = {tool.metadata.name: tool for tool in self.base_tools}
+
+        # Embeddings de consultas memorizados: cache semántico y selector comparten el mismo vector
+        self.query_embedder = MemoQueryEmbedder(Settings.embed_model)
+
+        # -------- Selector por embeddings (entre keywords y selector LLM) --------
+        self.embedding_selector = None
+        try:
+            self.embedding_selector = EmbeddingToolSelector(
+                self.default_tools,
+                self.query_embedder,
+                persist_path=os.path.join(getattr(settings, "cache_dir", ".cache"), "tool_embeddings.json"),
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ EmbeddingToolSelector deshabilitado, se usará solo el selector LLM: {e}")
+
+        # -------- Cache de respuestas (exacto + semántico) --------
+        self.response_cache = ResponseCache(embed_model=self.query_embedder)
         self.router = RouterQueryEngine(
             selector=PydanticSingleSelector.from_defaults(),
             query_engine_tools=self.default_tools,
@@ -513,6 +567,7 @@ class LlamaRouter:
             self.db2_sql_db,
             table_catalog=scoped_catalog,
             config=TableRetrieverConfig(similarity_top_k=6),
+            table_index=self.easycore_table_index,
         ).get_query_engine()
 
         tool = QueryEngineTool(
@@ -526,15 +581,66 @@ class LlamaRouter:
         self.easycore_tool_cache[cache_key] = tool
         return tool
 
+    def _build_easycore_table_index(self) -> TableSchemaIndex:
+        """Índice maestro sobre el catálogo completo; cada rol filtra sus tablas al recuperar."""
+        master_catalog = {t: ctx for t, ctx in self.easycore_base_catalog.items() if t != "migrations"}
+        return TableSchemaIndex(self.db2_sql_db, master_catalog, embeddings=self.table_embeddings)
+
     def _tools_for_roles(self, user_roles: list[str] | None):
         scoped_easycore_tool = self._build_easycore_tool_for_roles(user_roles)
         return [*self.base_tools, scoped_easycore_tool]
 
+    def _router_for_roles(self, user_roles: list[str] | None) -> RouterQueryEngine:
+        """
+        Retorna el RouterQueryEngine (selector + tools) del conjunto de roles.
+
+        Se cachea por roles normalizados: después de la primera consulta de un
+        rol, enrutar cuesta un lookup en diccionario en lugar de reconstruir
+        selector, prompt y metadata de las tools.
+        """
+        cache_key = "|".join(sorted(normalize_roles(user_roles or [])))
+
+        role_router = self.role_router_cache.get(cache_key)
+        if role_router is not None:
+            return role_router
+
+        role_router = RouterQueryEngine(
+            selector=PydanticSingleSelector.from_defaults(),
+            query_engine_tools=self._tools_for_roles(user_roles),
+        )
+        self.role_router_cache[cache_key] = role_router
+        logger.info(f"✓ Router cacheado para roles [{cache_key or 'sin rol'}]")
+        return role_router
+
+    def refresh_easycore_catalog(self, catalog: dict[str, str] | None = None) -> bool:
+        """
+        Recarga el catálogo de Easycore e invalida los routers cacheados si cambió.
+
+        Args:
+            catalog: Nuevo catálogo (por defecto easycoreContext.TABLE_CATALOG_EASYCORE)
+
+        Returns:
+            True si el catálogo cambió y se invalidó el cache
+        """
+        catalog = catalog if catalog is not None else easycoreContext.TABLE_CATALOG_EASYCORE
+        fingerprint = _catalog_fingerprint(catalog)
+        if fingerprint == self.easycore_catalog_fingerprint:
+            return False
+
+        self.easycore_base_catalog = catalog
+        self.easycore_catalog_fingerprint = fingerprint
+        self.easycore_table_index = self._build_easycore_table_index()
+        self.easycore_tool_cache = {}
+        self.role_router_cache = {}
+        logger.info("♻️ Catálogo Easycore cambió: cache de routers por rol invalidado")
+        return True
+
     # -------- Main API --------
     def query(self, user_query: str, session_id: str = None, user_roles: list[str] | None = None, user_id: int = None):
         """
         Ejecuta query con pre-procesamiento inteligente.
 
+        0. Busca la respuesta en el cache (exacto o semántico)
         1. Pre-procesa la consulta para detectar patrones específicos (ej: IDs de propiedades)
         2. Si detecta un patrón, enruta DIRECTAMENTE a la herramienta específica
         3. Si no detecta patrón, usa el router LLaMA normal
@@ -544,54 +650,210 @@ class LlamaRouter:
         logger.info(f"👤 Roles usuario: {sorted(normalize_roles(user_roles or []))}")
         logger.info(f"{'='*60}")
 
-        try:
-            # 1️⃣ PRE-PROCESAMIENTO: Detectar patrones específicos
-            query_type, property_id = self.query_preprocessor.analyze(user_query)
-
-            # Establecer user_roles en engines especializados
-            self.rrhh_engine.set_user_roles(user_roles)
-            self.posts_engine.set_user_roles(user_roles)
-            self.operations_engine.set_user_roles(user_roles)
-            if user_id:
-                self.reminders_engine.set_user_id(user_id)
-                self.customer_reminders_engine.set_user_id(user_id)
-                self.operations_engine.set_user_id(user_id)
-
-            # 2️⃣ Si detectó ID de propiedad, ENRUTA DIRECTO a property_info
-            if query_type == QueryType.PROPERTY_ID:
-                logger.info(f"🎯 ENRUTAMIENTO DIRECTO: Property ID #{property_id}")
-                from llama_index.core.schema import QueryBundle
-                query_bundle = QueryBundle(query_str=user_query)
-                # Pasar session_id al engine si está disponible
-                if session_id:
-                    self.property_question_engine.session_id = session_id
-                response = self.property_question_engine._query(query_bundle)
-                logger.info(f"🔧 Tool seleccionado: property_info (directo por ID)")
+        # Roles, user_id y session_id viajan en el contexto de la request:
+        # los engines son compartidos y no guardan estado del usuario.
+        with request_scope(session_id=session_id, user_id=user_id, user_roles=user_roles):
+            try:
+                cacheable = self._is_cacheable(user_query)
+                if cacheable:
+                    hit = self.response_cache.lookup(user_query, *self._cache_scope())
+                    if hit is not None:
+                        self._remember_cached_listing(hit)
+                        return Response(response=hit.text, metadata={"tool": hit.tool_name, "cache": hit.tier})
+
+                response, tool_name = self._route(user_query)
+                logger.info(f"🔧 Tool seleccionado: {tool_name}")
                 logger.info(f"📤 Respuesta generada (primeros 200 chars): {str(response)[:200]}...")
+
+                if cacheable:
+                    self.response_cache.store(user_query, *self._cache_scope(), tool_name, str(response))
                 return response
+            except Exception as e:
+                logger.error(f"❌ ERROR en query: {e}", exc_info=True)
+                raise
+
+    def _route(self, user_query: str) -> tuple[object, str]:
+        """Elige la herramienta y ejecuta la consulta. Retorna (respuesta, nombre de la tool)."""
+        # 1️⃣ PRE-PROCESAMIENTO: Detectar patrones específicos
+        query_type, property_id = self.query_preprocessor.analyze(user_query)
+
+        # 2️⃣ Si detectó ID de propiedad, ENRUTA DIRECTO a property_info
+        if query_type == QueryType.PROPERTY_ID:
+            logger.info(f"🎯 ENRUTAMIENTO DIRECTO: Property ID #{property_id}")
+            response = self.property_question_engine._query(QueryBundle(query_str=user_query))
+            return response, "property_info"
+
+        # 2️⃣b Intención clara por keywords → herramienta directa, sin selector LLM
+        if query_type in TOOL_BY_QUERY_TYPE:
+            tool = self.tools_by_name[TOOL_BY_QUERY_TYPE[query_type]]
+            logger.info(f"⚡ ENRUTAMIENTO DIRECTO: {tool.metadata.name} (sin selector LLM)")
+            response = tool.query_engine.query(user_query)
+            if self._is_direct_response_usable(tool.metadata.name, response):
+                return response, tool.metadata.name
+            self.query_preprocessor.record_fallback(query_type)
+            discard_stream()
+
+        # 2️⃣c Similitud de embeddings contra las descripciones de las tools
+        tool = self._select_by_embeddings(user_query)
+        if tool is not None:
+            logger.info(f"🧭 ENRUTAMIENTO POR EMBEDDINGS: {tool.metadata.name}")
+            response = tool.query_engine.query(user_query)
+            if self._is_direct_response_usable(tool.metadata.name, response):
+                return response, tool.metadata.name
+            discard_stream()
+
+        # 3️⃣ Si NO detectó patrón, usa ROUTER NORMAL (LLaMA selector)
+        logger.info(f"🚀 ENRUTAMIENTO NORMAL: Pasando al router LLaMA...")
+        role_router = self._router_for_roles(get_request_context().user_roles)
+        response = role_router.query(user_query)
+        return response, self._selected_tool_name(role_router, response)
+
+    async def aquery(self, user_query: str, session_id: str = None, user_roles: list[str] | None = None, user_id: int = None):
+        """
+        Versión async de query.
 
-            # 3️⃣ Si NO detectó patrón, usa ROUTER NORMAL (LLaMA selector)
-            logger.info(f"🚀 ENRUTAMIENTO NORMAL: Pasando al router LLaMA...")
-            # Asignar session_id al engine para contexto
-            if session_id:
-                self.property_question_engine.session_id = session_id
-            role_router = RouterQueryEngine(
-                selector=PydanticSingleSelector.from_defaults(),
-                query_engine_tools=self._tools_for_roles(user_roles),
-            )
-            response = role_router.query(user_query)
+        Mismo flujo (cache → pre-procesamiento → ruta directa o router LLaMA), pero
+        usando aquery/aselect para que las herramientas no bloqueen el event loop.
+        """
+        logger.info(f"\n{'='*60}")
+        logger.info(f"📥 NUEVA CONSULTA (async): {user_query}")
+        logger.info(f"👤 Roles usuario: {sorted(normalize_roles(user_roles or []))}")
+        logger.info(f"{'='*60}")
+
+        with request_scope(session_id=session_id, user_id=user_id, user_roles=user_roles):
+            try:
+                cacheable = self._is_cacheable(user_query)
+                if cacheable:
+                    hit = await self.response_cache.alookup(user_query, *self._cache_scope())
+                    if hit is not None:
+                        self._remember_cached_listing(hit)
+                        return Response(response=hit.text, metadata={"tool": hit.tool_name, "cache": hit.tier})
+
+                response, tool_name = await self._aroute(user_query)
+                logger.info(f"🔧 Tool seleccionado: {tool_name}")
+                logger.info(f"📤 Respuesta generada (primeros 200 chars): {str(response)[:200]}...")
+
+                if cacheable:
+                    await self.response_cache.astore(user_query, *self._cache_scope(), tool_name, str(response))
+                return response
+            except Exception as e:
+                logger.error(f"❌ ERROR en aquery: {e}", exc_info=True)
+                raise
+
+    async def _aroute(self, user_query: str) -> tuple[object, str]:
+        """Versión async de _route."""
+        query_type, property_id = self.query_preprocessor.analyze(user_query)
+
+        if query_type == QueryType.PROPERTY_ID:
+            logger.info(f"🎯 ENRUTAMIENTO DIRECTO: Property ID #{property_id}")
+            response = await self.property_question_engine.aquery(QueryBundle(query_str=user_query))
+            return response, "property_info"
+
+        if query_type in TOOL_BY_QUERY_TYPE:
+            tool = self.tools_by_name[TOOL_BY_QUERY_TYPE[query_type]]
+            logger.info(f"⚡ ENRUTAMIENTO DIRECTO: {tool.metadata.name} (sin selector LLM)")
+            response = await tool.query_engine.aquery(user_query)
+            if self._is_direct_response_usable(tool.metadata.name, response):
+                return response, tool.metadata.name
+            self.query_preprocessor.record_fallback(query_type)
+            discard_stream()
+
+        tool = await self._aselect_by_embeddings(user_query)
+        if tool is not None:
+            logger.info(f"🧭 ENRUTAMIENTO POR EMBEDDINGS: {tool.metadata.name}")
+            response = await tool.query_engine.aquery(user_query)
+            if self._is_direct_response_usable(tool.metadata.name, response):
+                return response, tool.metadata.name
+            discard_stream()
+
+        logger.info(f"🚀 ENRUTAMIENTO NORMAL: Pasando al router LLaMA...")
+        role_router = self._router_for_roles(get_request_context().user_roles)
+        response = await role_router.aquery(user_query)
+        return response, self._selected_tool_name(role_router, response)
+
+    def _selected_tool_name(self, role_router: RouterQueryEngine, response) -> str:
+        """Nombre de la tool que eligió el selector LLM (según selector_result de la respuesta)."""
+        try:
+            selector_result = (response.metadata or {}).get("selector_result")
+            return role_router._metadatas[selector_result.ind].name
+        except Exception:
+            return "desconocido"
 
-            selected_tool = "desconocido"
-            if hasattr(response, 'metadata') and response.metadata:
-                selected_tool = response.metadata.get('selector_result', 'desconocido')
+    # -------- Cache de respuestas --------
+    def _is_cacheable(self, user_query: str) -> bool:
+        # Con historial antepuesto la respuesta depende de la conversación
+        return self.response_cache is not None and not has_chat_history(user_query)
 
-            logger.info(f"🔧 Tool seleccionado: {selected_tool}")
-            logger.info(f"📤 Respuesta generada (primeros 200 chars): {str(response)[:200]}...")
+    def _remember_cached_listing(self, hit):
+        # Sin ejecutar la búsqueda, la lista de la sesión quedaría con la búsqueda anterior
+        if hit.tool_name == "bienes_adjudicados" and getattr(self, "bienes_engine", None) is not None:
+            self.bienes_engine.remember_listing(hit.text)
 
-            return response
+    def _cache_scope(self) -> tuple[str, int | None]:
+        ctx = get_request_context()
+        return "|".join(sorted(normalize_roles(ctx.user_roles))), ctx.user_id
+
+    def cache_stats(self) -> dict:
+        return self.response_cache.stats() if self.response_cache else {}
+
+    def search_index_stats(self) -> dict:
+        bienes_db = getattr(self, "bienes_db", None)
+        index = bienes_db.search_index if bienes_db is not None else None
+        return index.stats() if index is not None else {}
+
+    def bank_stats_summary(self) -> dict:
+        bank_stats = getattr(self, "bank_stats", None)
+        return bank_stats.stats() if bank_stats is not None else {}
+
+    def catalog_stats(self) -> dict:
+        return self.property_catalog.stats() if self.property_catalog is not None else {}
+
+    def _is_direct_response_usable(self, tool_name: str, response) -> bool:
+        """
+        Los engines devuelven respuesta vacía cuando la consulta no es suya;
+        en ese caso decide el selector LLM.
+        """
+        if str(response).strip():
+            return True
+        logger.info(f"↩️ {tool_name} no respondió, usando selector LLM")
+        return False
+
+    def _resolve_tool(self, tool_name: str) -> QueryEngineTool:
+        """Herramienta por nombre; easycore se resuelve con el catálogo del rol actual."""
+        if tool_name == "easycore":
+            return self._build_easycore_tool_for_roles(get_request_context().user_roles)
+        return self.tools_by_name[tool_name]
+
+    def _use_embedding_selector(self, user_query: str) -> bool:
+        # Con historial antepuesto la referencia es contextual: mejor que decida el LLM
+        return self.embedding_selector is not None and not has_chat_history(user_query)
+
+    def _select_by_embeddings(self, user_query: str) -> QueryEngineTool | None:
+        if not self._use_embedding_selector(user_query):
+            return None
+        try:
+            tool_name = self.embedding_selector.select(user_query)
         except Exception as e:
-            logger.error(f"❌ ERROR en query: {e}", exc_info=True)
-            raise
+            logger.warning(f"⚠️ Error en EmbeddingToolSelector, usando selector LLM: {e}")
+            return None
+        return self._resolve_tool(tool_name) if tool_name else None
+
+    async def _aselect_by_embeddings(self, user_query: str) -> QueryEngineTool | None:
+        if not self._use_embedding_selector(user_query):
+            return None
+        try:
+            tool_name = await self.embedding_selector.aselect(user_query)
+        except Exception as e:
+            logger.warning(f"⚠️ Error en EmbeddingToolSelector, usando selector LLM: {e}")
+            return None
+        return self._resolve_tool(tool_name) if tool_name else None
+
+    def routing_stats(self) -> dict:
+        """Métricas de enrutamiento: consultas resueltas sin selector LLM por nivel."""
+        return {
+            "keywords": self.query_preprocessor.stats(),
+            "embeddings": self.embedding_selector.stats() if self.embedding_selector else None,
+        }
 
     def is_tool_response(self, response_text: str) -> bool:
         """Detecta si la respuesta proviene de una tool de datos. Recibe el string ya convertido."""